@@ -1,16 +1,35 @@
-import pandas as pd
-import numpy as np
-from faker import Faker
+import argparse
+import os
 import random
+import sys
+from contextlib import nullcontext
 from datetime import datetime, timedelta
-from pandas.tseries.offsets import DateOffset
-from dateutil.rrule import rrule, DAILY, WEEKLY, MONTHLY
+from operator import itemgetter
+from pathlib import Path
+
+import pandas as pd
+import numpy as np
 
-# Инициализация
-fake = Faker()
-Faker.seed(42)
-random.seed(42)
-np.random.seed(42)
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from telegram_config import (
+    event_types, event_type_weights, premium_types, premium_type_probs, price_by_type,
+    locations, activity_categories, conversion_rate_by_activity
+)
+from telegram_engine import (
+    generate_logs_vectorized, iter_log_chunks, cube_frame,
+    LOGS_SCHEMA, PREMIUM_SCHEMA, USER_DATA_SCHEMA, CUBE_GROUPING_SETS
+)
+from telegram_subscriptions import subscription_ends, PremiumIntervals
+from telegram_increment import CHECKPOINT_PREFIX, append_logs, save_logs_checkpoint, track_chunks
+from product_analytics.profiling import StageProfiler
+from product_analytics.schema import apply_schema
+from product_analytics.streaming import chunk_writer, tee_chunks, write_chunks, write_table
+
+# Генерация — функция generate(...), параметры ниже — её значения по умолчанию.
+# Из командной строки: python gen_logs_telegram_script_v4.py --users 1000 --format parquet ...
+# (см. --help). Faker, куб и скетчи импортируются только в режимах, где нужны
+# Готовые таблицы проигрываются потоком NDJSON по времени: python -m product_analytics.replay
 
 # Параметры
 total_users = 10000
@@ -20,54 +39,68 @@ premium_users = 1200
 start_date = datetime(2023, 1, 1)
 end_date = datetime(2023, 6, 30)
 
-event_types = [
-    "view_main_screen", "open_dialog", "send_message", "open_chat", "send_sticker",
-    "buy_gift", "buy_premium", "react_to_message", "voice_call", "video_call",
-    "send_voice_message", "send_video_message"
-]
-
-premium_event_types = [
-    "use_custom_emoji", "post_story", "voice_to_text", "extra_cloud_storage",
-    "emoji_status_profile", "custom_profile", "telegram_app_icon",
-    "animated_profile_picture", "extra_reactions"
-]
-
-premium_event_weights = {
-    "voice_to_text": 0.22,
-    "emoji_status_profile": 0.10,
-    "extra_reactions": 0.16,
-    "post_story": 0.12,
-    "use_custom_emoji": 0.16,
-    "extra_cloud_storage": 0.08,
-    "custom_profile": 0.05,
-    "telegram_app_icon": 0.05,
-    "animated_profile_picture": 0.06
-}
-
-premium_types = ["3_months", "6_months", "12_months"]
-price_by_type = {
-    "3_months": 899,
-    "6_months": 1690,
-    "12_months": 3190
-}
-
-locations = ["Moscow", "Saint Petersburg", "Novosibirsk", "Ekaterinburg", "Kazan", "Nizhny Novgorod"]
-
-activity_categories = {
-    'active': {'percentage': 0.20, 'min_sessions': 15, 'max_sessions': 30, 'min_events': 20, 'max_events': 40},
-    'medium': {'percentage': 0.50, 'min_sessions': 8, 'max_sessions': 20, 'min_events': 10, 'max_events': 20},
-    'rare': {'percentage': 0.30, 'min_sessions': 3, 'max_sessions': 8, 'min_events': 1, 'max_events': 10}
-}
-
-# start_date = datetime(2023, 1, 1)
-# end_date = datetime(2023, 6, 30)
-
-# Шаг 1: Базовые данные пользователей
-user_data = pd.DataFrame({
-    "user_id": np.arange(1, total_users + 1),
-    "location": np.random.choice(locations, total_users)
-})
-
+# Режим генерации логов:
+#   "loop"       — исходный цикл по пользователям и событиям (единственный, где нужен Faker)
+#   "vectorized" — векторный движок telegram_engine.py, один процесс
+#   "sharded"    — векторный движок по шардам пользователей в пуле процессов;
+#                  у каждого шарда свой поток RNG, результат не зависит от NUM_WORKERS.
+#                  Логи пишутся в файл чанками по SHARD_SIZE пользователей, в памяти
+#                  не больше MAX_IN_FLIGHT чанков — пиковая память не зависит от total_users
+GENERATION_MODE = "sharded"
+GENERATION_MODES = ("loop", "vectorized", "sharded")
+SEED = 42
+SHARD_SIZE = 1000
+NUM_WORKERS = os.cpu_count()
+MAX_IN_FLIGHT = 2 * NUM_WORKERS
+
+# Компактная схема: int64 session_id, category для event_type/platform/location/
+# subscription_type, datetime64[s] для времени (и в памяти, и в файлах)
+COMPACT_SCHEMA = False
+# Формат файлов: "csv" или "parquet" (нужен pyarrow; сохраняет типы компактной схемы)
+OUTPUT_FORMAT = "csv"
+# Каталог для всех файлов ("" — текущий)
+OUTPUT_DIR = ""
+# Партиции таблицы логов для "parquet": None — один файл, иначе каталог-датасет
+# с hive-партициями, например ["event_date"] или ["event_date", "event_type"]; читается
+# product_analytics.partitioned.read_partitioned только по нужным датам и событиям
+PARTITION_BY = None
+# Агрегатный куб: события и уникальные пользователи по дню/неделе/месяцу × событию ×
+# платформе × городу × премиуму, собирается по ходу генерации в telegram_cube.*
+BUILD_CUBE = False
+# HyperLogLog-скетчи уникальных пользователей по дню × этим измерениям (колонки
+# cube_frame: event_type, platform, location, is_premium) в telegram_sketches.npz;
+# сливаются в WAU/MAU без сырых логов, см. product_analytics.hll. None — не строить
+SKETCH_DIMENSIONS = None  # например, ["event_type"]
+# Целевая ошибка скетча; None — DEFAULT_PRECISION (p=12: 4 КБ на ключ, ~1.6%).
+# Память — 2^p байт на ключ (день × значения измерений): error=0.01 даёт p=14, 16 КБ
+SKETCH_ERROR = None
+# Event store логов telegram_logs.events (нужен COMPACT_SCHEMA = True): бинарный
+# memmap-массив, отсортированный по (user_id, timestamp), с индексом по пользователям —
+# история пользователя без groupby, см. product_analytics.event_store.EventStore.
+# Пишется вместе с основной таблицей логов; APPEND_UNTIL его не дописывает
+EVENT_STORE = False
+# Порядок строк таблицы telegram_logs: None — как генерируется, по (user_id, timestamp);
+# "timestamp" — глобально по времени, "user" — по (user_id, timestamp) принудительно.
+# Чанки сбрасываются на диск отсортированными прогонами и сливаются k-way merge
+# (product_analytics.external_sort) — весь датасет в памяти не собирается
+SORT_BY = None
+
+# Инкрементальный режим: полная генерация сохраняет чекпоинт (telegram_checkpoint.json
+# и состояние пользователей telegram_state.*). Если задать APPEND_UNTIL, к telegram_logs
+# дописывается только период после end_date прошлого запуска по APPEND_UNTIL включительно,
+# уже записанные строки не меняются (CSV или партиционированный Parquet, см. PARTITION_BY)
+APPEND_UNTIL = None  # например, datetime(2023, 7, 31)
+
+# Профилирование этапов (шагов 1-6): wall/CPU-время, пиковая память, строк в секунду —
+# отчёт в PROFILE_REPORT. PROFILE_CPROFILE / PROFILE_TRACEMALLOC — cProfile и
+# tracemalloc на каждый этап (заметно замедляют генерацию)
+PROFILE = False
+PROFILE_REPORT = "telegram_profile.json"
+PROFILE_CPROFILE = False
+PROFILE_TRACEMALLOC = False
+
+
+# Шаг 1: категория активности пользователя
 def assign_activity_category():
     rand_value = np.random.random()
     if rand_value < activity_categories['active']['percentage']:
@@ -77,33 +110,11 @@ def assign_activity_category():
     else:
         return 'rare'
 
-user_data['activity_category'] = user_data['user_id'].apply(lambda x: assign_activity_category())
-
-# Шаг 2: Премиум статус
-conversion_rate_by_activity = {
-    "active": 0.20,
-    "medium": 0.05,
-    "rare": 0.05
-}
-
-premium_user_ids = []
-
-for user in user_data.itertuples():
-    activity_category = user.activity_category
-    if np.random.random() < conversion_rate_by_activity[activity_category]:
-        premium_user_ids.append(user.user_id)
-
-user_data["is_premium"] = user_data["user_id"].isin(premium_user_ids).astype(int)
 
-# Шаг 3: Преобладающая платформа
+# Шаг 3: преобладающая платформа
 def assign_dominant_platform():
     return np.random.choice(["iOS", "Android"], p=[0.6, 0.4])
 
-user_data["dominant_platform"] = user_data["user_id"].apply(lambda x: assign_dominant_platform())
-
-# Шаг 4: Генерация логов
-logs = []
-premium_logs = []  # Создадим список для премиум логов
 
 # Контекстная логика премиум-событий
 def get_contextual_premium_event(user, timestamp):
@@ -174,7 +185,7 @@ def generate_session_events(user, session_date, session_id, event_multiplier=1.0
         used_timestamps.add(timestamp)
 
         event_type = random.choices(
-            event_types, weights=[10, 10, 15, 20, 10, 2, 0, 10, 5, 5, 8, 7], k=1
+            event_types, weights=event_type_weights, k=1
         )[0]
 
         events.append({
@@ -209,153 +220,318 @@ def generate_session_events(user, session_date, session_id, event_multiplier=1.0
     return events
 
 
-# Генерация сессий по активности и подписке
-
-premium_purchase_dates = {}
-
-for user in user_data.itertuples():
-    activity_category = user.activity_category
-    premium_date = None
-
-    # Если пользователь премиум — создаём покупку
-    if user.is_premium == 1:
-        # Генерация случайной даты покупки в период с начала до конца периода
-        premium_purchase_date = start_date + timedelta(
-            days=np.random.randint(0, (end_date - start_date).days + 1),
-            seconds=np.random.randint(0, 86400)
+# Генерация сессий по активности и подписке (исходный цикл по пользователям).
+# Faker (uuid4 для session_id) импортируется только здесь
+def generate_logs_loop(user_data, start_date=start_date, end_date=end_date, seed=SEED):
+    from faker import Faker
+
+    fake = Faker()
+    Faker.seed(seed)
+
+    logs = []
+    premium_logs = []  # Создадим список для премиум логов
+
+    premium_purchase_dates = {}
+
+    for user in user_data.itertuples():
+        activity_category = user.activity_category
+        premium_date = None
+        user_logs = []
+
+        # Если пользователь премиум — создаём покупку
+        if user.is_premium == 1:
+            # Генерация случайной даты покупки в период с начала до конца периода
+            premium_purchase_date = start_date + timedelta(
+                days=np.random.randint(0, (end_date - start_date).days + 1),
+                seconds=np.random.randint(0, 86400)
+            )
+
+            # Случайный выбор типа подписки
+            subscription_type = np.random.choice(premium_types, p=premium_type_probs)
+
+            # Событие покупки премиума
+            user_logs.append({
+                "user_id": user.user_id,
+                "session_id": fake.uuid4(),
+                "timestamp": premium_purchase_date,
+                "event_type": "buy_premium",
+                "platform": user.dominant_platform
+            })
+
+            premium_logs.append({
+                "user_id": user.user_id,
+                "timestamp": premium_purchase_date,
+                "subscription_type": subscription_type,
+                "purchase_source": np.random.choice(["in-app", "website"], p=[0.8, 0.2]),
+                "purchase_price": price_by_type[subscription_type]
+            })
+
+            premium_purchase_dates[user.user_id] = premium_purchase_date
+            premium_date = premium_purchase_date
+
+        # Генерация сессий по активности
+        if activity_category == 'active':
+            session_dates = pd.date_range(start=start_date, end=end_date, freq='D')
+            for session_date in session_dates:
+                sessions_in_day = np.random.randint(1, 3)  # 1 или 2 сессии в день
+                for _ in range(sessions_in_day):
+                    session_id = fake.uuid4()  # Генерация уникального session_id
+                    multiplier = 1.4 if premium_date and session_date >= premium_date else 1.0
+                    user_logs.extend(generate_session_events(user, session_date, session_id, event_multiplier=multiplier))
+
+        elif activity_category == 'medium':
+            weeks = pd.date_range(start=start_date, end=end_date, freq='W')
+            for week_start in weeks:
+                session_date = week_start + timedelta(days=np.random.randint(0, 7))
+                sessions_in_day = np.random.randint(1, 3)  # 1 или 2 сессии в неделю
+                for _ in range(sessions_in_day):
+                    session_id = fake.uuid4()  # Генерация уникального session_id
+                    multiplier = 1.4 if premium_date and session_date >= premium_date else 1.0
+                    user_logs.extend(generate_session_events(user, session_date, session_id, event_multiplier=multiplier))
+
+        elif activity_category == 'rare':
+            months = pd.date_range(start=start_date, end=end_date, freq='M')
+            for month_start in months:
+                session_date = month_start + timedelta(days=np.random.randint(0, 31))
+                sessions_in_day = 1  # Обычно только одна сессия в месяц
+                for _ in range(sessions_in_day):
+                    session_id = fake.uuid4()  # Генерация уникального session_id
+                    multiplier = 1.4 if premium_date and session_date >= premium_date else 1.0
+                    user_logs.extend(generate_session_events(user, session_date, session_id, event_multiplier=multiplier))
+
+        # События пользователя отдаются уже по времени (sort стабилен: при равном
+        # времени — порядок генерации), общая сортировка logs_df не нужна
+        user_logs.sort(key=itemgetter("timestamp"))
+        logs.extend(user_logs)
+
+    return pd.DataFrame(logs), pd.DataFrame(premium_logs)
+
+
+# Полная генерация (шаги 1-6) или дозапись по чекпоинту (append_until); файлы — в output_dir.
+# Возвращает число строк логов (при дозаписи — дописанных)
+def generate(total_users=total_users, start_date=start_date, end_date=end_date, seed=SEED,
+             output_dir=OUTPUT_DIR, output_format=OUTPUT_FORMAT, mode=GENERATION_MODE,
+             shard_size=SHARD_SIZE, num_workers=NUM_WORKERS, max_in_flight=MAX_IN_FLIGHT,
+             compact=COMPACT_SCHEMA, partition_by=PARTITION_BY, build_cube=BUILD_CUBE,
+             sketch_dimensions=SKETCH_DIMENSIONS, sketch_error=SKETCH_ERROR, event_store=EVENT_STORE,
+             sort_by=SORT_BY,
+             append_until=APPEND_UNTIL, profile=PROFILE, profile_report=PROFILE_REPORT,
+             profile_cprofile=PROFILE_CPROFILE, profile_tracemalloc=PROFILE_TRACEMALLOC):
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"Режим генерации — один из {GENERATION_MODES}")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    def output(name):
+        return os.path.join(output_dir, name)
+
+    checkpoint_prefix = output(CHECKPOINT_PREFIX)
+    profiler = StageProfiler(profile, output(profile_report), profile_cprofile, profile_tracemalloc)
+
+    if append_until is not None:
+        profiler.start("append_logs")
+        appended_rows = append_logs(append_until, checkpoint_prefix, num_workers=num_workers, max_in_flight=max_in_flight)
+        profiler.finish(rows=appended_rows)
+        print(f"Дописано строк логов: {appended_rows} (по {append_until:%Y-%m-%d})")
+        return appended_rows
+
+    random.seed(seed)
+    np.random.seed(seed)
+
+    # Шаг 1: Базовые данные пользователей
+    profiler.start("step_1_users")
+    user_data = pd.DataFrame({
+        "user_id": np.arange(1, total_users + 1),
+        "location": np.random.choice(locations, total_users)
+    })
+
+    user_data['activity_category'] = user_data['user_id'].apply(lambda x: assign_activity_category())
+    profiler.stop(rows=len(user_data))
+
+    # Шаг 2: Премиум статус
+    profiler.start("step_2_premium_status")
+    premium_user_ids = []
+
+    for user in user_data.itertuples():
+        activity_category = user.activity_category
+        if np.random.random() < conversion_rate_by_activity[activity_category]:
+            premium_user_ids.append(user.user_id)
+
+    user_data["is_premium"] = user_data["user_id"].isin(premium_user_ids).astype(int)
+    profiler.stop(rows=len(user_data))
+
+    # Шаг 3: Преобладающая платформа
+    profiler.start("step_3_platform")
+    user_data["dominant_platform"] = user_data["user_id"].apply(lambda x: assign_dominant_platform())
+
+    if compact:
+        user_data = apply_schema(user_data, USER_DATA_SCHEMA)
+    profiler.stop(rows=len(user_data))
+
+    # Шаг 4: Генерация логов
+    profiler.start("step_4_logs")
+
+    # Чанки (logs_df, premium_purchase_df); в шардированном режиме — ленивый поток по шардам.
+    # Процессов не больше, чем шардов: маленький прогон не поднимает пул целиком
+    if mode == "sharded":
+        log_chunks = iter_log_chunks(
+            user_data, start_date, end_date, seed,
+            shard_size=shard_size, num_workers=min(num_workers, -(-total_users // shard_size)),
+            max_in_flight=max_in_flight, compact=compact
         )
-        
-        # Случайный выбор типа подписки
-        subscription_type = np.random.choice(premium_types, p=[0.15, 0.25, 0.60])
-        
-        # Событие покупки премиума
-        logs.append({
-            "user_id": user.user_id,
-            "session_id": fake.uuid4(),
-            "timestamp": premium_purchase_date,
-            "event_type": "buy_premium",
-            "platform": user.dominant_platform
-        })
-        
-        premium_logs.append({
-            "user_id": user.user_id,
-            "timestamp": premium_purchase_date,
-            "subscription_type": subscription_type,
-            "purchase_source": np.random.choice(["in-app", "website"], p=[0.8, 0.2]),
-            "purchase_price": price_by_type[subscription_type]
-        })
-
-        premium_purchase_dates[user.user_id] = premium_purchase_date
-        premium_date = premium_purchase_date
-
-    # Генерация сессий по активности
-    if activity_category == 'active':
-        session_dates = pd.date_range(start=start_date, end=end_date, freq='D')
-        for session_date in session_dates:
-            sessions_in_day = np.random.randint(1, 3)  # 1 или 2 сессии в день
-            for _ in range(sessions_in_day):
-                session_id = fake.uuid4()  # Генерация уникального session_id
-                multiplier = 1.4 if premium_date and session_date >= premium_date else 1.0
-                logs.extend(generate_session_events(user, session_date, session_id, event_multiplier=multiplier))
-
-    elif activity_category == 'medium':
-        weeks = pd.date_range(start=start_date, end=end_date, freq='W')
-        for week_start in weeks:
-            session_date = week_start + timedelta(days=np.random.randint(0, 7))
-            sessions_in_day = np.random.randint(1, 3)  # 1 или 2 сессии в неделю
-            for _ in range(sessions_in_day):
-                session_id = fake.uuid4()  # Генерация уникального session_id
-                multiplier = 1.4 if premium_date and session_date >= premium_date else 1.0
-                logs.extend(generate_session_events(user, session_date, session_id, event_multiplier=multiplier))
-
-    elif activity_category == 'rare':
-        months = pd.date_range(start=start_date, end=end_date, freq='M')
-        for month_start in months:
-            session_date = month_start + timedelta(days=np.random.randint(0, 31))
-            sessions_in_day = 1  # Обычно только одна сессия в месяц
-            for _ in range(sessions_in_day):
-                session_id = fake.uuid4()  # Генерация уникального session_id
-                multiplier = 1.4 if premium_date and session_date >= premium_date else 1.0
-                logs.extend(generate_session_events(user, session_date, session_id, event_multiplier=multiplier))
-
-
-logs_df = pd.DataFrame(logs)
-logs_df.to_csv("telegram_logs.csv", index=False)
-
-premium_purchase_df = pd.DataFrame(premium_logs)  # Таблица премиум пользователей
-premium_purchase_df.to_csv("telegram_premium_purchases.csv", index=False)  # Сохраняем таблицу премиум пользователей
-
-print("Основные данные сгенерированы и сохранены")
-
-
-# Шаг 5: История за 2022
-historical_logs = []
-historical_users = user_data['user_id'].tolist()
-num_hist_premium = int(len(historical_users) * 0.08)
-hist_premium_ids = random.sample(historical_users, num_hist_premium)
-
-for user_id in hist_premium_ids:
-    num_purchases = np.random.choice([1, 2, 3], p=[0.6, 0.3, 0.1])
-    purchase_dates = []
-
-    for _ in range(num_purchases):
-        subscription_type = np.random.choice(premium_types, p=[0.15, 0.25, 0.60])
-        purchase_date = datetime(2022, 1, 1) + timedelta(days=np.random.randint(0, 365), seconds=np.random.randint(0, 86400))
-        while purchase_date in purchase_dates:
+    elif mode == "vectorized":
+        log_chunks = [generate_logs_vectorized(
+            user_data, start_date, end_date, np.random.default_rng(seed), compact=compact
+        )]
+    else:
+        logs_df, premium_purchase_df = generate_logs_loop(user_data, start_date, end_date, seed)
+        if compact:
+            logs_df = apply_schema(logs_df, LOGS_SCHEMA)
+            premium_purchase_df = apply_schema(premium_purchase_df, PREMIUM_SCHEMA)
+        log_chunks = [(logs_df, premium_purchase_df)]
+
+    user_location = user_data.set_index("user_id")["location"]
+    if build_cube:
+        from product_analytics.cube import CubeBuilder, cube_chunks
+
+        logs_cube = CubeBuilder(CUBE_GROUPING_SETS)
+        log_chunks = cube_chunks(log_chunks, logs_cube, lambda chunk: cube_frame(*chunk, user_location))
+    if sketch_dimensions is not None:
+        from product_analytics.cube import cube_chunks
+        from product_analytics.hll import DistinctSketches
+
+        logs_sketches = DistinctSketches(sketch_dimensions, error=sketch_error)
+        log_chunks = cube_chunks(log_chunks, logs_sketches, lambda chunk: cube_frame(*chunk, user_location))
+
+    # Сохраняем логи и таблицу премиум пользователей по мере генерации;
+    # число сессий и покупки копятся для чекпоинта
+    session_counts, premium_purchases = [], []
+    with chunk_writer(output(f"telegram_logs.{output_format}"), partition_by=partition_by) as logs_writer, \
+            chunk_writer(output(f"telegram_premium_purchases.{output_format}")) as premium_writer, \
+            (chunk_writer(output("telegram_logs.events")) if event_store else nullcontext()) as store_writer:
+        if event_store:
+            log_chunks = tee_chunks(log_chunks, store_writer, lambda chunk: chunk[0])
+        log_chunks = track_chunks(log_chunks, session_counts, premium_purchases)
+        if sort_by is not None:
+            from product_analytics.external_sort import SORT_KEYS, external_sort
+
+            # Покупки пишутся по ходу, через сортировку идут только логи
+            logs_chunks = (logs_df for logs_df, _ in tee_chunks(log_chunks, premium_writer, lambda chunk: chunk[1]))
+            for logs_chunk in external_sort(logs_chunks, SORT_KEYS[sort_by], directory=output_dir or None):
+                logs_writer.write(logs_chunk)
+        else:
+            write_chunks(log_chunks, [logs_writer, premium_writer])
+
+    save_logs_checkpoint(user_data, session_counts, premium_purchases, {
+        "seed": seed,
+        "shard_size": shard_size,
+        "compact": compact,
+        "output_format": output_format,
+        "logs_path": logs_writer.path,
+        "partition_by": partition_by,
+        "start_date": start_date,
+        "end_date": end_date,
+    }, prefix=checkpoint_prefix)
+
+    if build_cube:
+        write_table(logs_cube.result(), output(f"telegram_cube.{output_format}"))
+    if sketch_dimensions is not None:
+        logs_sketches.save(output("telegram_sketches.npz"))
+    profiler.stop(rows=logs_writer.rows)
+    print("Основные данные сгенерированы и сохранены")
+
+
+    # Шаг 5: История за 2022
+    profiler.start("step_5_history_2022")
+    historical_logs = []
+    historical_users = user_data['user_id'].tolist()
+    num_hist_premium = int(len(historical_users) * 0.08)
+    hist_premium_ids = random.sample(historical_users, num_hist_premium)
+
+    for user_id in hist_premium_ids:
+        num_purchases = np.random.choice([1, 2, 3], p=[0.6, 0.3, 0.1])
+        purchase_dates = []
+
+        for _ in range(num_purchases):
+            subscription_type = np.random.choice(premium_types, p=premium_type_probs)
             purchase_date = datetime(2022, 1, 1) + timedelta(days=np.random.randint(0, 365), seconds=np.random.randint(0, 86400))
-        purchase_dates.append(purchase_date)
-
-        historical_logs.append({
-            "user_id": user_id,
-            "timestamp": purchase_date,
-            "subscription_type": subscription_type,
-            "purchase_source": np.random.choice(["in-app", "website"], p=[0.8, 0.2]),
-            "purchase_price": price_by_type[subscription_type]
-        })
-
-premium_logs_df_hist = pd.DataFrame(historical_logs)
-
-def calculate_subscription_periods(premium_df):
-    months = {"3_months": 3, "6_months": 6, "12_months": 12}
-    premium_df = premium_df.sort_values(by=["user_id", "timestamp"])
-
-    result = []
-    current_ends = {}
-
-    for row in premium_df.itertuples():
-        user_id = row.user_id
-        sub_months = months[row.subscription_type]
-        purchase_time = row.timestamp
-
-        prev_end = current_ends.get(user_id, purchase_time)
-        new_start = max(purchase_time, prev_end)
-        new_end = new_start + DateOffset(months=sub_months)
-        current_ends[user_id] = new_end
-
-        result.append(new_end)
-
-    premium_df["subscription_end"] = result
-    return premium_df
-
-# Шаг 6: Обновление статуса на 30.06.2023
-
-# Применяем логику подписки
-premium_logs_df_hist = calculate_subscription_periods(premium_logs_df_hist)
-
-# premium_logs_df_hist['subscription_end'] = premium_logs_df_hist.apply(get_subscription_end, axis=1)
-check_date = pd.Timestamp("2023-06-30")
-
-active_premium = premium_logs_df_hist[
-    (premium_logs_df_hist['timestamp'] <= check_date) &
-    (premium_logs_df_hist['subscription_end'] > check_date)
-]['user_id'].unique()
-
-user_data['is_premium'] = user_data['user_id'].isin(active_premium).astype(int)
-user_data.to_csv("telegram_user_data.csv", index=False)
-
-premium_logs_df_hist.to_csv("telegram_premium_historical_2022.csv", index=False)
-print("Исторические данные за 2022 год сохранены")
-
-print("Флаг is_premium обновлён на основе данных на 01.01.2023")
+            while purchase_date in purchase_dates:
+                purchase_date = datetime(2022, 1, 1) + timedelta(days=np.random.randint(0, 365), seconds=np.random.randint(0, 86400))
+            purchase_dates.append(purchase_date)
+
+            historical_logs.append({
+                "user_id": user_id,
+                "timestamp": purchase_date,
+                "subscription_type": subscription_type,
+                "purchase_source": np.random.choice(["in-app", "website"], p=[0.8, 0.2]),
+                "purchase_price": price_by_type[subscription_type]
+            })
+
+    premium_logs_df_hist = pd.DataFrame(historical_logs)
+    profiler.stop(rows=len(premium_logs_df_hist))
+
+    # Шаг 6: Обновление статуса на 30.06.2023
+    profiler.start("step_6_status_update")
+
+    # Применяем логику подписки: цепочки подписок считаются векторно по номеру покупки
+    premium_logs_df_hist = subscription_ends(premium_logs_df_hist)
+
+    # Индекс премиум-интервалов отвечает на статус для любых дат без пересчёта подписок
+    # (например, premium_index.status_frame(user_ids, pd.date_range(...)) по дням)
+    premium_index = PremiumIntervals(premium_logs_df_hist)
+    check_date = pd.Timestamp("2023-06-30")
+
+    user_data['is_premium'] = premium_index.is_premium(user_data['user_id'], check_date).astype(int)
+    write_table(user_data, output(f"telegram_user_data.{output_format}"))
+
+    if compact:
+        premium_logs_df_hist = apply_schema(premium_logs_df_hist, PREMIUM_SCHEMA)
+    write_table(premium_logs_df_hist, output(f"telegram_premium_historical_2022.{output_format}"))
+    profiler.finish(rows=len(user_data))
+    print("Исторические данные за 2022 год сохранены")
+
+    print("Флаг is_premium обновлён на основе данных на 01.01.2023")
+    return logs_writer.rows
+
+
+def _date(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Генерация логов Telegram")
+    parser.add_argument("--users", type=int, default=total_users, help="число пользователей")
+    parser.add_argument("--start", type=_date, default=start_date, help="начало периода, YYYY-MM-DD")
+    parser.add_argument("--end", type=_date, default=end_date, help="конец периода, YYYY-MM-DD")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="каталог для файлов (по умолчанию текущий)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default=OUTPUT_FORMAT)
+    parser.add_argument("--mode", choices=GENERATION_MODES, default=GENERATION_MODE)
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--compact", action="store_true", default=COMPACT_SCHEMA, help="компактная схема")
+    parser.add_argument("--partition-by", nargs="+", default=PARTITION_BY, help="партиции логов (parquet)")
+    parser.add_argument("--cube", action="store_true", default=BUILD_CUBE, help="агрегатный куб")
+    parser.add_argument("--sketch-dimensions", nargs="*", default=SKETCH_DIMENSIONS, help="HLL-скетчи по измерениям")
+    parser.add_argument("--event-store", action="store_true", default=EVENT_STORE, help="event store логов")
+    parser.add_argument("--sort-by", choices=["timestamp", "user"], default=SORT_BY,
+                        help="внешняя сортировка таблицы логов")
+    parser.add_argument("--append-until", type=_date, default=APPEND_UNTIL, help="дозапись по чекпоинту до даты")
+    parser.add_argument("--profile", action="store_true", default=PROFILE, help="профиль этапов в PROFILE_REPORT")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    generate(
+        total_users=args.users, start_date=args.start, end_date=args.end, seed=args.seed,
+        output_dir=args.output_dir, output_format=args.format, mode=args.mode,
+        shard_size=args.shard_size, num_workers=args.workers, max_in_flight=2 * args.workers,
+        compact=args.compact, partition_by=args.partition_by, build_cube=args.cube,
+        sketch_dimensions=args.sketch_dimensions, event_store=args.event_store, sort_by=args.sort_by,
+        append_until=args.append_until, profile=args.profile,
+    )
 
 
+if __name__ == "__main__":
+    main()
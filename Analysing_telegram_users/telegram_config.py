@@ -0,0 +1,60 @@
+# Общие параметры генерации логов Telegram
+# (используются и скриптом gen_logs_telegram_script_v4.py, и векторным движком telegram_engine.py)
+
+event_types = [
+    "view_main_screen", "open_dialog", "send_message", "open_chat", "send_sticker",
+    "buy_gift", "buy_premium", "react_to_message", "voice_call", "video_call",
+    "send_voice_message", "send_video_message"
+]
+
+# Веса обычных событий внутри сессии (buy_premium пишется отдельно, поэтому 0)
+event_type_weights = [10, 10, 15, 20, 10, 2, 0, 10, 5, 5, 8, 7]
+
+premium_event_types = [
+    "use_custom_emoji", "post_story", "voice_to_text", "extra_cloud_storage",
+    "emoji_status_profile", "custom_profile", "telegram_app_icon",
+    "animated_profile_picture", "extra_reactions"
+]
+
+premium_event_weights = {
+    "voice_to_text": 0.22,
+    "emoji_status_profile": 0.10,
+    "extra_reactions": 0.16,
+    "post_story": 0.12,
+    "use_custom_emoji": 0.16,
+    "extra_cloud_storage": 0.08,
+    "custom_profile": 0.05,
+    "telegram_app_icon": 0.05,
+    "animated_profile_picture": 0.06
+}
+
+premium_types = ["3_months", "6_months", "12_months"]
+premium_type_probs = [0.15, 0.25, 0.60]
+price_by_type = {
+    "3_months": 899,
+    "6_months": 1690,
+    "12_months": 3190
+}
+
+purchase_sources = ["in-app", "website"]
+purchase_source_probs = [0.8, 0.2]
+
+locations = ["Moscow", "Saint Petersburg", "Novosibirsk", "Ekaterinburg", "Kazan", "Nizhny Novgorod"]
+
+platforms = ["iOS", "Android"]
+platform_probs = [0.6, 0.4]
+
+activity_categories = {
+    'active': {'percentage': 0.20, 'min_sessions': 15, 'max_sessions': 30, 'min_events': 20, 'max_events': 40},
+    'medium': {'percentage': 0.50, 'min_sessions': 8, 'max_sessions': 20, 'min_events': 10, 'max_events': 20},
+    'rare': {'percentage': 0.30, 'min_sessions': 3, 'max_sessions': 8, 'min_events': 1, 'max_events': 10}
+}
+
+conversion_rate_by_activity = {
+    "active": 0.20,
+    "medium": 0.05,
+    "rare": 0.05
+}
+
+# Множитель числа событий в сессиях после покупки премиума
+premium_event_multiplier = 1.4
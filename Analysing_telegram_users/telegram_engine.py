@@ -0,0 +1,419 @@
+# Векторный движок генерации логов Telegram.
+# Вместо цикла "пользователь -> сессия -> событие" все величины (число событий,
+# время начала сессии, интервалы между событиями, типы событий) тянутся сразу
+# для целой когорты активности массивами NumPy, а logs_df собирается по колонкам.
+# Распределения совпадают со скриптом gen_logs_telegram_script_v4.py.
+
+import numpy as np
+import pandas as pd
+
+from product_analytics.schema import category, session_ids, apply_schema
+from product_analytics.sharding import shard_ranges, shard_seeds, iter_sharded
+from telegram_config import (
+    activity_categories, event_types, event_type_weights, premium_event_types,
+    premium_types, premium_type_probs, price_by_type, purchase_sources,
+    purchase_source_probs, premium_event_multiplier, locations, platforms
+)
+
+# Код события = индекс в этом списке (обычные события + премиум-фичи)
+all_event_types = event_types + premium_event_types
+event_codes = {name: code for code, name in enumerate(all_event_types)}
+
+# Код платформы сессии: доминирующая платформа пользователя или Desktop
+session_platforms = ["iOS", "Android", "Desktop"]
+DESKTOP = 2
+
+SECONDS_IN_DAY = 86400
+
+# Компактная схема таблиц (compact=True): category + datetime64[s], session_id — int64
+LOGS_SCHEMA = {
+    "timestamp": "datetime64[s]",
+    "event_type": category(all_event_types),
+    "platform": category(session_platforms),
+}
+PREMIUM_SCHEMA = {
+    "timestamp": "datetime64[s]",
+    "subscription_type": category(premium_types),
+    "purchase_source": category(purchase_sources),
+    "subscription_end": "datetime64[s]",
+}
+USER_DATA_SCHEMA = {
+    "location": category(locations),
+    "activity_category": category(activity_categories),
+    "dominant_platform": category(platforms),
+}
+
+# Номер потока RNG для логов в шардированном режиме
+LOGS_STREAM = 1
+
+# Наборы измерений агрегатного куба логов (product_analytics.cube): детальный срез,
+# DAU/WAU/MAU, пользователи по событиям и по сегментам за день
+CUBE_GROUPING_SETS = [
+    ("day", "event_type", "platform", "location", "is_premium"),
+    ("day",), ("week",), ("month",),
+    ("day", "event_type"), ("week", "event_type"), ("month", "event_type"),
+    ("day", "platform"), ("day", "location"), ("day", "is_premium"),
+]
+
+_event_probs = np.array(event_type_weights, dtype=float) / sum(event_type_weights)
+
+
+def _weekday(days):
+    # 1970-01-01 — четверг, понедельник = 0
+    return (days.astype(np.int64) + 3) % 7
+
+
+# Сетка сессий когорты: те же правила, что и в цикле скрипта
+def _cohort_session_grid(activity, n_users, start_date, end_date, rng):
+    days = np.arange(np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D') + 1)
+
+    if activity == 'active':
+        # Каждый день 1 или 2 сессии
+        slot_dates = np.broadcast_to(days, (n_users, len(days)))
+        per_slot = rng.integers(1, 3, size=(n_users, len(days)))
+    elif activity == 'medium':
+        # Раз в неделю (воскресенья, как freq='W') со случайным сдвигом, 1 или 2 сессии
+        weeks = days[_weekday(days) == 6]
+        slot_dates = weeks + rng.integers(0, 7, size=(n_users, len(weeks)))
+        per_slot = rng.integers(1, 3, size=(n_users, len(weeks)))
+    else:
+        # Раз в месяц (концы месяцев, как freq='M') со сдвигом до 30 дней
+        month_ends = days[days.astype('M8[M]') != (days + 1).astype('M8[M]')]
+        slot_dates = month_ends + rng.integers(0, 31, size=(n_users, len(month_ends)))
+        per_slot = np.ones((n_users, len(month_ends)), dtype=np.int64)
+
+    user_pos = np.repeat(np.arange(n_users), per_slot.sum(axis=1))
+    session_dates = np.repeat(slot_dates.ravel(), per_slot.ravel())
+    return user_pos, session_dates
+
+
+# Время начала сессии (секунды от полуночи): будни — 70% вечер, выходные — 50/50 день/вечер
+def _session_start_seconds(session_dates, rng):
+    is_weekday = _weekday(session_dates) < 5
+    u = rng.random(len(session_dates))
+    evening = np.where(is_weekday, u < 0.7, u >= 0.5)
+
+    low = np.where(evening, 18 * 3600, np.where(is_weekday, 0, 10 * 3600))
+    high = np.where(evening, 24 * 3600, np.where(is_weekday, SECONDS_IN_DAY - 3600, 18 * 3600))
+    return rng.integers(low, high)
+
+
+# session_id в формате uuid4, пачкой из байтов генератора
+_hex_digits = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+
+
+def uuid4_strings(n, rng):
+    raw = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+
+    hex_chars = np.empty((n, 32), dtype=np.uint8)
+    hex_chars[:, 0::2] = _hex_digits[raw >> 4]
+    hex_chars[:, 1::2] = _hex_digits[raw & 0x0F]
+    chars = np.insert(hex_chars, [8, 12, 16, 20], ord("-"), axis=1)
+    return chars.view("S36").ravel().astype(str).astype(object)
+
+
+# Покупки премиума за период (шаг 4 скрипта): дата, тип подписки, источник
+def generate_premium_purchases(user_data, start_date, end_date, rng):
+    buyers = user_data.loc[user_data["is_premium"] == 1, "user_id"].to_numpy()
+    n = len(buyers)
+
+    days = rng.integers(0, (end_date - start_date).days + 1, n)
+    seconds = rng.integers(0, SECONDS_IN_DAY, n)
+    timestamps = np.datetime64(start_date, 's') + days * SECONDS_IN_DAY + seconds
+
+    subscription_type = np.asarray(premium_types, dtype=object)[
+        rng.choice(len(premium_types), n, p=premium_type_probs)
+    ]
+    purchase_source = np.asarray(purchase_sources, dtype=object)[
+        rng.choice(len(purchase_sources), n, p=purchase_source_probs)
+    ]
+
+    return pd.DataFrame({
+        "user_id": buyers,
+        "timestamp": timestamps,
+        "subscription_type": subscription_type,
+        "purchase_source": purchase_source,
+        "purchase_price": pd.Series(subscription_type).map(price_by_type).to_numpy()
+    })
+
+
+# Сессии всех пользователей по когортам активности
+def _generate_sessions(user_data, premium_ts, start_date, end_date, rng):
+    dominant = pd.Index(session_platforms).get_indexer(user_data["dominant_platform"])
+    is_premium = user_data["is_premium"].to_numpy() == 1
+    user_ids = user_data["user_id"].to_numpy()
+    categories = user_data["activity_category"].to_numpy()
+
+    parts = []
+    for activity, params in activity_categories.items():
+        cohort = np.flatnonzero(categories == activity)
+        if len(cohort) == 0:
+            continue
+
+        user_pos, session_dates = _cohort_session_grid(activity, len(cohort), start_date, end_date, rng)
+        users = cohort[user_pos]
+        n = len(users)
+
+        # Множитель 1.4 для сессий после покупки премиума (NaT -> False)
+        boosted = session_dates.astype('M8[s]') >= premium_ts[users]
+        multiplier = np.where(boosted, premium_event_multiplier, 1.0)
+        events_count = rng.integers(
+            (params['min_events'] * multiplier).astype(np.int64),
+            (params['max_events'] * multiplier).astype(np.int64) + 1
+        )
+
+        is_mobile = rng.random(n) < 0.80
+        platform = np.where(is_mobile, dominant[users], DESKTOP)
+
+        start = session_dates.astype('M8[s]').astype(np.int64) + _session_start_seconds(session_dates, rng)
+
+        parts.append({
+            "user": users,
+            "start": start,
+            "events_count": events_count,
+            "platform": platform,
+            "premium_boost": boosted & is_premium[users],
+        })
+
+    sessions = {key: np.concatenate([part[key] for part in parts]) for key in parts[0]}
+    sessions["user_id"] = user_ids[sessions["user"]]
+    sessions["dominant"] = dominant[sessions["user"]]
+    return sessions
+
+
+# Номер сессии внутри пользователя (сессии одного пользователя идут подряд)
+def _session_numbers(users):
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]])
+    first = np.repeat(starts, np.diff(np.r_[starts, len(users)]))
+    return np.arange(len(users)) - first
+
+
+# Обычные события сессий: интервалы 2-9 секунд, типы по event_type_weights
+def _expand_events(sessions, rng):
+    counts = sessions["events_count"]
+    total = int(counts.sum())
+    session = np.repeat(np.arange(len(counts)), counts)
+
+    deltas = rng.integers(2, 10, size=total)
+    cumulative = np.cumsum(deltas)
+    first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    before_session = np.repeat(np.concatenate(([0], cumulative))[first], counts)
+    position = np.arange(total) - np.repeat(first, counts)
+
+    return {
+        "session": session,
+        "timestamp": sessions["start"][session] + cumulative - before_session,
+        "event_code": rng.choice(len(event_types), size=total, p=_event_probs),
+        "order": position * 4,
+    }
+
+
+# Контекстные премиум-фичи: ночь 0-6 / день 7-17 / вечер 18-23, на iOS вечером чаще
+# меняют иконку. Таблицы час × платформа (коды session_platforms): коды фич и
+# кумулятивные вероятности, дополненные до PREMIUM_CHOICES вариантов (cum = 1.0)
+PREMIUM_CHOICES = 3
+_premium_periods = {
+    "night": (["extra_cloud_storage", "emoji_status_profile"], [0.7, 0.3]),
+    "day": (["voice_to_text", "post_story", "use_custom_emoji"], [0.4, 0.3, 0.3]),
+    "evening": (["extra_reactions", "telegram_app_icon", "animated_profile_picture"], [0.5, 0.3, 0.2]),
+    "evening_ios": (["extra_reactions", "telegram_app_icon", "animated_profile_picture"], [0.4, 0.4, 0.2]),
+}
+
+
+def _premium_feature_tables():
+    codes = np.zeros((24, len(session_platforms), PREMIUM_CHOICES), dtype=np.int64)
+    cum = np.ones((24, len(session_platforms), PREMIUM_CHOICES))
+    for hour in range(24):
+        for platform in range(len(session_platforms)):
+            if hour <= 6:
+                period = "night"
+            elif hour <= 17:
+                period = "day"
+            else:
+                period = "evening_ios" if session_platforms[platform] == "iOS" else "evening"
+            features, weights = _premium_periods[period]
+            codes[hour, platform] = [event_codes[features[min(i, len(features) - 1)]] for i in range(PREMIUM_CHOICES)]
+            cum[hour, platform, :len(weights)] = np.cumsum(weights)
+    return codes, cum
+
+
+_premium_codes, _premium_cum = _premium_feature_tables()
+_num_premium_cum = np.cumsum([0.6, 0.3, 0.1])
+
+
+# Фичи для массивов часов и платформ: одна равномерная величина на событие,
+# номер варианта — число кумулятивных вероятностей строки таблицы, не больших u
+def _contextual_premium_codes(hour, platform, rng):
+    u = rng.random(len(hour))
+    pick = np.minimum((u[:, None] >= _premium_cum[hour, platform]).sum(axis=1), PREMIUM_CHOICES - 1)
+    return _premium_codes[hour, platform, pick]
+
+
+# Уникальные секунды внутри сессии без циклов по строкам: строки сортируются по
+# (сессия, время, порядок), и k-я строка сессии получает max(t_k, t_{k-1}' + 1) =
+# k + max_{j<=k}(t_j - j). Накопленный максимум по сессиям — один maximum.accumulate:
+# сессия s сдвинута на s * span, поэтому максимум не переходит из предыдущей сессии
+def _unique_session_timestamps(session, timestamp, order):
+    n = len(session)
+    if n == 0:
+        return timestamp
+    rows = np.lexsort((order, timestamp, session))
+    sorted_session = session[rows]
+    first = np.r_[True, sorted_session[1:] != sorted_session[:-1]]
+    rank = np.arange(n) - np.maximum.accumulate(np.where(first, np.arange(n), 0))
+    value = timestamp[rows] - rank
+    low = value.min()
+    span = value.max() - low + 1
+    segment = np.cumsum(first) - 1
+    shifted = np.maximum.accumulate(value - low + segment * span) - segment * span + low
+    result = np.empty_like(timestamp)
+    result[rows] = shifted + rank
+    return result
+
+
+# Премиум-события после покупки, пачкой для всех подходящих событий: каждое событие
+# сессии с premium_boost с вероятностью 0.7 даёт 1-3 фичи через 1-4 секунды, тип —
+# по таблице час × платформа пользователя. Совпадающие секунды внутри сессии
+# разводятся вперёд _unique_session_timestamps (как used_timestamps в скрипте)
+def _inject_premium_events(sessions, events, rng):
+    boosted = sessions["premium_boost"][events["session"]]
+    parent = np.flatnonzero(boosted)
+    parent = parent[rng.random(len(parent)) < 0.7]
+    num_premium_events = np.searchsorted(_num_premium_cum, rng.random(len(parent)), side="right") + 1
+
+    parent = np.repeat(parent, num_premium_events)
+    j = np.arange(len(parent)) - np.repeat(np.cumsum(num_premium_events) - num_premium_events, num_premium_events)
+    parent_timestamp = events["timestamp"][parent]
+    extra_session = events["session"][parent]
+    extra_code = _contextual_premium_codes(
+        (parent_timestamp // 3600) % 24, sessions["dominant"][extra_session], rng
+    )
+
+    session = np.concatenate([events["session"], extra_session])
+    timestamp = np.concatenate([events["timestamp"], parent_timestamp + rng.integers(1, 5, len(parent))])
+    order = np.concatenate([events["order"], events["order"][parent] + j + 1])
+    boosted_rows = np.flatnonzero(np.concatenate([boosted, np.ones(len(parent), dtype=bool)]))
+    timestamp[boosted_rows] = _unique_session_timestamps(
+        session[boosted_rows], timestamp[boosted_rows], order[boosted_rows]
+    )
+
+    return {
+        "session": session,
+        "timestamp": timestamp,
+        "event_code": np.concatenate([events["event_code"], extra_code]),
+        "order": order,
+    }
+
+
+# Логи для набора пользователей: события сессий + buy_premium, отсортированные по
+# (user_id, timestamp); при равном времени — покупка, дальше сессии и события
+# по порядку генерации (как в скрипте). Шарды идут по возрастанию user_id, поэтому
+# поток чанков уже упорядочен по (user_id, timestamp) без общей сортировки.
+# compact=True — int64 session_id (покупка — сессия 0) и категориальные колонки.
+# resume=True — продолжение из чекпоинта: покупки уже были, время покупки берётся
+# из колонки premium_ts, нумерация сессий продолжается с колонки sessions
+def generate_logs_vectorized(user_data, start_date, end_date, rng, compact=False, resume=False):
+    premium_purchase_df = generate_premium_purchases(
+        user_data.iloc[:0] if resume else user_data, start_date, end_date, rng
+    )
+    buyer_pos = pd.Index(user_data["user_id"]).get_indexer(premium_purchase_df["user_id"])
+
+    if resume:
+        premium_ts = user_data["premium_ts"].to_numpy().astype('M8[s]')
+        session_offset = user_data["sessions"].to_numpy(dtype=np.int64)
+    else:
+        premium_ts = np.full(len(user_data), np.datetime64("NaT"), dtype='M8[s]')
+        premium_ts[buyer_pos] = premium_purchase_df["timestamp"].to_numpy().astype('M8[s]')
+        session_offset = np.zeros(len(user_data), dtype=np.int64)
+
+    sessions = _generate_sessions(user_data, premium_ts, start_date, end_date, rng)
+    events = _inject_premium_events(sessions, _expand_events(sessions, rng), rng)
+
+    n_sessions = len(sessions["user"])
+    n_buys = len(premium_purchase_df)
+    if compact:
+        all_session_ids = session_ids(
+            np.concatenate([sessions["user_id"], premium_purchase_df["user_id"].to_numpy()]),
+            np.concatenate([
+                session_offset[sessions["user"]] + _session_numbers(sessions["user"]) + 1,
+                np.zeros(n_buys, dtype=np.int64)
+            ])
+        )
+    else:
+        all_session_ids = uuid4_strings(n_sessions + n_buys, rng)
+
+    dominant = pd.Index(session_platforms).get_indexer(user_data["dominant_platform"])
+    session = events["session"]
+
+    user_id = np.concatenate([sessions["user_id"][session], premium_purchase_df["user_id"].to_numpy()])
+    timestamp = np.concatenate([events["timestamp"], premium_ts[buyer_pos].astype(np.int64)])
+    event_code = np.concatenate([events["event_code"], np.full(n_buys, event_codes["buy_premium"])])
+    platform = np.concatenate([sessions["platform"][session], dominant[buyer_pos]])
+    session_rank = np.concatenate([session, np.full(n_buys, -1)])
+    order = np.concatenate([events["order"], np.zeros(n_buys, dtype=np.int64)])
+    row_session = np.concatenate([session, n_sessions + np.arange(n_buys)])
+
+    rows = np.lexsort((order, session_rank, timestamp, user_id))
+    event_code = event_code[rows]
+    platform = platform[rows]
+
+    if compact:
+        event_type = pd.Categorical.from_codes(event_code, dtype=LOGS_SCHEMA["event_type"])
+        platform = pd.Categorical.from_codes(platform, dtype=LOGS_SCHEMA["platform"])
+        premium_purchase_df = apply_schema(premium_purchase_df, PREMIUM_SCHEMA)
+    else:
+        event_type = np.asarray(all_event_types, dtype=object)[event_code]
+        platform = np.asarray(session_platforms, dtype=object)[platform]
+
+    logs_df = pd.DataFrame({
+        "user_id": user_id[rows],
+        "session_id": all_session_ids[row_session[rows]],
+        "timestamp": timestamp[rows].astype('M8[s]'),
+        "event_type": event_type,
+        "platform": platform,
+    })
+    return logs_df, premium_purchase_df
+
+
+# Один шард пользователей со своим потоком RNG (верхний уровень модуля — для пула процессов)
+def generate_shard(task):
+    user_data, start_date, end_date, seed_seq, compact, resume = task
+    return generate_logs_vectorized(user_data, start_date, end_date, np.random.default_rng(seed_seq), compact, resume)
+
+
+# Поток чанков (logs_df, premium_purchase_df): user_data режется на диапазоны
+# по shard_size пользователей, каждый шард считается в своём процессе со своим
+# потоком RNG, чанки отдаются в порядке шардов. В памяти одновременно не больше
+# max_in_flight шардов, поэтому пиковая память задаётся shard_size, а не total_users.
+# epoch и resume — дозапись нового периода из чекпоинта (telegram_increment.py)
+def iter_log_chunks(user_data, start_date, end_date, seed, shard_size=1000, num_workers=1, max_in_flight=None,
+                    compact=False, epoch=0, resume=False):
+    user_data = user_data.sort_values("user_id")
+    shards = shard_ranges(len(user_data), shard_size)
+    seeds = shard_seeds(seed, LOGS_STREAM, len(shards), epoch)
+    tasks = (
+        (user_data.iloc[start:stop], start_date, end_date, seed_seq, compact, resume)
+        for (start, stop), seed_seq in zip(shards, seeds)
+    )
+    return iter_sharded(generate_shard, tasks, num_workers, max_in_flight)
+
+
+# Шардированная генерация целиком в памяти (склейка чанков)
+def generate_logs_sharded(user_data, start_date, end_date, seed, shard_size=1000, num_workers=1, compact=False):
+    chunks = list(iter_log_chunks(user_data, start_date, end_date, seed, shard_size, num_workers, compact=compact))
+    logs_df = pd.concat([logs for logs, _ in chunks], ignore_index=True)
+    premium_purchase_df = pd.concat([premium for _, premium in chunks], ignore_index=True)
+    return logs_df, premium_purchase_df
+
+
+# Строки логов с измерениями куба: город пользователя (user_location — Series
+# user_id -> location) и премиум на момент события (после покупки в чанке)
+def cube_frame(logs_df, premium_purchase_df, user_location):
+    premium_ts = premium_purchase_df.groupby("user_id")["timestamp"].min()
+    purchase = logs_df["user_id"].map(premium_ts).astype(logs_df["timestamp"].dtype)
+    return logs_df[["user_id", "timestamp", "event_type", "platform"]].assign(
+        location=logs_df["user_id"].map(user_location),
+        is_premium=(logs_df["timestamp"] >= purchase).astype(int),
+    )
@@ -0,0 +1,92 @@
+# Инкрементальная дозапись логов Telegram.
+# После полной генерации в чекпоинт сохраняется состояние пользователей: категория
+# активности, платформа, статус и время покупки премиума и число сессий.
+# append_logs дописывает в конец telegram_logs только новый период,
+# уже записанные строки и история покупок не пересчитываются.
+#
+# Ограничение: инкремент не генерирует покупок премиума. Как и в полной генерации,
+# премиум-статус — свойство пользователя, и после покупки сессии остаются усиленными;
+# но покупатели купили в базовом периоде, а продлений и новых покупателей нет,
+# поэтому дописанные периоды не совпадают по распределению с полной генерацией
+# на весь срок (и в telegram_premium_purchases ничего не дописывается).
+# Прерванная дозапись откатывается при повторе (product_analytics.checkpoint)
+
+from datetime import timedelta
+
+import pandas as pd
+
+from product_analytics.checkpoint import (
+    load_checkpoint, save_checkpoint, data_size, append_prefix, rollback_append
+)
+from product_analytics.streaming import chunk_writer
+from telegram_engine import iter_log_chunks, USER_DATA_SCHEMA
+
+CHECKPOINT_PREFIX = "telegram"
+
+STATE_COLUMNS = ["user_id", "location", "activity_category", "dominant_platform", "is_premium"]
+STATE_SCHEMA = {
+    **USER_DATA_SCHEMA,
+    "premium_ts": "datetime64[s]",
+}
+
+
+# Число сессий пользователей в чанке логов (buy_premium — не сессия)
+def session_counts(logs_df):
+    sessions = logs_df.loc[logs_df["event_type"] != "buy_premium", ["user_id", "session_id"]]
+    return sessions.groupby("user_id")["session_id"].nunique()
+
+
+# Поток чанков (logs_df, premium_purchase_df) без изменений; по дороге
+# копятся число сессий и покупки для состояния чекпоинта
+def track_chunks(chunks, counts, purchases):
+    for logs_df, premium_purchase_df in chunks:
+        counts.append(session_counts(logs_df))
+        purchases.append(premium_purchase_df)
+        yield logs_df, premium_purchase_df
+
+
+# Состояние пользователей на конец сгенерированного периода
+def build_state(user_data, counts, purchases):
+    state = user_data[STATE_COLUMNS].copy()
+
+    purchases = pd.concat(purchases, ignore_index=True)
+    state["premium_ts"] = state["user_id"].map(purchases.groupby("user_id")["timestamp"].min())
+
+    sessions = pd.concat(counts).groupby(level=0).sum()
+    state["sessions"] = state["user_id"].map(sessions).fillna(0).astype("int64")
+    return state
+
+
+def save_logs_checkpoint(user_data, counts, purchases, meta, prefix=CHECKPOINT_PREFIX):
+    meta = {**meta, "epoch": 0, "data_size": data_size(meta["logs_path"])}
+    save_checkpoint(prefix, meta, build_state(user_data, counts, purchases))
+
+
+# Дописывает логи за (end_date чекпоинта, until] и сдвигает чекпоинт; возвращает число строк.
+# Поток RNG инкремента — (seed, шард, epoch), поэтому повтор из того же чекпоинта
+# даёт те же строки
+def append_logs(until, prefix=CHECKPOINT_PREFIX, num_workers=1, max_in_flight=None):
+    meta, state = load_checkpoint(prefix, STATE_SCHEMA)
+    start = meta["end_date"] + timedelta(days=1)
+    if until < start:
+        raise ValueError(f"Период до {until:%Y-%m-%d} уже сгенерирован (по {meta['end_date']:%Y-%m-%d})")
+
+    epoch = meta["epoch"] + 1
+    rollback_append(meta["logs_path"], meta.get("data_size"), epoch)
+    chunks = iter_log_chunks(
+        state, start, until, meta["seed"], meta["shard_size"], num_workers, max_in_flight,
+        compact=meta["compact"], epoch=epoch, resume=True
+    )
+
+    counts = []
+    with chunk_writer(meta["logs_path"], append=True, partition_by=meta.get("partition_by"),
+                      prefix=append_prefix(epoch)) as logs_writer:
+        for logs_df, _ in chunks:
+            counts.append(session_counts(logs_df))
+            logs_writer.write(logs_df)
+
+    new_sessions = pd.concat(counts).groupby(level=0).sum()
+    state["sessions"] += state["user_id"].map(new_sessions).fillna(0).astype("int64")
+    save_checkpoint(prefix, {**meta, "end_date": until, "epoch": epoch, "data_size": data_size(meta["logs_path"])},
+                    state)
+    return logs_writer.rows
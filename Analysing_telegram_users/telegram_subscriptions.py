@@ -0,0 +1,124 @@
+# Периоды премиум-подписок Telegram.
+# subscription_ends считает цепочки подписок (новая начинается не раньше конца
+# предыдущей) векторно: цикл идёт по номеру покупки пользователя, а не по строкам.
+# PremiumIntervals — индекс интервалов [покупка, subscription_end) по пользователям,
+# отвечает "кто премиум в момент T" бинарным поиском для массивов дат.
+# premium_cohorts — когортные матрицы подписок (удержание, выручка, отток).
+
+import numpy as np
+import pandas as pd
+
+from product_analytics.cohorts import subscription_cohorts
+
+months_by_type = {"3_months": 3, "6_months": 6, "12_months": 12}
+
+# Сдвиг номера пользователя в составном ключе (номер << 32) + секунды с 1970
+_USER_SHIFT = 32
+
+
+# Векторный аналог ts + DateOffset(months=n): тот же день месяца (обрезается до
+# последнего дня целевого месяца) и то же время суток
+def add_months(timestamps, months):
+    ts = np.asarray(timestamps, dtype="datetime64[ns]")
+    month = ts.astype("datetime64[M]")
+    day = ts.astype("datetime64[D]")
+    day_of_month = day - month.astype("datetime64[D]")
+    time_of_day = ts - day.astype("datetime64[ns]")
+
+    target = month + np.asarray(months).astype("timedelta64[M]")
+    target_start = target.astype("datetime64[D]")
+    month_length = (target + 1).astype("datetime64[D]") - target_start
+    day_of_month = np.minimum(day_of_month, month_length - np.timedelta64(1, "D"))
+    return (target_start + day_of_month).astype("datetime64[ns]") + time_of_day
+
+
+# Конец каждой подписки: max(покупка, конец предыдущей подписки пользователя) + срок.
+# Возвращает копию premium_df, отсортированную по (user_id, timestamp), с subscription_end
+def subscription_ends(premium_df):
+    premium_df = premium_df.sort_values(by=["user_id", "timestamp"], kind="stable")
+    purchase = premium_df["timestamp"].to_numpy(dtype="datetime64[ns]")
+    months = premium_df["subscription_type"].map(months_by_type).to_numpy(dtype=np.int64)
+    rank = premium_df.groupby("user_id", sort=False).cumcount().to_numpy()
+
+    ends = np.empty(len(premium_df), dtype="datetime64[ns]")
+    for r in range(rank.max() + 1 if len(rank) else 0):
+        rows = np.flatnonzero(rank == r)
+        start = purchase[rows]
+        if r:
+            start = np.maximum(start, ends[rows - 1])
+        ends[rows] = add_months(start, months[rows])
+
+    premium_df["subscription_end"] = ends
+    return premium_df
+
+
+def _seconds(times):
+    return np.asarray(times, dtype="datetime64[s]").astype(np.int64)
+
+
+# Индекс премиум-интервалов: пересекающиеся [timestamp, subscription_end) одного
+# пользователя склеиваются, интервалы хранятся отсортированными по (user_id, start)
+class PremiumIntervals:
+    def __init__(self, premium_df):
+        df = premium_df.sort_values(by=["user_id", "timestamp"], kind="stable")
+        users = df["user_id"].to_numpy()
+        start = _seconds(df["timestamp"])
+        end = _seconds(df["subscription_end"])
+
+        # Новый интервал начинается, если сменился пользователь или покупка после
+        # конца всех предыдущих подписок пользователя
+        running_end = pd.Series(end).groupby(users).cummax().to_numpy()
+        new_user = np.r_[True, users[1:] != users[:-1]]
+        opens = new_user | np.r_[True, start[1:] > running_end[:-1]]
+        closes = np.r_[opens[1:], True]
+
+        self.user_ids = np.unique(users)
+        self.users = users[opens]
+        self.starts = start[opens]
+        self.ends = running_end[closes]
+
+        self._keys = self._key(self.users, self.starts)
+        self._sorted_starts = np.sort(self.starts)
+        self._sorted_ends = np.sort(self.ends)
+
+    def _key(self, user_ids, seconds):
+        rank = np.searchsorted(self.user_ids, user_ids)
+        return (rank.astype(np.int64) << _USER_SHIFT) + seconds
+
+    # Флаг премиума для пар (user_id, T) — векторы одинаковой длины или скаляр T
+    def is_premium(self, user_ids, times):
+        user_ids, seconds = np.broadcast_arrays(np.asarray(user_ids), _seconds(times))
+        if not len(self.users):
+            return np.zeros(user_ids.shape, dtype=bool)
+        pos = np.searchsorted(self._keys, self._key(user_ids, seconds), side="right") - 1
+        found = pos >= 0
+        pos = np.maximum(pos, 0)
+        return found & (self.users[pos] == user_ids) & (seconds < self.ends[pos])
+
+    # Число премиум-пользователей на каждую дату из times
+    def count_at(self, times):
+        seconds = _seconds(times)
+        return (
+            np.searchsorted(self._sorted_starts, seconds, side="right")
+            - np.searchsorted(self._sorted_ends, seconds, side="right")
+        )
+
+    # user_id всех, кто премиум в момент t
+    def users_at(self, t):
+        seconds = _seconds(t)
+        return self.users[(self.starts <= seconds) & (seconds < self.ends)]
+
+    # Матрица статусов: строки — user_ids, колонки — times (например, pd.date_range по дням)
+    def status_frame(self, user_ids, times):
+        user_ids = np.asarray(user_ids)
+        times = pd.DatetimeIndex(times)
+        status = self.is_premium(user_ids[:, None], times.to_numpy()[None, :])
+        return pd.DataFrame(status, index=pd.Index(user_ids, name="user_id"), columns=times)
+
+
+# Когорты премиума по периоду первой покупки: subscribers / retention, revenue по
+# purchase_price, churned / churn_rate на дату as_of (по умолчанию — последняя покупка)
+def premium_cohorts(premium_df, freq="M", as_of=None):
+    if "subscription_end" not in premium_df:
+        premium_df = subscription_ends(premium_df)
+    return subscription_cohorts(premium_df, freq=freq, as_of=as_of)
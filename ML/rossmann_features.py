@@ -0,0 +1,229 @@
+# Признаки для прогноза продаж Rossmann (ноутбук Rossmann_store.ipynb).
+#
+# Лаги и скользящие статистики продаж считаются за один проход по таблице,
+# отсортированной по (Store, Date): номер строки внутри магазина маскирует
+# окна, которые залезли бы в предыдущий магазин, поэтому окно rolling_*_w —
+# ровно w предыдущих строк того же магазина (как groupby('Store').shift(1)
+# с последующим rolling внутри магазина). Лаги — по строкам, как shift.
+#
+# feature_table кэширует таблицу признаков на диске (Parquet) по хэшу входных
+# файлов и настроек признаков. Если train-файл дописан в конец (старый файл —
+# его префикс), читаются только новые строки и пересчитываются только затронутые:
+# строки магазинов начиная с самой ранней новой даты магазина.
+#
+# Обучение и прогноз используют одну функцию store_features; для прогноза
+# future_features добавляет к новым строкам хвост истории каждого магазина.
+#
+#   features = feature_table('train_ros.csv', 'store_ros.csv')
+#   test_features = future_features(features, pd.read_csv('test_ros.csv', parse_dates=['Date']),
+#                                   pd.read_csv('store_ros.csv'))
+
+import hashlib
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+LAGS = (1, 7, 14)
+ROLLING_WINDOWS = (7,)
+TARGET = 'Sales'
+# Версия расчёта признаков — часть ключа кэша: при изменении формул старый кэш не подходит
+FEATURES_VERSION = 1
+CACHE_DIR = '.feature_cache'
+HASH_BLOCK = 1 << 20
+
+STORE_FILLNA = ['CompetitionDistance', 'CompetitionOpenSinceMonth', 'CompetitionOpenSinceYear',
+                'Promo2SinceWeek', 'Promo2SinceYear']
+
+CATEGORY_COLUMNS = ['StateHoliday', 'StoreType', 'Assortment', 'PromoInterval']
+
+FEATURES = ['Store', 'Promo', 'year', 'month', 'day', 'weekday',
+            'is_weekend', 'is_holiday'] + [f'sales_lag_{k}' for k in LAGS] \
+    + [f'rolling_{stat}_{w}' for w in ROLLING_WINDOWS for stat in ('mean', 'std')] + ['promo_active']
+
+
+# Продажи + характеристики магазинов с заполненными пропусками (как в ноутбуке).
+# StateHoliday в исходном train.csv смешивает 0 и '0' — приводим к строке,
+# иначе числовой 0 считается праздником; PromoInterval без акции — '0'.
+# Строковые колонки — category: кэш в Parquet пишется и читается в разы быстрее
+def merge_store(df, store_df):
+    df = df.merge(store_df, on='Store', how='left')
+    df[STORE_FILLNA] = df[STORE_FILLNA].fillna(0)
+    df['PromoInterval'] = df['PromoInterval'].fillna('0').astype(str)
+    df['StateHoliday'] = df['StateHoliday'].astype(str)
+    return df.astype({column: 'category' for column in CATEGORY_COLUMNS if column in df})
+
+
+def calendar_features(df):
+    dates = df['Date'].dt
+    df['year'] = dates.year
+    df['month'] = dates.month
+    df['day'] = dates.day
+    df['weekday'] = dates.weekday
+    df['is_weekend'] = (df['weekday'] >= 5).astype(int)
+    df['is_holiday'] = (df['StateHoliday'] != '0').astype(int)
+    df['promo_active'] = df['Promo'].astype(int)
+    return df
+
+
+# Номер строки внутри магазина для таблицы, отсортированной по Store
+def store_positions(stores):
+    stores = np.asarray(stores)
+    rows = np.arange(len(stores))
+    first = np.r_[True, stores[1:] != stores[:-1]]
+    return rows - np.maximum.accumulate(np.where(first, rows, 0))
+
+
+# Лаги и скользящие среднее / std (ddof=1) по предыдущим строкам магазина.
+# sales и positions — в порядке (Store, Date); positions — номер строки в магазине
+# во всей истории (при пересчёте хвоста — не с нуля)
+def store_features(sales, positions, lags=LAGS, windows=ROLLING_WINDOWS):
+    sales = np.asarray(sales, dtype=float)
+    positions = np.asarray(positions)
+    n = len(sales)
+    features = {}
+    for k in lags:
+        lag = np.full(n, np.nan)
+        lag[k:] = sales[:n - k]
+        lag[positions < k] = np.nan
+        features[f'sales_lag_{k}'] = lag
+    for w in windows:
+        mean, std = np.full(n, np.nan), np.full(n, np.nan)
+        if n > w:
+            # Окно строки i — sales[i - w:i], это строка i - w вида окон
+            view = sliding_window_view(sales, w)[:n - w]
+            mean[w:] = view.mean(axis=1)
+            std[w:] = view.std(axis=1, ddof=1)
+        mean[positions < w] = np.nan
+        std[positions < w] = np.nan
+        features[f'rolling_mean_{w}'] = mean
+        features[f'rolling_std_{w}'] = std
+    return features
+
+
+def _sort(df):
+    df = df.iloc[np.lexsort((df['Date'].to_numpy(), df['Store'].to_numpy()))]
+    df.index = pd.RangeIndex(len(df))
+    return df
+
+
+# Полная таблица признаков: merge, календарь, один отсортированный проход по магазинам
+def build_features(train_df, store_df, lags=LAGS, windows=ROLLING_WINDOWS):
+    df = _sort(calendar_features(merge_store(train_df, store_df)))
+    features = store_features(df[TARGET], store_positions(df['Store']), lags, windows)
+    return df.assign(**features)
+
+
+# Дописывает new_df (сырые строки train) к готовой таблице признаков features_df и
+# пересчитывает только затронутые строки: у каждого магазина с новыми строками —
+# начиная с самой ранней новой, с контекстом из max(lags, windows) строк перед ней
+def update_features(features_df, new_df, store_df, lags=LAGS, windows=ROLLING_WINDOWS):
+    new_rows = calendar_features(merge_store(new_df, store_df))
+    combined = pd.concat([features_df.assign(_new=False), new_rows.assign(_new=True)], ignore_index=True)
+    # concat категорий с разными наборами значений даёт object — возвращаем category
+    combined = _sort(combined.astype({column: 'category' for column in CATEGORY_COLUMNS if column in combined}))
+
+    stores = combined['Store'].to_numpy()
+    positions = store_positions(stores)
+    is_new = combined.pop('_new').to_numpy()
+    first_new = pd.Series(np.where(is_new, positions, np.iinfo(np.int64).max)).groupby(stores).transform('min')
+    first_new = first_new.to_numpy()
+    context = max(max(lags, default=0), max(windows, default=0))
+    affected = positions >= first_new
+    in_slice = positions >= first_new - context
+
+    features = store_features(combined[TARGET].to_numpy()[in_slice], positions[in_slice], lags, windows)
+    slice_affected = affected[in_slice]
+    for column, values in features.items():
+        if column not in combined:
+            combined[column] = np.nan
+        combined.loc[affected, column] = values[slice_affected]
+    return combined
+
+
+# Признаки для строк прогноза (Sales неизвестны): те же формулы, контекст — последние
+# max(lags, windows) строк истории магазина
+def future_features(features_df, future_df, store_df, lags=LAGS, windows=ROLLING_WINDOWS):
+    if TARGET not in future_df:
+        future_df = future_df.assign(**{TARGET: np.nan})
+    context = max(max(lags, default=0), max(windows, default=0))
+    history = features_df[features_df['Store'].isin(future_df['Store'].unique())]
+    history = history.groupby('Store', sort=False).tail(context)
+    combined = update_features(history.assign(_future=False), future_df.assign(_future=True),
+                               store_df, lags, windows)
+    return combined[combined.pop('_future').astype(bool)].reset_index(drop=True)
+
+
+def file_digest(path, size=None):
+    digest = hashlib.sha256()
+    remaining = os.path.getsize(path) if size is None else size
+    with open(path, 'rb') as f:
+        while remaining > 0:
+            block = f.read(min(HASH_BLOCK, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest.hexdigest()
+
+
+def _config_key(lags, windows):
+    config = json.dumps({'lags': list(lags), 'windows': list(windows), 'version': FEATURES_VERSION})
+    return hashlib.sha256(config.encode()).hexdigest()[:16]
+
+
+def _read_train(path_or_buffer):
+    return pd.read_csv(path_or_buffer, parse_dates=['Date'], dtype={'StateHoliday': str}, low_memory=False)
+
+
+# Таблица признаков из кэша cache_dir: точное совпадение файлов — чтение Parquet;
+# train дописан в конец — пересчёт только новых строк; иначе — полный расчёт
+def feature_table(train_path, store_path, cache_dir=CACHE_DIR, lags=LAGS, windows=ROLLING_WINDOWS):
+    os.makedirs(cache_dir, exist_ok=True)
+    train_size = os.path.getsize(train_path)
+    train_digest = file_digest(train_path)
+    store_digest = file_digest(store_path)
+    config = _config_key(lags, windows)
+    key = hashlib.sha256(f'{train_digest}:{store_digest}:{config}'.encode()).hexdigest()[:32]
+    table_path = os.path.join(cache_dir, f'{key}.parquet')
+    if os.path.exists(table_path):
+        return pd.read_parquet(table_path)
+
+    store_df = pd.read_csv(store_path)
+    base = _appendable_entry(cache_dir, train_path, train_size, store_digest, config)
+    if base is not None:
+        with open(train_path, 'rb') as f:
+            header = f.readline()
+            f.seek(base['train_size'])
+            tail = f.read()
+        table = update_features(pd.read_parquet(base['table']), _read_train(io.BytesIO(header + tail)),
+                                store_df, lags, windows)
+        os.remove(base['table'])
+        os.remove(base['meta'])
+    else:
+        table = build_features(_read_train(train_path), store_df, lags, windows)
+
+    table.to_parquet(table_path, index=False)
+    meta = {'train_size': train_size, 'train_digest': train_digest, 'store_digest': store_digest, 'config': config}
+    with open(os.path.join(cache_dir, f'{key}.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return table
+
+
+# Кэш, построенный по префиксу текущего train-файла (файл с тех пор только дописывали)
+def _appendable_entry(cache_dir, train_path, train_size, store_digest, config):
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.json'):
+            continue
+        meta_path = os.path.join(cache_dir, name)
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        if (meta['store_digest'], meta['config']) != (store_digest, config) or meta['train_size'] >= train_size:
+            continue
+        if file_digest(train_path, meta['train_size']) == meta['train_digest']:
+            return {'train_size': meta['train_size'], 'meta': meta_path,
+                    'table': meta_path[:-len('.json')] + '.parquet'}
+    return None
@@ -0,0 +1 @@
+# Бенчмарки генераторов и запросов ноутбуков (python benchmarks/run_benchmarks.py)
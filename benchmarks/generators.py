@@ -0,0 +1,95 @@
+# Генераторы на заданном масштабе: таблица пользователей тянется векторно с теми же
+# распределениями, что шаги 1-3 скриптов, дальше — потоковая запись движков в out_dir.
+# Время считается только для генерации и записи логов/событий
+
+import time
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from product_analytics.streaming import chunk_writer
+
+TELEGRAM_START = datetime(2023, 1, 1)
+TELEGRAM_END = datetime(2023, 6, 30)
+LAVKA_START = datetime(2024, 2, 1)
+LAVKA_CAMPAIGN = (datetime(2024, 2, 5), datetime(2024, 2, 19))
+
+
+def telegram_users(n_users, rng):
+    from telegram_config import activity_categories, conversion_rate_by_activity, locations, platforms, platform_probs
+
+    categories = list(activity_categories)
+    activity = np.asarray(categories, dtype=object)[rng.choice(
+        len(categories), n_users, p=[activity_categories[c]['percentage'] for c in categories]
+    )]
+    conversion = pd.Series(activity).map(conversion_rate_by_activity).to_numpy()
+    return pd.DataFrame({
+        "user_id": np.arange(1, n_users + 1),
+        "location": rng.choice(locations, n_users),
+        "activity_category": activity,
+        "is_premium": (rng.random(n_users) < conversion).astype(int),
+        "dominant_platform": rng.choice(platforms, n_users, p=platform_probs),
+    })
+
+
+def lavka_users(n_users, rng):
+    from lavka_config import CITIES, PLATFORMS, user_types, user_type_probs
+
+    return pd.DataFrame({
+        'user_id': np.arange(n_users),
+        'city': rng.choice(CITIES, n_users),
+        'platform': rng.choice(PLATFORMS, n_users),
+        'user_type': rng.choice(user_types, n_users, p=user_type_probs),
+    })
+
+
+def _file_size(path):
+    return Path(path).stat().st_size if Path(path).exists() else 0
+
+
+def run_telegram(n_users, out_dir, seed=42, shard_size=1000, num_workers=1, output_format="csv", compact=False):
+    from telegram_engine import iter_log_chunks
+    from product_analytics.streaming import write_chunks
+
+    user_data = telegram_users(n_users, np.random.default_rng(seed))
+    logs_path = Path(out_dir) / f"telegram_logs.{output_format}"
+    premium_path = Path(out_dir) / f"telegram_premium_purchases.{output_format}"
+
+    started = time.perf_counter()
+    chunks = iter_log_chunks(
+        user_data, TELEGRAM_START, TELEGRAM_END, seed,
+        shard_size=shard_size, num_workers=num_workers, compact=compact
+    )
+    with chunk_writer(logs_path) as logs_writer, chunk_writer(premium_path) as premium_writer:
+        write_chunks(chunks, [logs_writer, premium_writer])
+    seconds = time.perf_counter() - started
+
+    return {
+        "rows": logs_writer.rows,
+        "seconds": seconds,
+        "output_bytes": _file_size(logs_path) + _file_size(premium_path),
+    }
+
+
+def run_lavka(n_users, out_dir, seed=42, shard_size=500, num_workers=1, output_format="csv", compact=False):
+    from lavka_engine import iter_single_pass_chunks
+
+    user_df = lavka_users(n_users, np.random.default_rng(seed))
+    events_path = Path(out_dir) / f"lavka_events_df.{output_format}"
+
+    started = time.perf_counter()
+    chunks = iter_single_pass_chunks(
+        user_df, LAVKA_START, *LAVKA_CAMPAIGN, seed,
+        shard_size=shard_size, num_workers=num_workers, compact=compact, vectorized=True
+    )
+    with chunk_writer(events_path) as events_writer:
+        for events_chunk, _, _ in chunks:
+            events_writer.write(events_chunk)
+    seconds = time.perf_counter() - started
+
+    return {"rows": events_writer.rows, "seconds": seconds, "output_bytes": _file_size(events_path)}
+
+
+GENERATORS = {"telegram": run_telegram, "lavka": run_lavka}
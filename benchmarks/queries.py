@@ -0,0 +1,70 @@
+# Основные агрегации ноутбуков на сгенерированных данных: чтение, DAU, сессии на
+# пользователя в день, когорты покупок с выручкой (Telegram) и уникальные
+# пользователи по событиям (Лавка: как в ноутбуке — фильтр на событие — и groupby)
+
+import time
+from pathlib import Path
+
+import pandas as pd
+
+
+def _timed(results, name, func):
+    started = time.perf_counter()
+    value = func()
+    results[name] = time.perf_counter() - started
+    return value
+
+
+def _read(path, dates):
+    if str(path).endswith(".parquet"):
+        return pd.read_parquet(path)
+    return pd.read_csv(path, parse_dates=dates)
+
+
+def telegram_queries(data_dir, output_format="csv"):
+    data_dir = Path(data_dir)
+    results = {}
+    logs_df = _timed(results, "read_logs", lambda: _read(data_dir / f"telegram_logs.{output_format}", ["timestamp"]))
+    premium_purchases_df = _timed(
+        results, "read_premium",
+        lambda: _read(data_dir / f"telegram_premium_purchases.{output_format}", ["timestamp"])
+    )
+
+    def dau():
+        logs_df["day"] = logs_df["timestamp"].dt.date
+        return logs_df.groupby("day").agg({"user_id": "nunique"})
+
+    def daily_sessions():
+        daily = logs_df.groupby(["day", "user_id"], as_index=False).agg({"session_id": "nunique"})
+        return daily.groupby("day").agg({"session_id": "mean"})
+
+    def cohort_revenue():
+        premium_purchases_df["purchase_month"] = premium_purchases_df["timestamp"].dt.to_period("M")
+        grouped = premium_purchases_df.groupby("purchase_month")
+        return grouped["user_id"].nunique(), grouped["purchase_price"].sum()
+
+    _timed(results, "dau", dau)
+    _timed(results, "daily_sessions_per_user", daily_sessions)
+    _timed(results, "cohort_revenue", cohort_revenue)
+    return {"rows": len(logs_df), "seconds": results}
+
+
+def lavka_queries(data_dir, output_format="csv"):
+    data_dir = Path(data_dir)
+    results = {}
+    events_df = _timed(
+        results, "read_events", lambda: _read(data_dir / f"lavka_events_df.{output_format}", ["timestamp"])
+    )
+
+    def unique_users_loop():
+        return {
+            event: events_df.loc[events_df["event"] == event, "user_id"].nunique()
+            for event in events_df["event"].unique()
+        }
+
+    _timed(results, "unique_users_per_event_loop", unique_users_loop)
+    _timed(results, "unique_users_per_event_groupby", lambda: events_df.groupby("event")["user_id"].nunique())
+    return {"rows": len(events_df), "seconds": results}
+
+
+QUERIES = {"telegram": telegram_queries, "lavka": lavka_queries}
@@ -0,0 +1,158 @@
+# Бенчмарки генераторов Telegram / Лавки и агрегаций ноутбуков.
+# Каждый генератор на каждом масштабе и каждый набор запросов запускается в
+# отдельном процессе, поэтому пиковая память (ru_maxrss из wait4, вместе с
+# воркерами пула) относится только к этому запуску. Результаты пишутся в
+# benchmarks/results/<дата-время>.json, --compare сравнивает с прошлым запуском.
+# Всё работает офлайн на одной Linux-машине:
+#   python benchmarks/run_benchmarks.py --generators lavka --scales 1000 10000 --compare
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(ROOT), str(ROOT / "Analysing_telegram_users"), str(ROOT / "e-commerce" / "Yandex_lavka")]
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Telegram — ~2300 событий на пользователя за полгода, Лавка — ~100
+DEFAULT_SCALES = {
+    "telegram": [1000, 10000],
+    "lavka": [1000, 10000, 100000],
+}
+
+
+# Дочерний процесс: печатает одну строку JSON; возвращает её и пиковый RSS, МБ
+def _run_child(*args):
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--child", *map(str, args)], stdout=subprocess.PIPE, text=True
+    )
+    output = process.stdout.read()
+    process.stdout.close()
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        raise RuntimeError(f"Бенчмарк {args} завершился с кодом {process.returncode}")
+    return json.loads(output.strip().splitlines()[-1]), usage.ru_maxrss / 1024
+
+
+def _child(args):
+    from benchmarks.generators import GENERATORS
+    from benchmarks.queries import QUERIES
+
+    kind, name = args[0], args[1]
+    if kind == "generate":
+        n_users, out_dir, num_workers, output_format = args[2:]
+        result = GENERATORS[name](int(n_users), out_dir, num_workers=int(num_workers), output_format=output_format)
+    else:
+        out_dir, output_format = args[2:]
+        result = QUERIES[name](out_dir, output_format)
+    print(json.dumps(result))
+
+
+def run(generators, scales, num_workers=1, output_format="csv", queries=True):
+    results = []
+    for name in generators:
+        for n_users in scales or DEFAULT_SCALES[name]:
+            with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as out_dir:
+                generated, peak_rss = _run_child("generate", name, n_users, out_dir, num_workers, output_format)
+                entry = {
+                    "generator": name,
+                    "users": n_users,
+                    "rows": generated["rows"],
+                    "seconds": round(generated["seconds"], 3),
+                    "events_per_s": round(generated["rows"] / generated["seconds"], 1),
+                    "peak_rss_mb": round(peak_rss, 1),
+                    "output_mb": round(generated["output_bytes"] / 2 ** 20, 2),
+                }
+                if queries:
+                    timings, query_rss = _run_child("query", name, out_dir, output_format)
+                    entry["queries"] = {key: round(value, 3) for key, value in timings["seconds"].items()}
+                    entry["queries_peak_rss_mb"] = round(query_rss, 1)
+
+            results.append(entry)
+            print(json.dumps(entry, ensure_ascii=False))
+    return results
+
+
+def _environment():
+    import numpy as np
+    import pandas as pd
+
+    return {
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def save_results(results, args):
+    RESULTS_DIR.mkdir(exist_ok=True)
+    started_at = datetime.now()
+    path = RESULTS_DIR / f"{started_at:%Y%m%d-%H%M%S}.json"
+    report = {
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "environment": _environment(),
+        "args": args,
+        "results": results,
+    }
+    path.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+# Отношения метрик к последнему прошлому запуску по (генератор, пользователи);
+# > 1 для events_per_s — быстрее, для секунд и памяти — хуже
+def compare(path):
+    previous = sorted(p for p in RESULTS_DIR.glob("*.json") if p != path)
+    if not previous:
+        print("Нет прошлых запусков для сравнения")
+        return
+    baseline = json.loads(previous[-1].read_text(encoding="utf-8"))
+    base = {(r["generator"], r["users"]): r for r in baseline["results"]}
+    print(f"Сравнение с {previous[-1].name}:")
+    for current in json.loads(path.read_text(encoding="utf-8"))["results"]:
+        old = base.get((current["generator"], current["users"]))
+        if old is None:
+            continue
+        ratios = {
+            metric: round(current[metric] / old[metric], 3)
+            for metric in ("events_per_s", "peak_rss_mb", "output_mb") if old.get(metric)
+        }
+        for query, seconds in current.get("queries", {}).items():
+            if old.get("queries", {}).get(query):
+                ratios[query] = round(seconds / old["queries"][query], 3)
+        print(f"  {current['generator']} {current['users']}: {ratios}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        _child(sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(description="Бенчмарки генераторов и запросов ноутбуков")
+    parser.add_argument("--generators", nargs="+", choices=sorted(DEFAULT_SCALES), default=sorted(DEFAULT_SCALES))
+    parser.add_argument("--scales", nargs="+", type=int, help="число пользователей (по умолчанию своё для генератора)")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--no-queries", action="store_true", help="только генерация")
+    parser.add_argument("--compare", action="store_true", help="сравнить с прошлым сохранённым запуском")
+    args = parser.parse_args()
+
+    results = run(args.generators, args.scales, args.workers, args.format, not args.no_queries)
+    path = save_results(results, vars(args))
+    print(f"Результаты: {path}")
+    if args.compare:
+        compare(path)
+
+
+if __name__ == "__main__":
+    main()
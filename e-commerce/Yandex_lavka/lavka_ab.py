@@ -0,0 +1,211 @@
+# Метрики A/B теста кампании по пользователям — без apply по строкам эксперимента.
+# События участников соединяются с временем касания одним merge, дальше все
+# метрики (конверсия, заказы, retention) и те же метрики до касания (ковариаты
+# CUPED) — флаги по разнице timestamp - touch_time и один groupby.
+#
+#   experiment_df = experiment_groups(campaign_interactions_df, control_group_df)
+#   users = user_metrics(events_df, experiment_df, user_df)
+#   grid = ab_grid(users, METRICS, segments=SEGMENTS, covariates=COVARIATES)
+#
+# replay_campaign проигрывает те же события по времени через последовательный
+# монитор (mSPRT) и показывает, на какой день тест можно было остановить.
+# campaign_funnel — упорядоченная воронка после касания (open_app → ... → finish_pay)
+# с окном конверсии, по test/control, городу и платформе
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from product_analytics.ab_stats import ab_grid
+from product_analytics.funnels import FunnelBuilder, funnel_table
+from product_analytics.partitioned import read_partitioned, DATE_PARTITION
+from product_analytics.sequential import SequentialMonitor
+
+RETENTION_DAYS = (1, 7, 14, 21)
+SEGMENTS = ('city', 'platform', 'user_type')
+
+METRICS = ['converted', 'orders'] + [f'retention_{d}d' for d in RETENTION_DAYS]
+# Ковариата метрики — та же метрика до касания: покупки за всё время до него,
+# активность за те же d дней до касания
+COVARIATES = {metric: f'pre_{metric}' for metric in METRICS}
+# Метрики последовательного монитора: флаг покупки после касания и число покупок
+SEQUENTIAL_METRICS = {'converted': 'max', 'orders': 'sum'}
+
+FUNNEL_STEPS = ['open_app', 'search', 'view_product', 'add_to_cart', 'pay_page', 'finish_pay']
+FUNNEL_SEGMENTS = ('city', 'platform')
+# Окно конверсии: от open_app цепочки до шага
+FUNNEL_WINDOW = pd.Timedelta(days=1)
+
+
+# Тест — пользователи с касанием кампании (первое касание), контроль — fake_touch_time.
+# control_group_df — lavka_control_group_df или lavka_campaign_control_df (с campaign_id)
+def experiment_groups(campaign_interactions_df, control_group_df, campaign_id='push_abandon_cart'):
+    touches = campaign_interactions_df[campaign_interactions_df['campaign_id'] == campaign_id]
+    if 'campaign_id' in control_group_df:
+        control_group_df = control_group_df[control_group_df['campaign_id'] == campaign_id]
+    test_users = touches.groupby('user_id', as_index=False)['timestamp'].min()
+    test_users = test_users.rename(columns={'timestamp': 'touch_time'}).assign(group='test')
+    control_users = control_group_df.rename(columns={'fake_touch_time': 'touch_time'}).assign(group='control')
+    return pd.concat([test_users, control_users[['user_id', 'touch_time', 'group']]], ignore_index=True)
+
+
+def user_metrics(events_df, experiment_df, user_df=None, retention_days=RETENTION_DAYS):
+    events = events_df[['user_id', 'timestamp', 'event']].merge(experiment_df[['user_id', 'touch_time']], on='user_id')
+    delta = events['timestamp'] - events['touch_time']
+    after, before = delta > pd.Timedelta(0), delta < pd.Timedelta(0)
+    is_pay = (events['event'] == 'finish_pay').to_numpy()
+
+    flags = pd.DataFrame({
+        'user_id': events['user_id'],
+        'converted': after & is_pay,
+        'orders': after & is_pay,
+        'pre_converted': before & is_pay,
+        'pre_orders': before & is_pay,
+    })
+    for d in retention_days:
+        window = pd.Timedelta(days=d)
+        flags[f'retention_{d}d'] = after & (delta <= window)
+        flags[f'pre_retention_{d}d'] = before & (delta >= -window)
+
+    counted = ['orders', 'pre_orders']
+    per_user = flags.groupby('user_id').agg(
+        {column: 'sum' if column in counted else 'max' for column in flags.columns if column != 'user_id'}
+    ).astype(int)
+
+    users = experiment_df.join(per_user, on='user_id')
+    users[per_user.columns] = users[per_user.columns].fillna(0).astype(int)
+    if user_df is not None:
+        users = users.merge(user_df, on='user_id', how='left')
+    return users
+
+
+# Полная сетка по кампании: все метрики × (все, город, платформа, тип пользователя)
+def campaign_report(events_df, campaign_interactions_df, control_group_df, user_df,
+                    campaign_id='push_abandon_cart', cuped=True, **kwargs):
+    experiment_df = experiment_groups(campaign_interactions_df, control_group_df, campaign_id)
+    users = user_metrics(events_df, experiment_df, user_df)
+    return ab_grid(users, METRICS, segments=SEGMENTS, covariates=COVARIATES if cuped else None, **kwargs)
+
+
+def campaign_monitor(experiment_df, **kwargs):
+    monitor = SequentialMonitor(SEQUENTIAL_METRICS, **kwargs)
+    monitor.enroll(experiment_df['user_id'], experiment_df['group'], experiment_df['touch_time'])
+    return monitor
+
+
+# Покупки дня: каждая finish_pay увеличивает и флаг, и счётчик покупок
+def feed_events(monitor, events_df):
+    pays = events_df[events_df['event'] == 'finish_pay']
+    monitor.update(pays['user_id'], pays['timestamp'], np.ones((len(pays), len(SEQUENTIAL_METRICS))))
+
+
+# События по окнам freq от start: окно — [day, day + freq). Из партиционированного
+# каталога читаются только event_types дней окна (freq — целое число дней), из
+# таблицы — срез по тем же границам, поэтому оба источника делятся одинаково
+def _daily_events(events, start, end, freq, event_types=('finish_pay',), columns=('user_id', 'timestamp', 'event')):
+    step = pd.Timedelta(freq)
+    if isinstance(events, (str, os.PathLike)) and os.path.isdir(events):
+        if step < pd.Timedelta(days=1) or step % pd.Timedelta(days=1):
+            raise ValueError(f"Партиции — по дням, freq должен быть целым числом дней: {freq!r}")
+        if end is None:
+            end = max(pd.Timestamp(name.split('=', 1)[1]) for name in os.listdir(events)
+                      if name.startswith(f'{DATE_PARTITION}='))
+        for day in pd.date_range(start, end, freq=freq):
+            yield day, read_partitioned(events, list(columns), start=day, end=day + step - pd.Timedelta(days=1),
+                                        event=list(event_types))
+        return
+    events = events.sort_values('timestamp', kind='stable')
+    times = events['timestamp'].to_numpy()
+    if end is None:
+        end = events['timestamp'].max()
+    windows = pd.date_range(start, end, freq=freq)
+    lo = np.searchsorted(times, windows.to_numpy().astype(times.dtype), side='left')
+    hi = np.searchsorted(times, (windows + step).to_numpy().astype(times.dtype), side='left')
+    for day, a, b in zip(windows, lo, hi):
+        yield day, events.iloc[a:b]
+
+
+# Масштаб смеси mSPRT до начала теста: effect_size стандартных отклонений метрик
+# участников по покупкам до касания (те же флаг и счётчик, что SEQUENTIAL_METRICS).
+# Не зависит от исхода теста, поэтому p-value остаётся always-valid. None — если
+# до касания покупок нет (монитор зафиксирует tau2 сам)
+def pre_touch_tau(events, experiment_df, effect_size=0.1):
+    if isinstance(events, pd.DataFrame):
+        pays = events.loc[events['event'] == 'finish_pay', ['user_id', 'timestamp']]
+    else:
+        pays = read_partitioned(events, ['user_id', 'timestamp'], end=experiment_df['touch_time'].max(),
+                                event=['finish_pay'])
+    pays = pays.merge(experiment_df[['user_id', 'touch_time']], on='user_id')
+    orders = pays[pays['timestamp'] < pays['touch_time']].groupby('user_id').size()
+    orders = experiment_df['user_id'].map(orders).fillna(0).to_numpy(dtype=float)
+    spread = np.array([np.std(orders > 0, ddof=1), np.std(orders, ddof=1)])
+    if len(orders) < 2 or not (spread > 0).all():
+        return None
+    return effect_size * spread
+
+
+# Просмотры после каждого дня (freq) от первого касания: история монитора с
+# always-valid p-value на каждый день. tau смеси по умолчанию — pre_touch_tau
+def replay_campaign(events, campaign_interactions_df, control_group_df, campaign_id='push_abandon_cart',
+                    end=None, freq='1D', **kwargs):
+    experiment_df = experiment_groups(campaign_interactions_df, control_group_df, campaign_id)
+    if kwargs.get('tau') is None:
+        kwargs['tau'] = pre_touch_tau(events, experiment_df, kwargs.get('effect_size', 0.1))
+    monitor = campaign_monitor(experiment_df, **kwargs)
+    start = experiment_df['touch_time'].min().floor(freq)
+    end = end or (events['timestamp'].max() if isinstance(events, pd.DataFrame) else None)
+    for day, day_events in _daily_events(events, start, end, freq):
+        if day < start:
+            continue
+        feed_events(monitor, day_events)
+        monitor.look(day + pd.Timedelta(freq))
+    return monitor.history()
+
+
+# События участников после их касания
+def _after_touch(events_df, experiment_df):
+    events = events_df.merge(experiment_df[['user_id', 'touch_time']], on='user_id')
+    return events[events['timestamp'] > events['touch_time']]
+
+
+# Упорядоченная воронка после касания: по пользователю (key_column='user_id') или
+# по сессии ('session_id'), с окном window от open_app цепочки. events — таблица
+# (один проход) или партиционированный каталог (окнами freq — целое число дней,
+# только события воронки). Возвращает (таблица funnel_table по group × сегменты, строки по ключам)
+def campaign_funnel(events, campaign_interactions_df, control_group_df, user_df=None,
+                    campaign_id='push_abandon_cart', key_column='user_id', window=FUNNEL_WINDOW,
+                    end=None, freq='1D'):
+    experiment_df = experiment_groups(campaign_interactions_df, control_group_df, campaign_id)
+    builder = FunnelBuilder(FUNNEL_STEPS, window, key_column)
+    columns = list(dict.fromkeys(['user_id', key_column, 'timestamp', 'event']))
+    if isinstance(events, pd.DataFrame):
+        chunks = [events[columns]]
+    else:
+        step = pd.Timedelta(freq)
+        if step < pd.Timedelta(days=1) or step % pd.Timedelta(days=1):
+            raise ValueError(f"Каталог читается окнами по дням, freq должен быть целым числом дней: {freq!r}")
+        start = experiment_df['touch_time'].min().floor(freq)
+        chunks = (day_events for _, day_events in _daily_events(events, start, end, freq, FUNNEL_STEPS, columns))
+
+    sessions = []
+    for chunk in chunks:
+        chunk = _after_touch(chunk, experiment_df)
+        builder.add(chunk)
+        if key_column != 'user_id':
+            sessions.append(chunk[['user_id', key_column]].drop_duplicates())
+
+    keys = builder.result()
+    if key_column == 'user_id':
+        # Участники без событий воронки после касания — ноль шагов
+        keys = experiment_df[['user_id', 'group']].merge(keys, on='user_id', how='left')
+        keys['steps'] = keys['steps'].fillna(0).astype(int)
+    else:
+        # Без событий после касания сессий нет — пустая таблица ключей
+        owners = (pd.concat(sessions, ignore_index=True).drop_duplicates(key_column) if sessions
+                  else pd.DataFrame({'user_id': pd.Series(dtype='int64'), key_column: keys[key_column]}))
+        keys = keys.merge(owners, on=key_column).merge(experiment_df[['user_id', 'group']], on='user_id')
+    if user_df is not None:
+        keys = keys.merge(user_df, on='user_id', how='left')
+    segments = [column for column in FUNNEL_SEGMENTS if column in keys]
+    return funnel_table(keys, FUNNEL_STEPS, group_column='group', segments=segments), keys
@@ -0,0 +1,12 @@
+# Общие параметры генерации данных Лавки
+# (используются и скриптом lavka_generate_script_v2.py, и движком lavka_engine.py)
+
+EVENTS = [
+    'open_app', 'search', 'view_product', 'add_to_cart', 'pay_page', 'finish_pay',
+    'like', 'remove_from_cart', 'abandon_cart', 'apply_coupon', 'scroll_page'
+]
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Новосибирск', 'Екатеринбург']
+PLATFORMS = ['iOS', 'Android']
+
+user_types = ['active', 'medium', 'rare']
+user_type_probs = [0.3, 0.5, 0.2]
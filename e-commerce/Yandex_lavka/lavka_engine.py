@@ -0,0 +1,505 @@
+# Движок генерации событий Лавки: логика сессий и шардированный режим.
+# В шардированном режиме у каждого шарда пользователей свой random.Random,
+# полученный из SeedSequence, поэтому результат не зависит от числа процессов.
+
+import random
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from lavka_config import EVENTS, CITIES, PLATFORMS, user_types
+from product_analytics.schema import category, session_ids, apply_schema
+from product_analytics.sharding import (
+    shard_ranges, shard_seeds, stream_seed, python_seed, iter_sharded
+)
+
+# Число сессий за период по типу пользователя
+sessions_by_user_type = {
+    'active': (18, 40),
+    'medium': (8, 18),
+    'rare': (4, 8)
+}
+# Период: сессии раскиданы по дням 0-100 от старта пользователя,
+# старт пользователя — 0-10 дней от start_date
+SESSION_PERIOD_DAYS = 101
+USER_START_DAYS = 10
+
+
+# Последний день старта пользователя и последний день сессии от старта: не позже
+# end_date (включительно). end_date=None — без ограничения
+def max_start_day(start_date, end_date):
+    if end_date is None:
+        return USER_START_DAYS
+    return min(USER_START_DAYS, (end_date - start_date).days)
+
+
+def max_session_day(start_date, end_date, start_day):
+    if end_date is None:
+        return SESSION_PERIOD_DAYS - 1
+    return np.minimum(SESSION_PERIOD_DAYS - 1, (end_date - start_date).days - start_day)
+
+# Компактная схема таблиц (compact=True): category + datetime64[s], session_id — int64
+EVENTS_SCHEMA = {
+    'timestamp': 'datetime64[s]',
+    'event': category(EVENTS),
+}
+USER_SCHEMA = {
+    'city': category(CITIES),
+    'platform': category(PLATFORMS),
+    'user_type': category(user_types),
+}
+CONTROL_SCHEMA = {
+    'fake_touch_time': 'datetime64[s]',
+}
+INTERACTIONS_SCHEMA = {
+    'timestamp': 'datetime64[s]',
+    'campaign_id': category(['push_abandon_cart', 'email_weekly_newsletter', 'push_delivery_discount']),
+    'reaction': category(['clicked', 'ignored', 'converted']),
+}
+# Контрольные группы всех кампаний (lavka_campaign_control_df)
+CAMPAIGN_CONTROL_SCHEMA = {
+    'campaign_id': INTERACTIONS_SCHEMA['campaign_id'],
+    'fake_touch_time': 'datetime64[s]',
+}
+
+# Вероятность finish_pay после pay_page: контроль и тест-группа
+FINISH_PAY_PROB = 0.2
+TEST_FINISH_PAY_PROB = 0.3
+# Доля тест-группы среди eligible пользователей
+TEST_SHARE = 0.5
+
+# Воронка сессии как условные вероятности шагов: (событие, вероятность, условие).
+# Порядок строк — порядок событий в цепочке generate_session_events
+FUNNEL_STEPS = [
+    ('open_app', 1.0, None),
+    ('search', 0.9, None),
+    ('view_product', 0.7, None),
+    ('add_to_cart', 0.6, None),
+    ('remove_from_cart', 0.3, 'add_to_cart'),
+    ('abandon_cart', 0.7, None),
+    ('apply_coupon', 0.5, 'add_to_cart'),
+    ('pay_page', 0.5, 'add_to_cart'),
+    ('finish_pay', FINISH_PAY_PROB, 'pay_page'),
+    ('like', 0.5, None),
+    ('scroll_page', 0.7, None),
+]
+funnel_events = [event for event, _, _ in FUNNEL_STEPS]
+_funnel_event_codes = np.array([EVENTS.index(event) for event in funnel_events])
+_funnel_conditions = [
+    (step, funnel_events.index(condition))
+    for step, (_, _, condition) in enumerate(FUNNEL_STEPS) if condition is not None
+]
+PAY_PAGE_STEP = funnel_events.index('pay_page')
+FINISH_PAY_STEP = funnel_events.index('finish_pay')
+ABANDON_CART_STEP = funnel_events.index('abandon_cart')
+
+# Наборы измерений агрегатного куба событий (product_analytics.cube): детальный срез,
+# DAU/WAU/MAU, пользователи по событиям и по сегментам за день.
+# group — группа кампании push_abandon_cart: test / control / none
+CUBE_GROUPING_SETS = [
+    ('day', 'event', 'platform', 'city', 'group'),
+    ('day',), ('week',), ('month',),
+    ('day', 'event'), ('week', 'event'), ('month', 'event'),
+    ('day', 'platform'), ('day', 'city'), ('day', 'group'),
+]
+
+# Номера потоков RNG в шардированном режиме
+ELIGIBILITY_STREAM = 1
+EVENTS_STREAM = 2
+ASSIGNMENT_STREAM = 3
+# Деление на группы в lavka_targeting (все кампании campaigns_df)
+TARGETING_STREAM = 4
+
+
+def generate_session_events(user_type, is_test_user=False, rnd=random):
+    event_chain = ['open_app']
+    if rnd.random() < 0.9:
+        event_chain.append('search')
+    if rnd.random() < 0.7:
+        event_chain.append('view_product')
+    if rnd.random() < 0.6:
+        event_chain.append('add_to_cart')
+        if rnd.random() < 0.3:
+            event_chain.append('remove_from_cart')
+    if rnd.random() < 0.7:
+        event_chain.append('abandon_cart')
+    if 'add_to_cart' in event_chain and rnd.random() < 0.5:
+        event_chain.append('apply_coupon')
+    if 'add_to_cart' in event_chain and rnd.random() < 0.5:
+        event_chain.append('pay_page')
+
+        # увеличиваем шанс конверсии для тест-группы
+        if is_test_user:
+            if rnd.random() < TEST_FINISH_PAY_PROB:  # увеличенная вероятность для тест-группы
+                event_chain.append('finish_pay')
+        else:
+            if rnd.random() < FINISH_PAY_PROB:  # обычная вероятность для контроля
+                event_chain.append('finish_pay')
+
+    if rnd.random() < 0.5:
+        event_chain.append('like')
+    if rnd.random() < 0.7:
+        event_chain.append('scroll_page')
+    return event_chain
+
+
+def is_valid_purchase_time(dt):
+    return 7 <= dt.hour < 23
+
+
+# Брошенная корзина: дошёл до оплаты и не оплатил, либо abandon_cart
+def is_abandon_cart_session(event_chain):
+    return ('pay_page' in event_chain and 'finish_pay' not in event_chain) or ('abandon_cart' in event_chain)
+
+
+# Uplift тест-группы поверх уже сгенерированной цепочки контроля: сессия с pay_page
+# без finish_pay докупает с вероятностью (0.3 - 0.2) / (1 - 0.2), итого
+# P(finish_pay | pay_page) = 0.3 — то же, что generate_session_events(..., is_test_user=True)
+TEST_UPLIFT_PROB = (TEST_FINISH_PAY_PROB - FINISH_PAY_PROB) / (1 - FINISH_PAY_PROB)
+
+
+def apply_test_uplift(event_chain, rnd=random):
+    if 'pay_page' in event_chain and 'finish_pay' not in event_chain and rnd.random() < TEST_UPLIFT_PROB:
+        position = event_chain.index('pay_page') + 1
+        return event_chain[:position] + ['finish_pay'] + event_chain[position:]
+    return event_chain
+
+
+# Матрица воронки для всех сессий сразу: present[i, k] — был ли k-й шаг FUNNEL_STEPS
+# в i-й сессии. step_probs переопределяет вероятность шага числом или вектором
+# по сессиям (например, finish_pay для тест-группы)
+def simulate_funnel(n_sessions, rng, step_probs=None):
+    probs = np.array([prob for _, prob, _ in FUNNEL_STEPS])
+    probs = np.broadcast_to(probs, (n_sessions, len(FUNNEL_STEPS)))
+    if step_probs:
+        probs = probs.copy()
+        for event, prob in step_probs.items():
+            probs[:, funnel_events.index(event)] = prob
+
+    present = rng.random((n_sessions, len(FUNNEL_STEPS))) < probs
+    for step, condition in _funnel_conditions:
+        present[:, step] &= present[:, condition]
+    return present
+
+
+# apply_test_uplift для матрицы воронки: is_test — маска сессий тест-группы
+def apply_test_uplift_matrix(present, is_test, rng):
+    missing_pay = is_test & present[:, PAY_PAGE_STEP] & ~present[:, FINISH_PAY_STEP]
+    present[:, FINISH_PAY_STEP] |= missing_pay & (rng.random(len(present)) < TEST_UPLIFT_PROB)
+    return present
+
+
+# Сессии одного пользователя: (session_time, session_id, event_chain).
+# compact=True — session_id = user_id << 20 | номер сессии вместо строки
+def _user_sessions(user_id, user_type, start_date, end_date, rnd, is_test_user=False, compact=False):
+    low, high = sessions_by_user_type[user_type]
+    start_day = rnd.randint(0, max_start_day(start_date, end_date))
+    start = start_date + timedelta(days=start_day)
+    last_day = int(max_session_day(start_date, end_date, start_day))
+    for session_number in range(rnd.randint(low, high)):
+        session_time = start + timedelta(days=rnd.randint(0, last_day), hours=rnd.randint(7, 22), minutes=rnd.randint(0, 59))
+        if compact:
+            session_id = int(session_ids(user_id, session_number))
+        else:
+            session_id = f"{user_id}_{session_time.date()}_{session_time.time()}"
+        yield session_time, session_id, generate_session_events(user_type, is_test_user, rnd)
+
+
+# === 1. Eligible пользователи шарда: user_id -> первое касание в окне кампании
+def collect_eligible_shard(task):
+    user_df, start_date, end_date, campaign_start, campaign_end, seed_seq = task
+    rnd = random.Random(python_seed(seed_seq))
+
+    eligible_user_dict = dict()
+    for user_id, user_type in zip(user_df['user_id'], user_df['user_type']):
+        for session_time, _, event_chain in _user_sessions(user_id, user_type, start_date, end_date, rnd):
+            if is_abandon_cart_session(event_chain):
+                ts = session_time + timedelta(minutes=5)
+                if campaign_start <= ts <= campaign_end and user_id not in eligible_user_dict:
+                    eligible_user_dict[user_id] = ts
+    return eligible_user_dict
+
+
+# === 2. Делим на test / control
+def split_test_control(eligible_user_dict, rnd=random):
+    eligible_user_ids = list(eligible_user_dict.keys())
+    rnd.shuffle(eligible_user_ids)
+
+    test_size = int(len(eligible_user_ids) * 0.5)
+    test_group = [(user_id, eligible_user_dict[user_id]) for user_id in eligible_user_ids[:test_size]]
+    control_group = [(user_id, eligible_user_dict[user_id]) for user_id in eligible_user_ids[test_size:]]
+    return test_group, control_group
+
+
+# === 3. События шарда с учётом is_test_user, отсортированные по (user_id, timestamp)
+def generate_events_shard(task):
+    user_df, start_date, end_date, test_users_set, seed_seq, compact = task
+    rnd = random.Random(python_seed(seed_seq))
+
+    events_log = {'user_id': [], 'event': [], 'timestamp': [], 'session_id': []}
+    for user_id, user_type in zip(user_df['user_id'], user_df['user_type']):
+        is_test = user_id in test_users_set
+        for session_time, session_id, event_chain in _user_sessions(user_id, user_type, start_date, end_date, rnd, is_test, compact):
+            _append_session_events(events_log, user_id, session_time, session_id, event_chain, rnd)
+
+    return _events_frame(events_log, compact)
+
+
+# События сессии: i-е событие через i * (20-60) секунд, оплата только в 7:00-23:00
+def _append_session_events(events_log, user_id, session_time, session_id, event_chain, rnd):
+    for i, event in enumerate(event_chain):
+        timestamp = session_time + timedelta(seconds=i * rnd.randint(20, 60))
+        if event == 'finish_pay' and not is_valid_purchase_time(timestamp):
+            continue
+        events_log['user_id'].append(user_id)
+        events_log['event'].append(event)
+        events_log['timestamp'].append(timestamp)
+        events_log['session_id'].append(session_id)
+
+
+def _events_frame(events_log, compact):
+    events_df = pd.DataFrame(events_log)
+    if compact:
+        events_df = apply_schema(events_df, EVENTS_SCHEMA)
+    return events_df.sort_values(by=['user_id', 'timestamp'], kind='stable')
+
+
+# Один проход по шарду: сессии каждого пользователя генерируются один раз,
+# eligibility считается по ним же, пользователь сразу попадает в test/control
+# (монетка с долей TEST_SHARE из потока шарда), и для тест-группы поверх готовых
+# цепочек применяется apply_test_uplift — без повторной симуляции и без temp_events_log.
+# Группы получаются примерно (а не ровно) пополам
+def generate_single_pass_shard(task):
+    user_df, start_date, end_date, campaign_start, campaign_end, seed_seq, compact = task
+    rnd = random.Random(python_seed(seed_seq))
+
+    events_log = {'user_id': [], 'event': [], 'timestamp': [], 'session_id': []}
+    test_group, control_group = [], []
+    for user_id, user_type in zip(user_df['user_id'], user_df['user_type']):
+        sessions = list(_user_sessions(user_id, user_type, start_date, end_date, rnd, compact=compact))
+
+        touch_ts = None
+        for session_time, _, event_chain in sessions:
+            ts = session_time + timedelta(minutes=5)
+            if is_abandon_cart_session(event_chain) and campaign_start <= ts <= campaign_end:
+                touch_ts = ts
+                break
+
+        is_test = False
+        if touch_ts is not None:
+            is_test = rnd.random() < TEST_SHARE
+            (test_group if is_test else control_group).append((user_id, touch_ts))
+
+        for session_time, session_id, event_chain in sessions:
+            if is_test:
+                event_chain = apply_test_uplift(event_chain, rnd)
+            _append_session_events(events_log, user_id, session_time, session_id, event_chain, rnd)
+
+    return _events_frame(events_log, compact), test_group, control_group
+
+
+def _user_shards(user_df, shard_size):
+    user_df = user_df.sort_values('user_id')
+    return [user_df.iloc[start:stop] for start, stop in shard_ranges(len(user_df), shard_size)]
+
+
+# Проходы 1-2 по шардам: eligible пользователи (в памяти только словарь user_id -> ts)
+# и разбиение на test / control отдельным потоком RNG
+def assign_test_control_sharded(user_df, start_date, campaign_start, campaign_end, seed,
+                                shard_size=1000, num_workers=1, end_date=None):
+    shards = _user_shards(user_df, shard_size)
+    eligibility_tasks = (
+        (shard, start_date, end_date, campaign_start, campaign_end, seed_seq)
+        for shard, seed_seq in zip(shards, shard_seeds(seed, ELIGIBILITY_STREAM, len(shards)))
+    )
+    eligible_user_dict = dict()
+    for shard_eligible in iter_sharded(collect_eligible_shard, eligibility_tasks, num_workers):
+        eligible_user_dict.update(shard_eligible)
+
+    assignment_rnd = random.Random(python_seed(stream_seed(seed, ASSIGNMENT_STREAM)))
+    return split_test_control(eligible_user_dict, assignment_rnd)
+
+
+# Проход 3: поток чанков событий по шардам. Шарды — непрерывные диапазоны user_id,
+# поэтому последовательность отсортированных чанков уже отсортирована по
+# (user_id, timestamp) и глобальный sort_values не нужен. В памяти не больше
+# max_in_flight чанков
+def iter_events_chunks(user_df, start_date, test_group, seed, shard_size=1000, num_workers=1, max_in_flight=None,
+                       compact=False, end_date=None):
+    shards = _user_shards(user_df, shard_size)
+    test_users_set = set(user_id for user_id, _ in test_group)
+    events_tasks = (
+        (shard, start_date, end_date, test_users_set.intersection(shard['user_id']), seed_seq, compact)
+        for shard, seed_seq in zip(shards, shard_seeds(seed, EVENTS_STREAM, len(shards)))
+    )
+    return iter_sharded(generate_events_shard, events_tasks, num_workers, max_in_flight)
+
+
+# События матрицы воронки: i-е событие цепочки через i * (20-60) секунд после начала
+# сессии, оплата только в 7:00-23:00 (is_valid_purchase_time маской по часу).
+# session_user / session_numbers / session_time — по сессиям (строкам present)
+def _funnel_events_frame(session_user, session_numbers, session_time, present, rng, compact):
+    position = np.cumsum(present, axis=1) - 1
+    session, step = np.nonzero(present)
+    timestamp = session_time[session] + position[session, step] * rng.integers(20, 61, len(session))
+    hour = timestamp.astype(np.int64) // 3600 % 24
+    keep = (step != FINISH_PAY_STEP) | ((hour >= 7) & (hour < 23))
+    session, step, timestamp = session[keep], step[keep], timestamp[keep]
+
+    event_user = session_user[session]
+    rows = np.lexsort((timestamp, event_user))
+    session, event_user, timestamp = session[rows], event_user[rows], timestamp[rows]
+    event_code = _funnel_event_codes[step[rows]]
+
+    if compact:
+        session_id = session_ids(session_user, session_numbers)[session]
+        event = pd.Categorical.from_codes(event_code, dtype=EVENTS_SCHEMA['event'])
+    else:
+        session_id = (
+            pd.Series(session_user).astype(str) + "_"
+            + pd.Series(np.datetime_as_string(session_time, unit='s')).str.replace("T", "_")
+        ).to_numpy()[session]
+        event = np.asarray(EVENTS, dtype=object)[event_code]
+        timestamp = timestamp.astype('M8[ns]')
+
+    return pd.DataFrame({
+        'user_id': event_user,
+        'event': event,
+        'timestamp': timestamp,
+        'session_id': session_id,
+    })
+
+
+# Тот же один проход, но векторно: сессии шарда тянутся массивами, цепочки событий —
+# одной матрицей simulate_funnel, фильтр is_valid_purchase_time — маской по часу
+def generate_matrix_shard(task):
+    user_df, start_date, end_date, campaign_start, campaign_end, seed_seq, compact = task
+    rng = np.random.default_rng(seed_seq)
+    user_ids = user_df['user_id'].to_numpy()
+    user_type = user_df['user_type'].to_numpy()
+
+    # Сессии: число по типу пользователя, старт пользователя + день 0-100 (не позже end_date),
+    # час 7-22, минута 0-59
+    low = np.array([sessions_by_user_type[t][0] for t in user_type], dtype=np.int64)
+    high = np.array([sessions_by_user_type[t][1] for t in user_type], dtype=np.int64)
+    num_sessions = rng.integers(low, high + 1)
+    user_pos = np.repeat(np.arange(len(user_ids)), num_sessions)
+    n = len(user_pos)
+
+    start_day = rng.integers(0, max_start_day(start_date, end_date) + 1, len(user_ids))
+    user_start = np.datetime64(start_date, 's') + start_day * 86400
+    last_day = np.broadcast_to(max_session_day(start_date, end_date, start_day), len(user_ids))
+    session_time = (
+        user_start[user_pos]
+        + rng.integers(0, last_day[user_pos] + 1, n) * 86400
+        + rng.integers(7, 23, n) * 3600
+        + rng.integers(0, 60, n) * 60
+    )
+
+    present = simulate_funnel(n, rng)
+
+    # Eligibility: первая (в порядке генерации) сессия с брошенной корзиной в окне кампании
+    abandon = (present[:, PAY_PAGE_STEP] & ~present[:, FINISH_PAY_STEP]) | present[:, ABANDON_CART_STEP]
+    touch = session_time + np.timedelta64(5, 'm')
+    eligible = np.flatnonzero(
+        abandon & (touch >= np.datetime64(campaign_start, 's')) & (touch <= np.datetime64(campaign_end, 's'))
+    )
+    eligible_users, first = np.unique(user_pos[eligible], return_index=True)
+    touch_ts = touch[eligible[first]]
+    is_test_user = rng.random(len(eligible_users)) < TEST_SHARE
+
+    test_group = list(zip(user_ids[eligible_users[is_test_user]].tolist(), touch_ts[is_test_user].tolist()))
+    control_group = list(zip(user_ids[eligible_users[~is_test_user]].tolist(), touch_ts[~is_test_user].tolist()))
+
+    is_test = np.zeros(len(user_ids), dtype=bool)
+    is_test[eligible_users[is_test_user]] = True
+    apply_test_uplift_matrix(present, is_test[user_pos], rng)
+
+    session_numbers = np.arange(n) - np.repeat(np.cumsum(num_sessions) - num_sessions, num_sessions)
+    events_df = _funnel_events_frame(user_ids[user_pos], session_numbers, session_time, present, rng, compact)
+    return events_df, test_group, control_group
+
+
+# Однопроходный режим: поток чанков (events_df, test_group, control_group) по шардам.
+# Окно кампании передаётся один раз, а не ищется в campaigns_df на каждой сессии.
+# vectorized=True — матричный симулятор воронки generate_matrix_shard
+def iter_single_pass_chunks(user_df, start_date, campaign_start, campaign_end, seed,
+                            shard_size=1000, num_workers=1, max_in_flight=None, compact=False,
+                            vectorized=False, end_date=None):
+    shards = _user_shards(user_df, shard_size)
+    tasks = (
+        (shard, start_date, end_date, campaign_start, campaign_end, seed_seq, compact)
+        for shard, seed_seq in zip(shards, shard_seeds(seed, EVENTS_STREAM, len(shards)))
+    )
+    shard_func = generate_matrix_shard if vectorized else generate_single_pass_shard
+    return iter_sharded(shard_func, tasks, num_workers, max_in_flight)
+
+
+# Инкремент после сгенерированного периода: у пользователя Poisson(частота * дней)
+# сессий, частота — среднее число сессий его типа за SESSION_PERIOD_DAYS дней.
+# Сессии равномерно по дням [start_date, end_date], 7:00-22:59; тест-группа
+# платит с вероятностью TEST_FINISH_PAY_PROB. Нумерация сессий продолжается
+# с колонки sessions состояния
+def generate_increment_shard(task):
+    state, start_date, end_date, seed_seq, compact = task
+    rng = np.random.default_rng(seed_seq)
+    user_ids = state['user_id'].to_numpy()
+    user_type = state['user_type'].to_numpy()
+    n_days = (end_date - start_date).days + 1
+
+    rate = np.array([np.mean(sessions_by_user_type[t]) for t in user_type]) / SESSION_PERIOD_DAYS
+    num_sessions = rng.poisson(rate * n_days)
+    user_pos = np.repeat(np.arange(len(user_ids)), num_sessions)
+    n = len(user_pos)
+
+    session_time = (
+        np.datetime64(start_date, 's')
+        + rng.integers(0, n_days, n) * 86400
+        + rng.integers(7, 23, n) * 3600
+        + rng.integers(0, 60, n) * 60
+    )
+    is_test = state['is_test'].to_numpy(dtype=bool)[user_pos]
+    present = simulate_funnel(n, rng, {'finish_pay': np.where(is_test, TEST_FINISH_PAY_PROB, FINISH_PAY_PROB)})
+
+    session_numbers = (
+        state['sessions'].to_numpy(dtype=np.int64)[user_pos]
+        + np.arange(n) - np.repeat(np.cumsum(num_sessions) - num_sessions, num_sessions)
+    )
+    return _funnel_events_frame(user_ids[user_pos], session_numbers, session_time, present, rng, compact)
+
+
+# Поток чанков событий инкремента; у инкремента epoch свои потоки RNG
+def iter_increment_chunks(state, start_date, end_date, seed, epoch, shard_size=1000, num_workers=1,
+                          max_in_flight=None, compact=False):
+    shards = _user_shards(state, shard_size)
+    tasks = (
+        (shard, start_date, end_date, seed_seq, compact)
+        for shard, seed_seq in zip(shards, shard_seeds(seed, EVENTS_STREAM, len(shards), epoch))
+    )
+    return iter_sharded(generate_increment_shard, tasks, num_workers, max_in_flight)
+
+
+# Шардированная генерация целиком в памяти (склейка чанков)
+def generate_events_sharded(user_df, start_date, campaign_start, campaign_end, seed,
+                            shard_size=1000, num_workers=1, compact=False, end_date=None):
+    test_group, control_group = assign_test_control_sharded(
+        user_df, start_date, campaign_start, campaign_end, seed, shard_size, num_workers, end_date
+    )
+    events_df = pd.concat(
+        iter_events_chunks(user_df, start_date, test_group, seed, shard_size, num_workers, compact=compact,
+                           end_date=end_date),
+        ignore_index=True
+    )
+    return events_df, test_group, control_group
+
+
+# Строки событий с измерениями куба: платформа и город из users (индекс — user_id),
+# группа кампании из group_by_user (user_id -> 'test' / 'control')
+def cube_frame(events_df, users, group_by_user):
+    user_id = events_df['user_id']
+    return events_df[['user_id', 'timestamp', 'event']].assign(
+        platform=user_id.map(users['platform']),
+        city=user_id.map(users['city']),
+        group=user_id.map(group_by_user).fillna('none'),
+    )
@@ -1,33 +1,110 @@
+import argparse
+import os
 import random
+import sys
+from contextlib import nullcontext
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-
-random.seed(42)
-np.random.seed(42)
+from operator import itemgetter
+
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+
+from lavka_config import CITIES, PLATFORMS, user_types, user_type_probs
+from lavka_engine import (
+    generate_session_events, is_valid_purchase_time, assign_test_control_sharded, iter_events_chunks,
+    iter_single_pass_chunks, cube_frame, max_start_day, max_session_day, CUBE_GROUPING_SETS,
+    EVENTS_SCHEMA, USER_SCHEMA, CONTROL_SCHEMA, INTERACTIONS_SCHEMA, CAMPAIGN_CONTROL_SCHEMA
+)
+from lavka_increment import CHECKPOINT_PREFIX, append_events, save_events_checkpoint, track_chunks
+from product_analytics.profiling import StageProfiler
+from product_analytics.schema import apply_schema
+from product_analytics.streaming import chunk_writer, tee_chunks, write_table
+
+# Генерация — функция generate(...), параметры ниже — её значения по умолчанию.
+# Из командной строки: python lavka_generate_script_v2.py --users 1000 --format parquet ...
+# (см. --help). Куб и скетчи импортируются только если включены
+# Готовые таблицы проигрываются потоком NDJSON по времени: python -m product_analytics.replay
+
+# Режим генерации событий:
+#   "loop"        — исходные два прохода по пользователям в одном процессе
+#   "sharded"     — те же проходы по шардам пользователей в пуле процессов;
+#                   у каждого шарда свой поток RNG, результат не зависит от NUM_WORKERS.
+#                   События пишутся в файл чанками по SHARD_SIZE пользователей, в памяти
+#                   не больше MAX_IN_FLIGHT чанков — пиковая память не зависит от NUM_USERS
+#   "single_pass" — как "sharded", но за один проход: eligibility и test/control
+#                   считаются вместе с генерацией событий, uplift тест-группы
+#                   применяется к готовым сессиям без повторной симуляции
+#   "matrix"      — однопроходный режим с векторным симулятором воронки:
+#                   цепочки всех сессий шарда — одна матрица Бернулли
+GENERATION_MODE = "matrix"
+GENERATION_MODES = ("loop", "sharded", "single_pass", "matrix")
+SEED = 42
+SHARD_SIZE = 500
+NUM_WORKERS = os.cpu_count()
+MAX_IN_FLIGHT = 2 * NUM_WORKERS
+
+# Компактная схема: int64 session_id, category для event/city/platform/user_type,
+# datetime64[s] для времени (и в памяти, и в файлах)
+COMPACT_SCHEMA = False
+# Формат файлов: "csv" или "parquet" (нужен pyarrow; сохраняет типы компактной схемы)
+OUTPUT_FORMAT = "csv"
+# Каталог для всех файлов ("" — текущий)
+OUTPUT_DIR = ""
+# Партиции таблицы логов для "parquet": None — один файл, иначе каталог-датасет
+# с hive-партициями, например ["event_date"] или ["event_date", "event"]; читается
+# product_analytics.partitioned.read_partitioned только по нужным датам и событиям
+PARTITION_BY = None
+# Агрегатный куб: события и уникальные пользователи по дню/неделе/месяцу × событию ×
+# платформе × городу × группе кампании, собирается по ходу генерации в lavka_cube.*
+BUILD_CUBE = False
+# HyperLogLog-скетчи уникальных пользователей по дню × этим измерениям (колонки
+# cube_frame: event, platform, city, group) в lavka_sketches.npz; сливаются
+# в WAU/MAU без сырых событий, см. product_analytics.hll. None — не строить
+SKETCH_DIMENSIONS = None  # например, ["event"]
+# Целевая ошибка скетча; None — DEFAULT_PRECISION (p=12: 4 КБ на ключ, ~1.6%).
+# Память — 2^p байт на ключ (день × значения измерений): error=0.01 даёт p=14, 16 КБ
+SKETCH_ERROR = None
+# Event store событий lavka_events_df.events (нужен COMPACT_SCHEMA = True): бинарный
+# memmap-массив, отсортированный по (user_id, timestamp), с индексом по пользователям —
+# история пользователя без groupby, см. product_analytics.event_store.EventStore.
+# Пишется вместе с основной таблицей событий; APPEND_UNTIL его не дописывает
+EVENT_STORE = False
+# Таргетинг остальных кампаний CAMPAIGNS по готовым логам (lavka_targeting): их касания
+# дописываются в lavka_campaign_interactions_df, контрольные группы всех кампаний —
+# в lavka_campaign_control_df (campaign_id, user_id, fake_touch_time).
+# Группы push_abandon_cart задаёт сама генерация (uplift теста), lavka_control_group_df не меняется
+TARGET_ALL_CAMPAIGNS = False
+# Порядок строк таблицы lavka_events_df: None — как генерируется, по (user_id, timestamp);
+# "timestamp" — глобально по времени, "user" — по (user_id, timestamp) принудительно.
+# Чанки сбрасываются на диск отсортированными прогонами и сливаются k-way merge
+# (product_analytics.external_sort) — весь датасет в памяти не собирается
+SORT_BY = None
 
 NUM_USERS = 5000
 START_DATE = datetime(2024, 2, 1)
 END_DATE = datetime(2024, 5, 31)
-EVENTS = [
-    'open_app', 'search', 'view_product', 'add_to_cart', 'pay_page', 'finish_pay',
-    'like', 'remove_from_cart', 'abandon_cart', 'apply_coupon', 'scroll_page'
-]
-CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Новосибирск', 'Екатеринбург']
-PLATFORMS = ['iOS', 'Android']
-
-user_types = ['active', 'medium', 'rare']
-user_type_probs = [0.3, 0.5, 0.2]
-user_df = pd.DataFrame({
-    'user_id': [i for i in range(NUM_USERS)],
-    'city': np.random.choice(CITIES, NUM_USERS),
-    'platform': np.random.choice(PLATFORMS, NUM_USERS),
-    'user_type': np.random.choice(user_types, NUM_USERS, p=user_type_probs)
-})
+
+# Инкрементальный режим: полная генерация сохраняет чекпоинт (lavka_checkpoint.json
+# и состояние пользователей lavka_state.*). Если задать APPEND_UNTIL, к lavka_events_df
+# дописываются только события после конца прошлого запуска (END_DATE или день последнего
+# события, если данные кончились раньше) по APPEND_UNTIL включительно,
+# уже записанные строки не меняются (CSV или партиционированный Parquet, см. PARTITION_BY)
+APPEND_UNTIL = None  # например, datetime(2024, 6, 30)
+
+# Профилирование этапов: wall/CPU-время, пиковая память, строк в секунду —
+# отчёт в PROFILE_REPORT. PROFILE_CPROFILE / PROFILE_TRACEMALLOC — cProfile и
+# tracemalloc на каждый этап (заметно замедляют генерацию)
+PROFILE = False
+PROFILE_REPORT = "lavka_profile.json"
+PROFILE_CPROFILE = False
+PROFILE_TRACEMALLOC = False
 
 # ===== Таблица маркетинговых кампаний =====
 
-campaigns_df = pd.DataFrame([
+CAMPAIGNS = [
     {
         'campaign_id': 'push_abandon_cart',
         'campaign_type': 'push',
@@ -55,191 +132,374 @@ campaigns_df = pd.DataFrame([
         'budget': 0,
         'goal': 'promote_delivery'
     }
-])
-
-
-# Симуляция сессий и ивентов
-sessions = []
-events_log = []
-
-def generate_session_events(user_type, is_test_user=False):
-    event_chain = ['open_app']
-    if random.random() < 0.9:
-        event_chain.append('search')
-    if random.random() < 0.7:
-        event_chain.append('view_product')
-    if random.random() < 0.6:
-        event_chain.append('add_to_cart')
-        if random.random() < 0.3:
-            event_chain.append('remove_from_cart')
-    if random.random() < 0.7:
-        event_chain.append('abandon_cart')
-    if 'add_to_cart' in event_chain and random.random() < 0.5:
-        event_chain.append('apply_coupon')
-    if 'add_to_cart' in event_chain and random.random() < 0.5:
-        event_chain.append('pay_page')
-        
-        # увеличиваем шанс конверсии для тест-группы
-        if is_test_user:
-            if random.random() < 0.3:  # увеличенная вероятность для тест-группы
-                event_chain.append('finish_pay')
-        else:
-            if random.random() < 0.2:  # обычная вероятность для контроля
-                event_chain.append('finish_pay')
-
-    if random.random() < 0.5:
-        event_chain.append('like')
-    if random.random() < 0.7:
-        event_chain.append('scroll_page')
-    return event_chain
-
-
-def is_valid_purchase_time(dt):
-    return 7 <= dt.hour < 23
-
-
-
-
-
-# === 1. Предсобираем eligible пользователей
-
-eligible_user_dict = dict()  # user_id -> ts (любой один ts на пользователя)
-# eligible_users = set()
-temp_events_log = []
-
-for _, row in user_df.iterrows():
-    user_id = row['user_id']
-    user_type = row['user_type']
-    num_sessions = {
-        'active': random.randint(18, 40),
-        'medium': random.randint(8, 18),
-        'rare': random.randint(4, 8)
-    }[user_type]
-
-    start = START_DATE + timedelta(days=random.randint(0, 10))
-    for _ in range(num_sessions):
-        session_time = start + timedelta(days=random.randint(0, 100), hours=random.randint(7, 22), minutes=random.randint(0, 59))
-        event_chain = generate_session_events(user_type, is_test_user=False)
-        session_id = f"{user_id}_{session_time.date()}_{session_time.time()}"
-
-        for i, event in enumerate(event_chain):
-            timestamp = session_time + timedelta(seconds=i * random.randint(20, 60))
-            if event == 'finish_pay' and not is_valid_purchase_time(timestamp):
-                continue
-            temp_events_log.append({
-                'user_id': user_id,
-                'event': event,
-                'timestamp': timestamp,
-                'session_id': session_id
-            })
-
-        if ('pay_page' in event_chain and 'finish_pay' not in event_chain) or ('abandon_cart' in event_chain):
-            ts = session_time + timedelta(minutes=5)
-            campaign_start = campaigns_df.loc[campaigns_df['campaign_id'] == 'push_abandon_cart', 'start_date'].iloc[0]
-            campaign_end = campaigns_df.loc[campaigns_df['campaign_id'] == 'push_abandon_cart', 'end_date'].iloc[0]
-            if campaign_start <= ts <= campaign_end:
-                if user_id not in eligible_user_dict:
-                    eligible_user_dict[user_id] = ts
-                # eligible_users.add((user_id, ts))
-
- 
-# === 2. Делим на test / control
-
-eligible_user_ids = list(eligible_user_dict.keys())
-random.shuffle(eligible_user_ids)
-
-test_size = int(len(eligible_user_ids) * 0.5)
-test_user_ids = set(eligible_user_ids[:test_size])
-control_user_ids = set(eligible_user_ids[test_size:])
-
-# Формируем test_group и control_group в том же формате: (user_id, ts)
-test_group = [(user_id, eligible_user_dict[user_id]) for user_id in test_user_ids]
-control_group = [(user_id, eligible_user_dict[user_id]) for user_id in control_user_ids]
-
-test_users_set = set(user_id for user_id, _ in test_group)
-
-# eligible_users = list(eligible_users)
-# random.shuffle(eligible_users)
-# test_size = int(len(eligible_users) * 0.5)
-# test_group = eligible_users[:test_size]
-# control_group = eligible_users[test_size:]
-# test_users_set = set(user_id for user_id, _ in test_group)
-
-
-# === 3. Генерируем сессии с учётом is_test_user
-events_log = []
-
-for _, row in user_df.iterrows():
-    user_id = row['user_id']
-    user_type = row['user_type']
-    is_test = user_id in test_users_set
-
-    num_sessions = {
-        'active': random.randint(18, 40),
-        'medium': random.randint(8, 18),
-        'rare': random.randint(4, 8)
-    }[user_type]
-
-    start = START_DATE + timedelta(days=random.randint(0, 10))
-    for _ in range(num_sessions):
-        session_time = start + timedelta(days=random.randint(0, 100), hours=random.randint(7, 22), minutes=random.randint(0, 59))
-        event_chain = generate_session_events(user_type, is_test_user=is_test)
-        session_id = f"{user_id}_{session_time.date()}_{session_time.time()}"
-
-        for i, event in enumerate(event_chain):
-            timestamp = session_time + timedelta(seconds=i * random.randint(20, 60))
-            if event == 'finish_pay' and not is_valid_purchase_time(timestamp):
-                continue
-            events_log.append({
-                'user_id': user_id,
-                'event': event,
-                'timestamp': timestamp,
-                'session_id': session_id
-            })
-
-events_df = pd.DataFrame(events_log).sort_values(by=['user_id', 'timestamp']).reset_index(drop=True)
-
-# === 4. Кампании: касания
-touchpoints = []
-
-for user_id, ts in test_group:
-    touchpoints.append({
-        'user_id': user_id,
-        'campaign_id': 'push_abandon_cart',
-        'timestamp': ts,
-        'reaction': np.random.choice(['clicked', 'ignored', 'converted'], p=[0.3, 0.6, 0.1])
-    })
-
-campaign_interactions_df = pd.DataFrame(touchpoints)
-control_group_df = pd.DataFrame(control_group, columns=['user_id', 'fake_touch_time'])
-
-
-
-
-events_df.to_csv("lavka_events_df.csv", index=False)
-user_df.to_csv("lavka_user_df.csv", index=False)
-campaigns_df.to_csv("lavka_campaigns_df.csv", index=False)
-campaign_interactions_df.to_csv("lavka_campaign_interactions_df.csv", index=False)
-
-# control_group_df = pd.DataFrame(control_group, columns=['user_id', 'fake_touch_time'])
-control_group_df.to_csv("lavka_control_group_df.csv", index=False)
-
-
-# ======================= Результат =======================
-print("Users:")
-print(user_df.head())
-
-print("\nEvents:")
-print(events_df.head())
-
-print("\nCampaigns:")
-print(campaigns_df.head())
+]
 
-print("\nCampaign Interactions:")
-print(campaign_interactions_df.head())
 
-test_user_ids = set(user_id for user_id, _ in test_group)
-control_user_ids = set(user_id for user_id, _ in control_group)
+# Окно кампании (start_date, end_date) по campaign_id
+def campaign_window(campaigns_df, campaign_id='push_abandon_cart'):
+    campaign = campaigns_df.loc[campaigns_df['campaign_id'] == campaign_id].iloc[0]
+    return campaign['start_date'], campaign['end_date']
+
+
+# Симуляция сессий и ивентов (исходный цикл, общий глобальный random)
+def generate_events_loop(user_df, start_date, campaign_start, campaign_end, end_date=None):
+    # === 1. Предсобираем eligible пользователей
+
+    eligible_user_dict = dict()  # user_id -> ts (любой один ts на пользователя)
+    temp_events_log = []
+
+    for _, row in user_df.iterrows():
+        user_id = row['user_id']
+        user_type = row['user_type']
+        num_sessions = {
+            'active': random.randint(18, 40),
+            'medium': random.randint(8, 18),
+            'rare': random.randint(4, 8)
+        }[user_type]
+
+        start_day = random.randint(0, max_start_day(start_date, end_date))
+        start = start_date + timedelta(days=start_day)
+        last_day = int(max_session_day(start_date, end_date, start_day))
+        for _ in range(num_sessions):
+            session_time = start + timedelta(days=random.randint(0, last_day), hours=random.randint(7, 22), minutes=random.randint(0, 59))
+            event_chain = generate_session_events(user_type, is_test_user=False)
+            session_id = f"{user_id}_{session_time.date()}_{session_time.time()}"
+
+            for i, event in enumerate(event_chain):
+                timestamp = session_time + timedelta(seconds=i * random.randint(20, 60))
+                if event == 'finish_pay' and not is_valid_purchase_time(timestamp):
+                    continue
+                temp_events_log.append({
+                    'user_id': user_id,
+                    'event': event,
+                    'timestamp': timestamp,
+                    'session_id': session_id
+                })
+
+            if ('pay_page' in event_chain and 'finish_pay' not in event_chain) or ('abandon_cart' in event_chain):
+                ts = session_time + timedelta(minutes=5)
+                if campaign_start <= ts <= campaign_end:
+                    if user_id not in eligible_user_dict:
+                        eligible_user_dict[user_id] = ts
+
+
+    # === 2. Делим на test / control
+
+    eligible_user_ids = list(eligible_user_dict.keys())
+    random.shuffle(eligible_user_ids)
+
+    test_size = int(len(eligible_user_ids) * 0.5)
+    test_user_ids = set(eligible_user_ids[:test_size])
+    control_user_ids = set(eligible_user_ids[test_size:])
+
+    # Формируем test_group и control_group в том же формате: (user_id, ts)
+    test_group = [(user_id, eligible_user_dict[user_id]) for user_id in test_user_ids]
+    control_group = [(user_id, eligible_user_dict[user_id]) for user_id in control_user_ids]
+
+    test_users_set = set(user_id for user_id, _ in test_group)
+
+
+    # === 3. Генерируем сессии с учётом is_test_user
+    events_log = []
+
+    for _, row in user_df.iterrows():
+        user_id = row['user_id']
+        user_type = row['user_type']
+        is_test = user_id in test_users_set
+
+        num_sessions = {
+            'active': random.randint(18, 40),
+            'medium': random.randint(8, 18),
+            'rare': random.randint(4, 8)
+        }[user_type]
+
+        start_day = random.randint(0, max_start_day(start_date, end_date))
+        start = start_date + timedelta(days=start_day)
+        last_day = int(max_session_day(start_date, end_date, start_day))
+        user_events = []
+        for _ in range(num_sessions):
+            session_time = start + timedelta(days=random.randint(0, last_day), hours=random.randint(7, 22), minutes=random.randint(0, 59))
+            event_chain = generate_session_events(user_type, is_test_user=is_test)
+            session_id = f"{user_id}_{session_time.date()}_{session_time.time()}"
+
+            for i, event in enumerate(event_chain):
+                timestamp = session_time + timedelta(seconds=i * random.randint(20, 60))
+                if event == 'finish_pay' and not is_valid_purchase_time(timestamp):
+                    continue
+                user_events.append({
+                    'user_id': user_id,
+                    'event': event,
+                    'timestamp': timestamp,
+                    'session_id': session_id
+                })
+
+        # Пользователи идут по возрастанию user_id, поэтому сортировки событий
+        # внутри пользователя (стабильной) достаточно для порядка (user_id, timestamp)
+        user_events.sort(key=itemgetter('timestamp'))
+        events_log.extend(user_events)
+
+    events_df = pd.DataFrame(events_log)
+
+    return events_df, test_group, control_group
+
+
+# Однопроходный режим: группы test/control собираются по мере записи чанков событий
+def collect_groups(chunks, test_group, control_group, group_by_user):
+    for events_chunk, shard_test_group, shard_control_group in chunks:
+        test_group.extend(shard_test_group)
+        control_group.extend(shard_control_group)
+        group_by_user.update(campaign_groups(shard_test_group, shard_control_group))
+        yield events_chunk
+
+
+# user_id -> группа кампании (для куба)
+def campaign_groups(test_group, control_group):
+    groups = {user_id: 'test' for user_id, _ in test_group}
+    groups.update((user_id, 'control') for user_id, _ in control_group)
+    return groups
+
+
+# Полная генерация или дозапись по чекпоинту (append_until); файлы — в output_dir.
+# Возвращает число строк событий (при дозаписи — дописанных)
+def generate(num_users=NUM_USERS, start_date=START_DATE, end_date=END_DATE, seed=SEED,
+             output_dir=OUTPUT_DIR, output_format=OUTPUT_FORMAT, mode=GENERATION_MODE,
+             shard_size=SHARD_SIZE, num_workers=NUM_WORKERS, max_in_flight=MAX_IN_FLIGHT,
+             compact=COMPACT_SCHEMA, partition_by=PARTITION_BY, build_cube=BUILD_CUBE,
+             sketch_dimensions=SKETCH_DIMENSIONS, sketch_error=SKETCH_ERROR, event_store=EVENT_STORE,
+             target_all_campaigns=TARGET_ALL_CAMPAIGNS, sort_by=SORT_BY,
+             append_until=APPEND_UNTIL, profile=PROFILE, profile_report=PROFILE_REPORT,
+             profile_cprofile=PROFILE_CPROFILE, profile_tracemalloc=PROFILE_TRACEMALLOC):
+    if mode not in GENERATION_MODES:
+        raise ValueError(f"Режим генерации — один из {GENERATION_MODES}")
+    if append_until is None and end_date < start_date:
+        raise ValueError(f"Конец периода {end_date:%Y-%m-%d} раньше начала {start_date:%Y-%m-%d}")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    def output(name):
+        return os.path.join(output_dir, name)
+
+    checkpoint_prefix = output(CHECKPOINT_PREFIX)
+    profiler = StageProfiler(profile, output(profile_report), profile_cprofile, profile_tracemalloc)
+
+    if append_until is not None:
+        profiler.start("append_events")
+        appended_rows = append_events(append_until, checkpoint_prefix, num_workers=num_workers, max_in_flight=max_in_flight)
+        profiler.finish(rows=appended_rows)
+        print(f"Дописано событий: {appended_rows} (по {append_until:%Y-%m-%d})")
+        return appended_rows
+
+    random.seed(seed)
+    np.random.seed(seed)
+
+    profiler.start("users")
+    user_df = pd.DataFrame({
+        'user_id': [i for i in range(num_users)],
+        'city': np.random.choice(CITIES, num_users),
+        'platform': np.random.choice(PLATFORMS, num_users),
+        'user_type': np.random.choice(user_types, num_users, p=user_type_probs)
+    })
 
-intersection = test_user_ids & control_user_ids
-print(f"Пересечений в группах: {len(intersection)}")  # должно быть 0
+    if compact:
+        user_df = apply_schema(user_df, USER_SCHEMA)
+
+    profiler.stop(rows=len(user_df))
+
+    campaigns_df = pd.DataFrame(CAMPAIGNS)
+    # Окно кампании push_abandon_cart
+    campaign_start, campaign_end = campaign_window(campaigns_df)
+
+    # Чанки событий; в шардированных режимах — ленивый поток по шардам пользователей.
+    # Этапы 1-3 идут внутри записи, поэтому профилируются одним этапом events.
+    # Процессов не больше, чем шардов: маленький прогон не поднимает пул целиком
+    profiler.start("events")
+    num_workers = min(num_workers, -(-num_users // shard_size))
+    group_by_user = {}
+    if mode in ("single_pass", "matrix"):
+        test_group, control_group = [], []
+        events_chunks = collect_groups(
+            iter_single_pass_chunks(
+                user_df, start_date, campaign_start, campaign_end, seed,
+                shard_size=shard_size, num_workers=num_workers, max_in_flight=max_in_flight,
+                compact=compact, vectorized=mode == "matrix", end_date=end_date
+            ),
+            test_group, control_group, group_by_user
+        )
+    elif mode == "sharded":
+        test_group, control_group = assign_test_control_sharded(
+            user_df, start_date, campaign_start, campaign_end, seed,
+            shard_size=shard_size, num_workers=num_workers, end_date=end_date
+        )
+        events_chunks = iter_events_chunks(
+            user_df, start_date, test_group, seed,
+            shard_size=shard_size, num_workers=num_workers, max_in_flight=max_in_flight,
+            compact=compact, end_date=end_date
+        )
+        group_by_user = campaign_groups(test_group, control_group)
+    else:
+        events_df, test_group, control_group = generate_events_loop(user_df, start_date, campaign_start, campaign_end, end_date)
+        if compact:
+            events_df = apply_schema(events_df, EVENTS_SCHEMA)
+        events_chunks = [events_df]
+        group_by_user = campaign_groups(test_group, control_group)
+
+    cube_users = user_df.set_index('user_id')
+    if build_cube:
+        from product_analytics.cube import CubeBuilder, cube_chunks
+
+        events_cube = CubeBuilder(CUBE_GROUPING_SETS)
+        events_chunks = cube_chunks(events_chunks, events_cube, lambda chunk: cube_frame(chunk, cube_users, group_by_user))
+    if sketch_dimensions is not None:
+        from product_analytics.cube import cube_chunks
+        from product_analytics.hll import DistinctSketches
+
+        events_sketches = DistinctSketches(sketch_dimensions, error=sketch_error)
+        events_chunks = cube_chunks(events_chunks, events_sketches, lambda chunk: cube_frame(chunk, cube_users, group_by_user))
+    if target_all_campaigns:
+        from lavka_targeting import CampaignTargeting
+        from product_analytics.cube import cube_chunks
+
+        targeting = CampaignTargeting(campaigns_df[campaigns_df['campaign_id'] != 'push_abandon_cart'], seed)
+        events_chunks = cube_chunks(events_chunks, targeting, lambda chunk: chunk)
+
+    # События сохраняем по мере генерации; число сессий и последнее время копятся для чекпоинта
+    session_counts, last_times = [], []
+    with chunk_writer(output(f"lavka_events_df.{output_format}"), partition_by=partition_by) as events_writer, \
+            (chunk_writer(output("lavka_events_df.events")) if event_store else nullcontext()) as store_writer:
+        if event_store:
+            events_chunks = tee_chunks(events_chunks, store_writer)
+        events_chunks = track_chunks(events_chunks, session_counts, last_times)
+        if sort_by is not None:
+            from product_analytics.external_sort import SORT_KEYS, external_sort
+
+            events_chunks = external_sort(events_chunks, SORT_KEYS[sort_by], directory=output_dir or None)
+        for events_chunk in events_chunks:
+            events_writer.write(events_chunk)
+
+    # Сессии раскиданы на SESSION_PERIOD_DAYS от старта пользователя, поэтому данные
+    # могут кончиться раньше end_date: в чекпоинт идёт день последнего события, и
+    # дозапись продолжает со следующего дня без пустого промежутка
+    data_end = end_date
+    if last_times:
+        data_end = min(end_date, pd.Timestamp(max(last_times)).normalize().to_pydatetime())
+    save_events_checkpoint(user_df, session_counts, test_group, {
+        "seed": seed,
+        "shard_size": shard_size,
+        "compact": compact,
+        "output_format": output_format,
+        "events_path": events_writer.path,
+        "partition_by": partition_by,
+        "start_date": start_date,
+        "end_date": data_end,
+    }, prefix=checkpoint_prefix)
+
+    if build_cube:
+        write_table(events_cube.result(), output(f"lavka_cube.{output_format}"))
+    if sketch_dimensions is not None:
+        events_sketches.save(output("lavka_sketches.npz"))
+    profiler.stop(rows=events_writer.rows)
+
+    # === 4. Кампании: касания
+    profiler.start("touchpoints")
+    touchpoints = []
+
+    for user_id, ts in test_group:
+        touchpoints.append({
+            'user_id': user_id,
+            'campaign_id': 'push_abandon_cart',
+            'timestamp': ts,
+            'reaction': np.random.choice(['clicked', 'ignored', 'converted'], p=[0.3, 0.6, 0.1])
+        })
+
+    campaign_interactions_df = pd.DataFrame(touchpoints)
+    control_group_df = pd.DataFrame(control_group, columns=['user_id', 'fake_touch_time'])
+    if target_all_campaigns:
+        targeting_touchpoints, targeting_controls = targeting.result()
+        campaign_interactions_df = pd.concat([campaign_interactions_df, targeting_touchpoints], ignore_index=True)
+        campaign_control_df = pd.concat(
+            [control_group_df.assign(campaign_id='push_abandon_cart'), targeting_controls], ignore_index=True
+        )[['campaign_id', 'user_id', 'fake_touch_time']]
+
+    if compact:
+        campaign_interactions_df = apply_schema(campaign_interactions_df, INTERACTIONS_SCHEMA)
+        control_group_df = apply_schema(control_group_df, CONTROL_SCHEMA)
+        if target_all_campaigns:
+            campaign_control_df = apply_schema(campaign_control_df, CAMPAIGN_CONTROL_SCHEMA)
+
+    profiler.stop(rows=len(campaign_interactions_df) + len(control_group_df))
+
+    profiler.start("write_tables")
+    write_table(user_df, output(f"lavka_user_df.{output_format}"))
+    write_table(campaigns_df, output(f"lavka_campaigns_df.{output_format}"))
+    write_table(campaign_interactions_df, output(f"lavka_campaign_interactions_df.{output_format}"))
+    write_table(control_group_df, output(f"lavka_control_group_df.{output_format}"))
+    if target_all_campaigns:
+        write_table(campaign_control_df, output(f"lavka_campaign_control_df.{output_format}"))
+    profiler.finish()
+
+
+    # ======================= Результат =======================
+    print("Users:")
+    print(user_df.head())
+
+    print("\nEvents:")
+    print(events_writer.head)
+
+    print("\nCampaigns:")
+    print(campaigns_df.head())
+
+    print("\nCampaign Interactions:")
+    print(campaign_interactions_df.head())
+
+    test_user_ids = set(user_id for user_id, _ in test_group)
+    control_user_ids = set(user_id for user_id, _ in control_group)
+
+    intersection = test_user_ids & control_user_ids
+    print(f"Пересечений в группах: {len(intersection)}")  # должно быть 0
+    return events_writer.rows
+
+
+def _date(value):
+    return datetime.strptime(value, "%Y-%m-%d")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Генерация событий Яндекс Лавки")
+    parser.add_argument("--users", type=int, default=NUM_USERS, help="число пользователей")
+    parser.add_argument("--start", type=_date, default=START_DATE, help="начало периода, YYYY-MM-DD")
+    parser.add_argument("--end", type=_date, default=END_DATE, help="конец периода, YYYY-MM-DD")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--output-dir", default=OUTPUT_DIR, help="каталог для файлов (по умолчанию текущий)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default=OUTPUT_FORMAT)
+    parser.add_argument("--mode", choices=GENERATION_MODES, default=GENERATION_MODE)
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS)
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--compact", action="store_true", default=COMPACT_SCHEMA, help="компактная схема")
+    parser.add_argument("--partition-by", nargs="+", default=PARTITION_BY, help="партиции событий (parquet)")
+    parser.add_argument("--cube", action="store_true", default=BUILD_CUBE, help="агрегатный куб")
+    parser.add_argument("--sketch-dimensions", nargs="*", default=SKETCH_DIMENSIONS, help="HLL-скетчи по измерениям")
+    parser.add_argument("--event-store", action="store_true", default=EVENT_STORE, help="event store событий")
+    parser.add_argument("--all-campaigns", action="store_true", default=TARGET_ALL_CAMPAIGNS,
+                        help="таргетинг всех кампаний CAMPAIGNS")
+    parser.add_argument("--sort-by", choices=["timestamp", "user"], default=SORT_BY,
+                        help="внешняя сортировка таблицы событий")
+    parser.add_argument("--append-until", type=_date, default=APPEND_UNTIL, help="дозапись по чекпоинту до даты")
+    parser.add_argument("--profile", action="store_true", default=PROFILE, help="профиль этапов в PROFILE_REPORT")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    generate(
+        num_users=args.users, start_date=args.start, end_date=args.end, seed=args.seed,
+        output_dir=args.output_dir, output_format=args.format, mode=args.mode,
+        shard_size=args.shard_size, num_workers=args.workers, max_in_flight=2 * args.workers,
+        compact=args.compact, partition_by=args.partition_by, build_cube=args.cube,
+        sketch_dimensions=args.sketch_dimensions, event_store=args.event_store,
+        target_all_campaigns=args.all_campaigns, sort_by=args.sort_by,
+        append_until=args.append_until, profile=args.profile,
+    )
+
+
+if __name__ == "__main__":
+    main()
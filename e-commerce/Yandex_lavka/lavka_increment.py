@@ -0,0 +1,74 @@
+# Инкрементальная дозапись событий Лавки.
+# После полной генерации в чекпоинт сохраняется состояние пользователей: город,
+# платформа, тип, попадание в тест-группу push_abandon_cart и число сессий.
+# append_events дописывает в конец lavka_events_df только новый период,
+# уже записанные события и группы кампании не пересчитываются.
+# Прерванная дозапись откатывается при повторе (product_analytics.checkpoint)
+
+from datetime import timedelta
+
+import pandas as pd
+
+from lavka_engine import iter_increment_chunks, USER_SCHEMA
+from product_analytics.checkpoint import (
+    load_checkpoint, save_checkpoint, data_size, append_prefix, rollback_append
+)
+from product_analytics.streaming import chunk_writer
+
+CHECKPOINT_PREFIX = "lavka"
+
+STATE_SCHEMA = USER_SCHEMA
+
+
+def session_counts(events_df):
+    return events_df.groupby("user_id")["session_id"].nunique()
+
+
+# Поток чанков событий без изменений; по дороге копится число сессий для чекпоинта
+# и (если передан last_times) последнее время события чанка
+def track_chunks(chunks, counts, last_times=None):
+    for events_chunk in chunks:
+        counts.append(session_counts(events_chunk))
+        if last_times is not None and len(events_chunk):
+            last_times.append(events_chunk["timestamp"].max())
+        yield events_chunk
+
+
+def build_state(user_df, counts, test_group):
+    state = user_df.copy()
+    state["is_test"] = state["user_id"].isin([user_id for user_id, _ in test_group]).astype(int)
+    sessions = pd.concat(counts).groupby(level=0).sum()
+    state["sessions"] = state["user_id"].map(sessions).fillna(0).astype("int64")
+    return state
+
+
+def save_events_checkpoint(user_df, counts, test_group, meta, prefix=CHECKPOINT_PREFIX):
+    meta = {**meta, "epoch": 0, "data_size": data_size(meta["events_path"])}
+    save_checkpoint(prefix, meta, build_state(user_df, counts, test_group))
+
+
+# Дописывает события за (end_date чекпоинта, until] и сдвигает чекпоинт; возвращает число строк
+def append_events(until, prefix=CHECKPOINT_PREFIX, num_workers=1, max_in_flight=None):
+    meta, state = load_checkpoint(prefix, STATE_SCHEMA)
+    start = meta["end_date"] + timedelta(days=1)
+    if until < start:
+        raise ValueError(f"Период до {until:%Y-%m-%d} уже сгенерирован (по {meta['end_date']:%Y-%m-%d})")
+
+    epoch = meta["epoch"] + 1
+    rollback_append(meta["events_path"], meta.get("data_size"), epoch)
+    chunks = iter_increment_chunks(
+        state, start, until, meta["seed"], epoch, meta["shard_size"], num_workers, max_in_flight,
+        compact=meta["compact"]
+    )
+
+    counts = []
+    with chunk_writer(meta["events_path"], append=True, partition_by=meta.get("partition_by"),
+                      prefix=append_prefix(epoch)) as events_writer:
+        for events_chunk in track_chunks(chunks, counts):
+            events_writer.write(events_chunk)
+
+    new_sessions = pd.concat(counts).groupby(level=0).sum()
+    state["sessions"] += state["user_id"].map(new_sessions).fillna(0).astype("int64")
+    save_checkpoint(prefix, {**meta, "end_date": until, "epoch": epoch, "data_size": data_size(meta["events_path"])},
+                    state)
+    return events_writer.rows
@@ -0,0 +1,159 @@
+# Таргетинг всех кампаний campaigns_df разом, без проверки окна на каждой сессии.
+#
+# Логи сворачиваются в таблицу сессий: начало сессии, пользователь и флаги событий
+# (булева матрица сессия × EVENTS заполняется одним присваиванием по кодам).
+# Правило кампании выбирается по goal: маска eligibility по флагам и задержка касания.
+# Маска считается один раз на goal, подходящие сессии сортируются по времени касания,
+# и окно каждой кампании [start_date, end_date] — непрерывный срез между двумя
+# searchsorted. Пересекающиеся кампании не дают вложенных циклов по сессиям:
+# работа — сортировка плюс суммарный размер срезов.
+#
+# Пользователь попадает в кампанию по первой по времени подходящей сессии в окне;
+# test/control делится по TEST_SHARE, реакции тест-группы — REACTION_PROBS.
+#
+#   touchpoints, controls = target_campaigns(events_df, campaigns_df, seed=42)
+#
+# CampaignTargeting копит совпадения по чанкам событий (add), как CubeBuilder,
+# поэтому подключается к потоку генератора через cube_chunks
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from lavka_config import EVENTS
+from lavka_engine import TEST_SHARE, TARGETING_STREAM
+from product_analytics.sharding import stream_seed
+
+REACTIONS = ['clicked', 'ignored', 'converted']
+REACTION_PROBS = [0.3, 0.6, 0.1]
+
+# goal кампании → (маска подходящих сессий по флагам событий, задержка касания от начала сессии)
+TARGETING_RULES = {
+    # Брошенная корзина (как is_abandon_cart_session): пуш через 5 минут
+    'recover_abandoned_cart': (
+        lambda s: (s['pay_page'] & ~s['finish_pay']) | s['abandon_cart'], timedelta(minutes=5)
+    ),
+    # Вовлечение: смотрел товары, но ничего не положил в корзину — письмо на следующий день
+    'engagement_increase': (
+        lambda s: s['view_product'] & ~s['add_to_cart'], timedelta(days=1)
+    ),
+    # Доставка: оплатил заказ — пуш со скидкой на следующую доставку через час
+    'promote_delivery': (
+        lambda s: s['finish_pay'], timedelta(hours=1)
+    ),
+}
+
+
+# Одна строка на session_id: user_id, start (datetime64[s]) и флаг каждого события из EVENTS
+def session_table(events_df):
+    codes, uniques = pd.factorize(events_df['session_id'])
+    n = len(uniques)
+    timestamp = events_df['timestamp'].to_numpy().astype('datetime64[s]').astype(np.int64)
+    start = np.full(n, np.iinfo(np.int64).max)
+    np.minimum.at(start, codes, timestamp)
+    user_id = np.zeros(n, dtype=np.int64)
+    user_id[codes] = events_df['user_id'].to_numpy()
+    event = pd.Categorical(events_df['event'], categories=EVENTS).codes
+    flags = np.zeros((n, len(EVENTS)), dtype=bool)
+    flags[codes[event >= 0], event[event >= 0]] = True
+
+    sessions = pd.DataFrame(flags, columns=EVENTS)
+    sessions.insert(0, 'start', start.astype('datetime64[s]'))
+    sessions.insert(0, 'user_id', user_id)
+    return sessions
+
+
+# Первое касание каждого пользователя в окне каждой кампании: campaign_id (category
+# в порядке campaigns_df), user_id, touch_time
+def match_campaigns(sessions, campaigns_df, rules=TARGETING_RULES):
+    users = sessions['user_id'].to_numpy()
+    start = sessions['start'].to_numpy()
+    positions, matched_users, touches = [], [], []
+    for goal, campaigns in campaigns_df.reset_index(drop=True).groupby('goal', sort=False):
+        if goal not in rules:
+            raise ValueError(f"Нет правила таргетинга для goal={goal!r}: {sorted(rules)}")
+        eligible_mask, delay = rules[goal]
+        eligible = np.flatnonzero(np.asarray(eligible_mask(sessions)))
+        touch = start[eligible] + np.timedelta64(delay).astype('m8[s]')
+        order = np.argsort(touch)
+        eligible, touch = eligible[order], touch[order]
+
+        lo = np.searchsorted(touch, campaigns['start_date'].to_numpy().astype('datetime64[s]'), side='left')
+        hi = np.searchsorted(touch, campaigns['end_date'].to_numpy().astype('datetime64[s]'), side='right')
+        for position, a, b in zip(campaigns.index, lo, hi):
+            # Срез уже по времени касания, поэтому первый индекс пользователя — самое раннее касание
+            campaign_users, first = np.unique(users[eligible[a:b]], return_index=True)
+            positions.append(np.full(len(campaign_users), position))
+            matched_users.append(campaign_users)
+            touches.append(touch[a:b][first])
+    return _matches_frame(campaigns_df, positions, matched_users, touches)
+
+
+def _matches_frame(campaigns_df, positions, users, touches):
+    if not positions:
+        positions, users, touches = [[]], [[]], [np.array([], dtype='datetime64[s]')]
+    return pd.DataFrame({
+        'campaign_id': pd.Categorical.from_codes(
+            np.concatenate(positions).astype(np.int64), categories=list(campaigns_df['campaign_id'])
+        ),
+        'user_id': np.concatenate(users).astype(np.int64),
+        'touch_time': np.concatenate(touches).astype('datetime64[s]'),
+    })
+
+
+# Самое раннее касание на (кампания, пользователь) по всем чанкам. Строки — по кампаниям
+# в порядке campaigns_df и user_id, поэтому деление на группы не зависит от порядка чанков.
+# Ключ сортировки — позиция кампании в старших 32 битах, user_id в младших
+def _first_touches(matches, campaigns_df):
+    position = matches['campaign_id'].cat.codes.to_numpy().astype(np.int64)
+    key = (position << 32) | matches['user_id'].to_numpy()
+    order = np.argsort(key, kind='stable')
+    key = key[order]
+    first = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    touch = np.minimum.reduceat(matches['touch_time'].to_numpy().astype(np.int64)[order], first)
+    key = key[first]
+    return _matches_frame(campaigns_df, [key >> 32], [key & 0xFFFFFFFF], [touch.astype('datetime64[s]')])
+
+
+# Деление совпадений на тест (касания с реакцией) и контроль (fake_touch_time)
+def split_groups(matches, seed, test_share=TEST_SHARE):
+    rng = np.random.default_rng(stream_seed(seed, TARGETING_STREAM))
+    is_test = rng.random(len(matches)) < test_share
+    touchpoints = matches.loc[is_test, ['user_id', 'campaign_id', 'touch_time']].reset_index(drop=True)
+    touchpoints = touchpoints.rename(columns={'touch_time': 'timestamp'})
+    touchpoints['reaction'] = pd.Categorical.from_codes(
+        rng.choice(len(REACTIONS), size=len(touchpoints), p=REACTION_PROBS), categories=REACTIONS
+    )
+    controls = matches.loc[~is_test].reset_index(drop=True).rename(columns={'touch_time': 'fake_touch_time'})
+    return touchpoints, controls
+
+
+class CampaignTargeting:
+    def __init__(self, campaigns_df, seed, rules=TARGETING_RULES):
+        self.campaigns_df = campaigns_df
+        self.seed = seed
+        self.rules = rules
+        self._parts = []
+
+    # frame — строки логов чанка: user_id, event, timestamp, session_id
+    # Чанки без совпадений не копятся: на пустых строках _first_touches не работает
+    def add(self, frame):
+        if len(frame):
+            matches = match_campaigns(session_table(frame), self.campaigns_df, self.rules)
+            if len(matches):
+                self._parts.append(matches)
+
+    def matches(self):
+        if not self._parts:
+            return _matches_frame(self.campaigns_df, [], [], [])
+        return _first_touches(pd.concat(self._parts, ignore_index=True), self.campaigns_df)
+
+    def result(self):
+        return split_groups(self.matches(), self.seed)
+
+
+def target_campaigns(events_df, campaigns_df, seed, rules=TARGETING_RULES):
+    targeting = CampaignTargeting(campaigns_df, seed, rules)
+    targeting.add(events_df)
+    return targeting.result()
@@ -0,0 +1,2 @@
+# Общие инструменты для генераторов данных и аналитики
+# (Analysing_telegram_users, e-commerce/Yandex_lavka)
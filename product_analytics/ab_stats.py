@@ -0,0 +1,150 @@
+# Статистика A/B теста сразу по многим метрикам и сегментам.
+# Метрики — колонки таблицы «один пользователь — одна строка», все метрики сегмента
+# считаются одной матричной операцией: t-тест Уэлча по суммам, bootstrap — матрица
+# весов ресэмплов (B × n) умножается на матрицу метрик (n × k). CUPED вычитает из
+# метрики предсказание по ковариате до кампании, поправка на множественные
+# проверки (Холм или Бенджамини-Хохберг) — по всей сетке сегмент × метрика.
+# p-value t-теста — через scipy (импортируется лениво)
+
+import numpy as np
+import pandas as pd
+
+# Предел размера матрицы весов bootstrap за один проход (элементов)
+BOOTSTRAP_BATCH_CELLS = 5_000_000
+
+
+# t-тест Уэлча по колонкам: test (n1 × k), control (n2 × k)
+def welch_ttest(test, control):
+    from scipy import stats
+
+    n1, n2 = len(test), len(control)
+    mean1, mean2 = test.mean(axis=0), control.mean(axis=0)
+    var1 = test.var(axis=0, ddof=1) / n1
+    var2 = control.var(axis=0, ddof=1) / n2
+    se = np.sqrt(var1 + var2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_stat = (mean1 - mean2) / se
+        df = (var1 + var2) ** 2 / (var1 ** 2 / (n1 - 1) + var2 ** 2 / (n2 - 1))
+    p_value = 2 * stats.t.sf(np.abs(t_stat), df)
+    return mean1, mean2, t_stat, p_value
+
+
+# Bootstrap разницы средних по всем колонкам сразу: веса ресэмпла — сколько раз
+# попала каждая строка, средние всех ресэмплов — одно матричное умножение.
+# Возвращает (низ, верх) доверительного интервала уровня 1 - alpha и p-value
+def bootstrap_diff(test, control, n_resamples=2000, alpha=0.05, rng=None):
+    rng = rng or np.random.default_rng()
+    diffs = _bootstrap_means(test, n_resamples, rng) - _bootstrap_means(control, n_resamples, rng)
+    low, high = np.quantile(diffs, [alpha / 2, 1 - alpha / 2], axis=0)
+    p_value = 2 * np.minimum((diffs <= 0).mean(axis=0), (diffs >= 0).mean(axis=0))
+    return low, high, np.minimum(p_value, 1.0)
+
+
+def _bootstrap_means(values, n_resamples, rng):
+    n = len(values)
+    batch = max(BOOTSTRAP_BATCH_CELLS // max(n, 1), 1)
+    means = []
+    for start in range(0, n_resamples, batch):
+        size = min(batch, n_resamples - start)
+        # Число повторов каждой строки в ресэмпле: индексы строк ресэмплов -> bincount
+        picks = rng.integers(0, n, (size, n)) + np.arange(size)[:, None] * n
+        weights = np.bincount(picks.ravel(), minlength=size * n).reshape(size, n)
+        means.append(weights @ values / n)
+    return np.vstack(means)
+
+
+# CUPED: y - theta * (x - mean(x)), theta = cov(x, y) / var(x) по обеим группам вместе.
+# values и covariates — матрицы n × k (ковариата своя у каждой метрики)
+def cuped(values, covariates):
+    centered = covariates - covariates.mean(axis=0)
+    var = (centered ** 2).mean(axis=0)
+    cov = (centered * (values - values.mean(axis=0))).mean(axis=0)
+    theta = np.divide(cov, var, out=np.zeros_like(cov), where=var > 0)
+    return values - theta * centered
+
+
+def holm(p_values):
+    p_values = np.asarray(p_values, dtype=float)
+    order = np.argsort(p_values)
+    m = len(p_values)
+    adjusted = np.maximum.accumulate(p_values[order] * (m - np.arange(m)))
+    result = np.empty(m)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+
+def benjamini_hochberg(p_values):
+    p_values = np.asarray(p_values, dtype=float)
+    order = np.argsort(p_values)[::-1]
+    m = len(p_values)
+    adjusted = np.minimum.accumulate(p_values[order] * m / np.arange(m, 0, -1))
+    result = np.empty(m)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+
+CORRECTIONS = {"holm": holm, "bh": benjamini_hochberg}
+
+GRID_COLUMNS = [
+    "segment", "value", "metric", "n_test", "n_control", "mean_test", "mean_control", "uplift",
+    "t_stat", "p_value", "ci_low", "ci_high", "p_bootstrap", "p_adjusted", "significant",
+]
+
+
+def _segment_rows(users, segments):
+    yield "all", "all", users
+    for column in segments:
+        for value, rows in users.groupby(column, observed=True, sort=True):
+            yield column, value, rows
+
+
+# Сетка сегмент × метрика. users — по строке на пользователя: колонка групп,
+# метрики, сегменты; covariates — {метрика: колонка значения до кампании} для CUPED.
+# correction — "holm", "bh" или None; поправляется p-value t-теста (колонка p_value),
+# p_adjusted и significant — по всей сетке сразу
+def ab_grid(users, metrics, group_column="group", segments=(), covariates=None,
+            test="test", control="control", n_resamples=2000, alpha=0.05, correction="holm", seed=None):
+    rng = np.random.default_rng(seed)
+    covariates = covariates or {}
+    metrics = list(metrics)
+    rows = []
+    for segment, value, segment_users in _segment_rows(users, segments):
+        values = segment_users[metrics].to_numpy(dtype=float)
+        if covariates:
+            pre = np.column_stack([
+                segment_users[covariates[metric]].to_numpy(dtype=float) if metric in covariates
+                else np.zeros(len(segment_users))
+                for metric in metrics
+            ])
+            values = cuped(values, pre)
+        is_test = (segment_users[group_column] == test).to_numpy()
+        is_control = (segment_users[group_column] == control).to_numpy()
+        if is_test.sum() < 2 or is_control.sum() < 2:
+            continue
+
+        mean_test, mean_control, t_stat, p_value = welch_ttest(values[is_test], values[is_control])
+        ci_low, ci_high, p_boot = bootstrap_diff(values[is_test], values[is_control], n_resamples, alpha, rng)
+        rows.append(pd.DataFrame({
+            "segment": segment,
+            "value": value,
+            "metric": metrics,
+            "n_test": is_test.sum(),
+            "n_control": is_control.sum(),
+            "mean_test": mean_test,
+            "mean_control": mean_control,
+            "uplift": mean_test - mean_control,
+            "t_stat": t_stat,
+            "p_value": p_value,
+            "ci_low": ci_low,
+            "ci_high": ci_high,
+            "p_bootstrap": p_boot,
+        }))
+
+    # Ни в одном сегменте нет хотя бы двух пользователей в каждой группе
+    if not rows:
+        return pd.DataFrame(columns=GRID_COLUMNS)
+    grid = pd.concat(rows, ignore_index=True)
+    p_values = grid["p_value"].fillna(1.0).to_numpy()
+    grid["p_adjusted"] = CORRECTIONS[correction](p_values) if correction else p_values
+    grid["significant"] = grid["p_adjusted"] < alpha
+    return grid
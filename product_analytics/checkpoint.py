@@ -0,0 +1,82 @@
+# Чекпоинт инкрементальной генерации: метаданные (seed, shard_size, формат,
+# сгенерированный период, номер инкремента) в JSON и состояние пользователей
+# таблицей рядом с данными. Поток RNG инкремента задаётся (seed, stream, шард, epoch),
+# поэтому дозапись нового периода воспроизводима и не трогает уже записанные строки.
+#
+# Дозапись фиксируется вместе с чекпоинтом: в метаданных лежит размер данных на
+# момент сохранения (data_size, у CSV), а файлы датасета инкремента называются по
+# его epoch. Прерванная дозапись оставляет старый чекпоинт, и rollback_append перед
+# повтором обрезает CSV до data_size или удаляет файлы этого epoch — строки не
+# дублируются. Пути данных (*_path) хранятся относительно файла чекпоинта
+
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from product_analytics.schema import read_table
+from product_analytics.streaming import write_table
+
+_DATE_FIELDS = ("start_date", "end_date")
+_PATH_SUFFIX = "_path"
+
+
+def checkpoint_paths(prefix, output_format="csv"):
+    return Path(f"{prefix}_checkpoint.json"), Path(f"{prefix}_state.{output_format}")
+
+
+def has_checkpoint(prefix):
+    meta_path, _ = checkpoint_paths(prefix)
+    return meta_path.exists()
+
+
+# Сохраняет метаданные и состояние; JSON пишется последним, поэтому
+# прерванное сохранение не оставляет метаданные без состояния
+def save_checkpoint(prefix, meta, state):
+    meta_path, state_path = checkpoint_paths(prefix, meta["output_format"])
+    write_table(state, state_path)
+
+    meta = {key: value.isoformat() if key in _DATE_FIELDS else value for key, value in meta.items()}
+    for key in meta:
+        if key.endswith(_PATH_SUFFIX):
+            meta[key] = os.path.relpath(Path(meta[key]).resolve(), meta_path.resolve().parent)
+    tmp_path = meta_path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    tmp_path.replace(meta_path)
+
+
+# Метаданные (даты — datetime) и состояние пользователей в схеме state_schema
+def load_checkpoint(prefix, state_schema):
+    meta_path, _ = checkpoint_paths(prefix)
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    for key in _DATE_FIELDS:
+        meta[key] = datetime.fromisoformat(meta[key])
+    for key in meta:
+        if key.endswith(_PATH_SUFFIX):
+            meta[key] = str(meta_path.parent / meta[key])
+
+    _, state_path = checkpoint_paths(prefix, meta["output_format"])
+    return meta, read_table(state_path, state_schema)
+
+
+# Размер данных для метаданных: байты файла (CSV); у каталога-датасета — None
+def data_size(path):
+    path = Path(path)
+    return path.stat().st_size if path.is_file() else None
+
+
+# Начало имён файлов датасета, дописанных инкрементом epoch
+def append_prefix(epoch):
+    return f"append-{epoch:05d}"
+
+
+# Откат недописанного инкремента epoch перед повтором: CSV обрезается до size,
+# из датасета удаляются файлы с префиксом append_prefix(epoch)
+def rollback_append(path, size, epoch):
+    path = Path(path)
+    if path.is_dir():
+        for file in path.rglob(f"{append_prefix(epoch)}-*.parquet"):
+            file.unlink()
+    elif size is not None and path.is_file() and path.stat().st_size > size:
+        with open(path, "r+b") as file:
+            file.truncate(size)
@@ -0,0 +1,170 @@
+# Когортные матрицы когорта × возраст (в днях / неделях / месяцах) за один проход.
+# Пользователи и периоды кодируются целыми числами, ячейка — cohort * n_ages + age,
+# все матрицы считаются np.bincount по ячейкам, без groupby по каждой когорте.
+# Ячейки, которые ещё не наступили к концу данных (или к as_of), — NaN.
+#
+# activity_cohorts — по логу активности: когорта — период первого события,
+#   users / retention — активные пользователи когорты на возрасте age, revenue —
+#   сумма values (например, purchase_price).
+# subscription_cohorts — по покупкам с subscription_end: когорта — период первой
+#   покупки, subscribers — пользователи с действующей подпиской в периоде,
+#   churned — ушедшие (последняя подписка кончилась не позже as_of) по возрасту ухода
+
+import numpy as np
+import pandas as pd
+
+# Период: день, неделя (с понедельника) или месяц
+FREQS = ("D", "W", "M")
+# 1970-01-01 — четверг, недели считаются от понедельника 1969-12-29
+_WEEK_SHIFT = 3
+
+
+def period_codes(times, freq="M"):
+    times = np.asarray(times, dtype="datetime64[ns]")
+    if freq == "M":
+        return times.astype("datetime64[M]").astype(np.int64)
+    days = times.astype("datetime64[D]").astype(np.int64)
+    if freq == "W":
+        return (days + _WEEK_SHIFT) // 7
+    if freq == "D":
+        return days
+    raise ValueError(f"Период — один из {FREQS}")
+
+
+def period_starts(codes, freq="M"):
+    codes = np.asarray(codes, dtype=np.int64)
+    if freq == "M":
+        return pd.DatetimeIndex(codes.astype("datetime64[M]"))
+    days = codes * 7 - _WEEK_SHIFT if freq == "W" else codes
+    return pd.DatetimeIndex(days.astype("datetime64[D]"))
+
+
+class _Grid:
+    def __init__(self, first_periods, last_period, freq):
+        self.freq = freq
+        self.first = first_periods
+        self.origin = first_periods.min()
+        self.n_cohorts = int(first_periods.max() - self.origin + 1)
+        self.n_ages = int(last_period - self.origin + 1)
+        self.last_period = last_period
+
+    def cells(self, cohort_periods, ages):
+        return (cohort_periods - self.origin) * self.n_ages + ages
+
+    def matrix(self, cells, weights=None):
+        counts = np.bincount(cells, weights=weights, minlength=self.n_cohorts * self.n_ages)
+        return counts.reshape(self.n_cohorts, self.n_ages).astype(float)
+
+    # Ячейки после последнего периода данных — NaN
+    def frame(self, matrix):
+        cohorts = np.arange(self.n_cohorts)
+        ages = np.arange(self.n_ages)
+        matrix = np.where(cohorts[:, None] + ages[None, :] + self.origin > self.last_period, np.nan, matrix)
+        return pd.DataFrame(
+            matrix,
+            index=pd.Index(period_starts(cohorts + self.origin, self.freq), name="cohort"),
+            columns=pd.Index(ages, name="age"),
+        )
+
+
+# Доля от размера когорты; у когорт без пользователей (пропущенные периоды) — NaN
+def _share(matrix, size):
+    return np.divide(matrix, size[:, None], out=np.full(matrix.shape, np.nan), where=size[:, None] > 0)
+
+
+# Пустые матрицы names (и size), если во входе нет строк
+def _empty_cohorts(names):
+    index = pd.DatetimeIndex([], name="cohort")
+    result = {"size": pd.Series([], index=index, name="size", dtype=float)}
+    for name in names:
+        result[name] = pd.DataFrame(index=index, columns=pd.Index([], dtype=np.int64, name="age"), dtype=float)
+    return result
+
+
+def _first_periods(user_codes, periods, n_users):
+    first = np.full(n_users, np.iinfo(np.int64).max)
+    np.minimum.at(first, user_codes, periods)
+    return first
+
+
+# Матрицы по логу активности (или покупкам): user_ids, times и опционально values
+def activity_cohorts(user_ids, times, freq="M", values=None):
+    user_codes, users = pd.factorize(np.asarray(user_ids))
+    if not len(user_codes):
+        return _empty_cohorts(["users", "retention", "events"] + (["revenue"] if values is not None else []))
+    periods = period_codes(times, freq)
+    grid = _Grid(_first_periods(user_codes, periods, len(users)), periods.max(), freq)
+
+    cohort_periods = grid.first[user_codes]
+    ages = periods - cohort_periods
+    # Уникальные пары (пользователь, возраст) — активные пользователи ячейки
+    pairs = np.unique(user_codes.astype(np.int64) * grid.n_ages + ages)
+    active_users = pairs // grid.n_ages
+    users_matrix = grid.matrix(grid.cells(grid.first[active_users], pairs % grid.n_ages))
+
+    size = users_matrix[:, 0]
+    users_frame = grid.frame(users_matrix)
+    result = {
+        "size": pd.Series(size, index=users_frame.index, name="size"),
+        "users": users_frame,
+        "retention": grid.frame(_share(users_matrix, size)),
+        "events": grid.frame(grid.matrix(grid.cells(cohort_periods, ages))),
+    }
+    if values is not None:
+        cells = grid.cells(cohort_periods, ages)
+        result["revenue"] = grid.frame(grid.matrix(cells, np.asarray(values, dtype=float)))
+    return result
+
+
+# Матрицы по подпискам: purchases — user_id, timestamp, subscription_end и
+# value_column (выручка по периоду покупки). as_of — дата среза: подписки позже
+# не учитываются, отток — последняя подписка закончилась не позже as_of
+def subscription_cohorts(purchases, freq="M", as_of=None, value_column="purchase_price"):
+    as_of = pd.Timestamp(as_of) if as_of is not None else purchases["timestamp"].max()
+    purchases = purchases[purchases["timestamp"] <= as_of]
+    purchases = purchases.sort_values(["user_id", "timestamp"], kind="stable")
+    if purchases.empty:
+        names = ["subscribers", "retention", "churned", "churn_rate"]
+        return _empty_cohorts(names + (["revenue"] if value_column in purchases else []))
+
+    user_codes, users = pd.factorize(purchases["user_id"].to_numpy())
+    bought = period_codes(purchases["timestamp"], freq)
+    grid = _Grid(_first_periods(user_codes, bought, len(users)), period_codes([as_of], freq)[0], freq)
+    cohort_periods = grid.first[user_codes]
+
+    # Периоды, покрытые подпиской: [период покупки, период последнего мгновения подписки];
+    # у пересекающихся подписок пользователя повторно покрытые периоды отрезаются
+    ends = purchases["subscription_end"].to_numpy(dtype="datetime64[ns]")
+    covered_to = np.minimum(period_codes(ends - np.timedelta64(1, "ns"), freq), grid.last_period)
+    running = pd.Series(covered_to).groupby(user_codes).cummax().to_numpy()
+    new_user = np.r_[True, user_codes[1:] != user_codes[:-1]]
+    previous = np.where(new_user, np.iinfo(np.int64).min, np.r_[0, running[:-1]])
+    covered_from = np.maximum(bought, previous + 1)
+    covers = covered_from <= covered_to
+
+    # Разностный массив по возрасту: +1 с начала покрытия, -1 после конца
+    opened = grid.matrix(grid.cells(cohort_periods[covers], covered_from[covers] - cohort_periods[covers]))
+    closed_age = covered_to[covers] + 1 - cohort_periods[covers]
+    inside = closed_age < grid.n_ages
+    closed = grid.matrix(grid.cells(cohort_periods[covers][inside], closed_age[inside]))
+    subscribers = np.cumsum(opened - closed, axis=1)
+
+    # Отток: конец последней подписки пользователя не позже as_of
+    final_end = pd.Series(ends).groupby(user_codes).max().to_numpy()
+    churned_users = final_end <= np.datetime64(as_of, "ns")
+    churn_ages = period_codes(final_end[churned_users], freq) - grid.first[churned_users]
+    churned = grid.matrix(grid.cells(grid.first[churned_users], churn_ages))
+
+    size = np.bincount(grid.first - grid.origin, minlength=grid.n_cohorts).astype(float)
+    index = grid.frame(subscribers).index
+    result = {
+        "size": pd.Series(size, index=index, name="size"),
+        "subscribers": grid.frame(subscribers),
+        "retention": grid.frame(_share(subscribers, size)),
+        "churned": grid.frame(churned),
+        "churn_rate": grid.frame(_share(np.cumsum(churned, axis=1), size)),
+    }
+    if value_column in purchases:
+        cells = grid.cells(cohort_periods, bought - cohort_periods)
+        result["revenue"] = grid.frame(grid.matrix(cells, purchases[value_column].to_numpy(dtype=float)))
+    return result
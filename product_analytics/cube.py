@@ -0,0 +1,73 @@
+# Агрегатный куб логов, собираемый по ходу генерации: число событий и уникальных
+# пользователей по наборам измерений (grouping sets). Чанки генераторов не
+# пересекаются по пользователям, поэтому уникальные пользователи ячейки — точная
+# сумма по чанкам. Между разными наборами измерений уникальные не складываются,
+# поэтому сводные срезы (DAU, WAU, MAU, по событию, по сегменту) — свои наборы.
+# Колонка grouping — имена измерений набора через запятую, остальные измерения пустые
+
+import pandas as pd
+
+# Периоды, которые считаются из timestamp: день, неделя (понедельник), месяц
+TIME_GRAINS = ("day", "week", "month")
+
+# Сколько строк частичных агрегатов копить до промежуточного схлопывания
+COMPACT_ROWS = 1_000_000
+
+
+def _with_time_grains(frame, time_column, grains):
+    ts = frame[time_column]
+    periods = {
+        "day": lambda: ts.dt.floor("D"),
+        "week": lambda: ts.dt.to_period("W").dt.start_time,
+        "month": lambda: ts.dt.to_period("M").dt.start_time,
+    }
+    return frame.assign(**{grain: periods[grain]() for grain in grains})
+
+
+class CubeBuilder:
+    def __init__(self, grouping_sets, user_column="user_id", time_column="timestamp"):
+        self.grouping_sets = [tuple(dims) for dims in grouping_sets]
+        self.user_column = user_column
+        self.time_column = time_column
+        self.dimensions = list(dict.fromkeys(dim for dims in self.grouping_sets for dim in dims))
+        self._grains = [grain for grain in TIME_GRAINS if grain in self.dimensions]
+        self._parts = []
+        self._part_rows = 0
+
+    # frame — строки логов чанка: user_id, timestamp и остальные измерения
+    def add(self, frame):
+        frame = _with_time_grains(frame, self.time_column, self._grains)
+        for dims in self.grouping_sets:
+            part = frame.groupby(list(dims), observed=True, sort=False).agg(
+                events=(self.user_column, "size"),
+                users=(self.user_column, "nunique"),
+            ).reset_index()
+            part.insert(0, "grouping", ",".join(dims))
+            self._parts.append(part)
+            self._part_rows += len(part)
+        if self._part_rows > COMPACT_ROWS:
+            self._parts = [self.result()]
+            self._part_rows = len(self._parts[0])
+
+    def result(self):
+        columns = ["grouping"] + self.dimensions
+        if not self._parts:
+            return pd.DataFrame(columns=columns + ["events", "users"])
+        cube = pd.concat(self._parts, ignore_index=True)
+        cube = cube.groupby(columns, dropna=False, observed=True, sort=False)[["events", "users"]].sum()
+        return cube.reset_index().sort_values(columns, ignore_index=True)
+
+
+# Поток чанков без изменений; по дороге каждый чанк добавляется в куб (или другой
+# накопитель с add(frame), например hll.DistinctSketches).
+# frame_func переводит чанк генератора в строки с измерениями куба
+def cube_chunks(chunks, cube, frame_func):
+    for chunk in chunks:
+        cube.add(frame_func(chunk))
+        yield chunk
+
+
+# Срез куба по набору измерений: cube_slice(cube, "day") — DAU, cube_slice(cube, "week", "event_type") — WAU по событию
+def cube_slice(cube, *dims):
+    rows = cube[cube["grouping"] == ",".join(dims)]
+    return rows[list(dims) + ["events", "users"]].reset_index(drop=True)
@@ -0,0 +1,189 @@
+# Бинарное хранилище событий: каталог <таблица>.events/ с
+#   events.bin   — структурированный массив NumPy, строки отсортированы по (user_id, timestamp);
+#   offsets.npy  — CSR-индекс: события пользователя u — строки offsets[u]:offsets[u + 1];
+#   meta.json    — dtype записей, категории и число строк.
+# Файлы открываются через memmap: история пользователя — срез без копирования за O(1),
+# первые / последние события и число событий на пользователя — по offsets, без
+# groupby по всей таблице; полные проходы идут блоками, не загружая файл в память.
+# Категориальные колонки хранятся кодами, время — datetime64[s], поэтому нужна
+# компактная схема генераторов (строковые session_id не поддерживаются)
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+DATA_FILE = "events.bin"
+OFFSETS_FILE = "offsets.npy"
+META_FILE = "meta.json"
+SCAN_ROWS = 1_000_000
+
+
+def _field(column, series):
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return column, np.min_scalar_type(-len(dtype.categories))
+    if np.issubdtype(dtype, np.datetime64):
+        return column, np.dtype("datetime64[s]")
+    if np.issubdtype(dtype, np.number) or np.issubdtype(dtype, np.bool_):
+        return column, dtype
+    raise ValueError(f"Колонка {column} ({dtype}) не хранится в event store: нужна компактная схема")
+
+
+# Писатель чанков в хранилище. Чанки генераторов не пересекаются по пользователям и
+# идут по возрастанию user_id, поэтому достаточно сортировать каждый чанк; если
+# порядок нарушен, таблица досортировывается при закрытии (тогда — в памяти)
+class EventStoreWriter:
+    def __init__(self, path, user_column="user_id", time_column="timestamp"):
+        self.path = path
+        self.user_column = user_column
+        self.time_column = time_column
+        self.rows = 0
+        self.head = None
+        self._dtype = None
+        self._categories = {}
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._max_user = -1
+        self._sorted = True
+        self._file = None
+
+    def __enter__(self):
+        if os.path.exists(self.path):
+            shutil.rmtree(self.path)
+        os.makedirs(self.path)
+        self._file = open(os.path.join(self.path, DATA_FILE), "wb")
+        return self
+
+    def write(self, chunk):
+        if self._dtype is None:
+            self._dtype = np.dtype([_field(column, chunk[column]) for column in chunk.columns])
+            self._categories = {
+                column: list(chunk[column].cat.categories) for column in chunk.columns
+                if isinstance(chunk[column].dtype, pd.CategoricalDtype)
+            }
+            self.head = chunk.head()
+        if not len(chunk):
+            return
+
+        users = chunk[self.user_column].to_numpy(dtype=np.int64)
+        order = np.lexsort((chunk[self.time_column].to_numpy(), users))
+        records = np.empty(len(chunk), dtype=self._dtype)
+        for column in self._dtype.names:
+            values = chunk[column]
+            if column in self._categories:
+                values = pd.Categorical(values, categories=self._categories[column]).codes
+            records[column] = np.asarray(values)[order]
+        records.tofile(self._file)
+
+        if users.min() <= self._max_user:
+            self._sorted = False
+        self._max_user = max(self._max_user, users.max())
+        counts = np.bincount(users)
+        if len(counts) > len(self._counts):
+            self._counts = np.pad(self._counts, (0, len(counts) - len(self._counts)))
+        self._counts[:len(counts)] += counts
+        self.rows += len(chunk)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is not None:
+            return
+        if self._dtype is None:
+            raise ValueError(f"Пустой event store: {self.path}")
+        if not self._sorted and self.rows:
+            data = np.memmap(os.path.join(self.path, DATA_FILE), dtype=self._dtype, mode="r+", shape=(self.rows,))
+            data[:] = data[np.lexsort((data[self.time_column], data[self.user_column]))]
+            data.flush()
+            del data
+
+        np.save(os.path.join(self.path, OFFSETS_FILE), np.concatenate([[0], np.cumsum(self._counts)]))
+        meta = {
+            "rows": self.rows,
+            "dtype": np.lib.format.dtype_to_descr(self._dtype),
+            "categories": self._categories,
+            "user_column": self.user_column,
+            "time_column": self.time_column,
+        }
+        with open(os.path.join(self.path, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+
+def write_event_store(df, path, user_column="user_id", time_column="timestamp"):
+    with EventStoreWriter(path, user_column, time_column) as writer:
+        writer.write(df)
+
+
+class EventStore:
+    def __init__(self, path):
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.path = path
+        self.categories = meta["categories"]
+        self.user_column = meta["user_column"]
+        self.time_column = meta["time_column"]
+        dtype = np.lib.format.descr_to_dtype([tuple(field) for field in meta["dtype"]])
+        self.data = np.memmap(os.path.join(path, DATA_FILE), dtype=dtype, mode="r", shape=(meta["rows"],))
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def columns(self):
+        return list(self.data.dtype.names)
+
+    # Число событий по user_id (индекс — все id от 0 до максимального)
+    def counts(self):
+        return np.diff(self.offsets)
+
+    def user_ids(self):
+        return np.flatnonzero(self.counts())
+
+    # События пользователя — срез memmap без копирования
+    def user(self, user_id):
+        if user_id + 1 >= len(self.offsets):
+            return self.data[:0]
+        return self.data[self.offsets[user_id]:self.offsets[user_id + 1]]
+
+    # Колонка целиком как memmap-вид (категории — кодами)
+    def column(self, name):
+        return self.data[name]
+
+    # Первое / последнее значение колонки у каждого пользователя (по умолчанию — время):
+    # Series по user_id, одно чтение на пользователя вместо groupby по всей таблице
+    def first(self, column=None):
+        users = self.user_ids()
+        values = self.data[column or self.time_column][self.offsets[users]]
+        return pd.Series(values, index=pd.Index(users, name=self.user_column))
+
+    def last(self, column=None):
+        users = self.user_ids()
+        values = self.data[column or self.time_column][self.offsets[users + 1] - 1]
+        return pd.Series(values, index=pd.Index(users, name=self.user_column))
+
+    # Строки records в DataFrame: коды категорий снова становятся category
+    def frame(self, records, columns=None):
+        columns = columns or self.columns
+        df = pd.DataFrame({column: np.asarray(records[column]) for column in columns})
+        for column in columns:
+            if column in self.categories:
+                df[column] = pd.Categorical.from_codes(df[column], categories=self.categories[column])
+        return df
+
+    def user_frame(self, user_id, columns=None):
+        return self.frame(self.user(user_id), columns)
+
+    def to_frame(self, columns=None, start=0, stop=None):
+        return self.frame(self.data[start:stop], columns)
+
+    # Проход по таблице блоками DataFrame по rows строк, границы блоков — по пользователям
+    def iter_frames(self, rows=SCAN_ROWS, columns=None):
+        bounds = np.asarray(self.offsets)
+        start = 0
+        while start < len(self.data):
+            stop = min(bounds[np.searchsorted(bounds, start + rows)], len(self.data)) if start + rows < len(self.data) \
+                else len(self.data)
+            yield self.frame(self.data[start:stop], columns)
+            start = stop
@@ -0,0 +1,199 @@
+# Внешняя сортировка потока чанков: чанки копятся до run_rows строк, сортируются
+# в памяти и сбрасываются на диск отсортированными прогонами (run), затем прогоны
+# сливаются k-way merge. В памяти — один прогон при записи и по одному блоку
+# (block_rows строк) на прогон при слиянии, а не весь датасет.
+#
+# Слияние векторное: граница — наименьший из последних ключей текущих блоков.
+# Строки с ключом меньше границы уже окончательны во всех блоках; равные границе —
+# в прогонах не дальше первого, на котором она достигается (равные ключи идут
+# в порядке прогонов). Отобранные куски склеиваются и досортировываются (stable),
+# опустевшие блоки подгружаются. Результат совпадает с
+# pd.concat(chunks).sort_values(keys, kind="stable").
+#
+# Прогон — каталог блоков в pickle: pyarrow не нужен, типы (category, datetime64[s])
+# сохраняются как есть. Категориальные ключи сравниваются по кодам (порядку категорий).
+#
+#   for block in external_sort(chunks, ["timestamp"], directory=output_dir):
+#       writer.write(block)
+#
+# Из командной строки — отсортировать готовый CSV / Parquet, не читая его целиком:
+#   python -m product_analytics.external_sort telegram_logs.csv telegram_logs_sorted.csv --by timestamp
+
+import argparse
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from product_analytics.streaming import chunk_writer
+
+RUN_ROWS = 2_000_000
+BLOCK_ROWS = 100_000
+
+# Порядки таблиц логов: глобально по времени или по пользователю и времени
+SORT_KEYS = {
+    "timestamp": ["timestamp"],
+    "user": ["user_id", "timestamp"],
+}
+
+
+def _key_values(frame, key):
+    column = frame[key]
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy()
+    return column.to_numpy()
+
+
+# Длина префикса отсортированного frame с ключами < bound (или <= bound при inclusive)
+def _prefix_rows(frame, keys, bound, inclusive):
+    less = np.zeros(len(frame), dtype=bool)
+    equal = np.ones(len(frame), dtype=bool)
+    for key, value in zip(keys, bound):
+        values = _key_values(frame, key)
+        less |= equal & (values < value)
+        equal &= values == value
+    return int(np.count_nonzero(less | equal if inclusive else less))
+
+
+def _last_key(frame, keys):
+    return tuple(_key_values(frame, key)[-1] for key in keys)
+
+
+class ExternalSorter:
+    def __init__(self, keys, directory=None, run_rows=RUN_ROWS, block_rows=BLOCK_ROWS):
+        self.keys = list(keys)
+        self.directory = directory
+        self.run_rows = run_rows
+        self.block_rows = block_rows
+        self.rows = 0
+        self._runs = []
+        self._pending = []
+        self._pending_rows = 0
+        self._tmp = None
+
+    def __enter__(self):
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self._tmp = tempfile.mkdtemp(prefix=".sort-runs-", dir=self.directory or None)
+        return self
+
+    def add(self, chunk):
+        if not len(chunk):
+            return
+        self._pending.append(chunk)
+        self._pending_rows += len(chunk)
+        self.rows += len(chunk)
+        if self._pending_rows >= self.run_rows:
+            self._spill()
+
+    def _sorted_pending(self):
+        run = pd.concat(self._pending, ignore_index=True) if len(self._pending) > 1 else self._pending[0]
+        self._pending, self._pending_rows = [], 0
+        return run.sort_values(self.keys, kind="stable", ignore_index=True)
+
+    def _spill(self):
+        run = self._sorted_pending()
+        run_dir = os.path.join(self._tmp, f"run-{len(self._runs):05d}")
+        os.makedirs(run_dir)
+        paths = []
+        for start in range(0, len(run), self.block_rows):
+            path = os.path.join(run_dir, f"block-{len(paths):05d}.pkl")
+            run.iloc[start:start + self.block_rows].to_pickle(path)
+            paths.append(path)
+        self._runs.append(paths)
+
+    # Отсортированный поток блоков. Всё поместилось в один прогон — он отдаётся из памяти
+    def merge(self):
+        if not self._runs:
+            if self._pending:
+                run = self._sorted_pending()
+                for start in range(0, len(run), self.block_rows):
+                    yield run.iloc[start:start + self.block_rows]
+            return
+        if self._pending:
+            self._spill()
+        yield from self._merge_runs()
+
+    def _merge_runs(self):
+        readers = [iter(paths) for paths in self._runs]
+        blocks = [pd.read_pickle(next(reader)) for reader in readers]
+        out, out_rows = [], 0
+        while any(block is not None for block in blocks):
+            lasts = [_last_key(block, self.keys) if block is not None else None for block in blocks]
+            bound = min(last for last in lasts if last is not None)
+            first = lasts.index(bound)
+
+            parts = []
+            for i, block in enumerate(blocks):
+                if block is None:
+                    continue
+                n = len(block) if i == first else _prefix_rows(block, self.keys, bound, inclusive=i < first)
+                if n:
+                    parts.append(block.iloc[:n])
+                    block = block.iloc[n:]
+                if not len(block):
+                    path = next(readers[i], None)
+                    block = pd.read_pickle(path) if path is not None else None
+                blocks[i] = block
+
+            out.append(pd.concat(parts).sort_values(self.keys, kind="stable"))
+            out_rows += len(out[-1])
+            if out_rows >= self.block_rows:
+                yield pd.concat(out, ignore_index=True)
+                out, out_rows = [], 0
+        if out:
+            yield pd.concat(out, ignore_index=True)
+
+    def __exit__(self, exc_type, exc, tb):
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+
+# Поток чанков -> тот же поток, отсортированный по keys блоками до block_rows строк.
+# Прогоны лежат во временном каталоге внутри directory и удаляются после слияния
+def external_sort(chunks, keys, directory=None, run_rows=RUN_ROWS, block_rows=BLOCK_ROWS):
+    with ExternalSorter(keys, directory, run_rows, block_rows) as sorter:
+        for chunk in chunks:
+            sorter.add(chunk)
+        yield from sorter.merge()
+
+
+# Чанки готовой таблицы: CSV — pd.read_csv(chunksize), Parquet — по батчам pyarrow.
+# Время в CSV остаётся строкой: формат YYYY-MM-DD HH:MM:SS сортируется как время
+def read_chunks(path, rows=BLOCK_ROWS):
+    if str(path).endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=rows):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=rows)
+
+
+def sort_table(source, target, keys, run_rows=RUN_ROWS, block_rows=BLOCK_ROWS):
+    directory = os.path.dirname(os.path.abspath(target))
+    with chunk_writer(target) as writer:
+        for block in external_sort(read_chunks(source, block_rows), keys, directory, run_rows, block_rows):
+            writer.write(block)
+    return writer.rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Внешняя сортировка таблицы логов")
+    parser.add_argument("source", help="CSV или Parquet")
+    parser.add_argument("target", help="куда записать отсортированную таблицу (.csv / .parquet)")
+    parser.add_argument("--by", choices=sorted(SORT_KEYS), default="timestamp", help="порядок строк")
+    parser.add_argument("--run-rows", type=int, default=RUN_ROWS, help="строк в прогоне (память при записи)")
+    parser.add_argument("--block-rows", type=int, default=BLOCK_ROWS, help="строк в блоке прогона")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rows = sort_table(args.source, args.target, SORT_KEYS[args.by], args.run_rows, args.block_rows)
+    print(f"Отсортировано строк: {rows} -> {args.target}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+# Упорядоченная воронка по логу событий за один отсортированный проход.
+# Ключ (пользователь или сессия) проходит шаг k, если после события шага k-1
+# цепочки было событие шага k, а от начала цепочки (событие первого шага) прошло
+# не больше window. События с одинаковым временем идут в порядке строк лога.
+#
+# Строки сортируются один раз по (ключ, время, позиция); шаг k считается по
+# строкам шагов k-1 и k: каждой строке шага k достаётся самое позднее начало среди
+# прошедших цепочек шага k-1 перед ней (накопленный максимум по ключу — один
+# maximum.accumulate со сдвигом ключа в старшие разряды). Самое позднее начало —
+# лучшее: у него больше всего запаса до конца окна.
+#
+# FunnelBuilder копит состояние по чанкам (add), как CubeBuilder: для каждого
+# ключа и шага — самое позднее начало прошедшей цепочки и минимальное время до
+# шага. Чанки должны идти по времени (например, по дням партиционированного лога),
+# тогда состояние подставляется в следующий чанк строками-предшественниками.
+#
+#   builder = FunnelBuilder(STEPS, window=pd.Timedelta(days=1))
+#   builder.add(events_df)
+#   keys = builder.result()          # ключ, steps и время до каждого шага
+#   table = funnel_table(keys, STEPS, group_column="group", segments=("city",))
+
+import numpy as np
+import pandas as pd
+
+# Квантили времени до шага в funnel_table
+TIME_QUANTILES = (0.25, 0.5, 0.75, 0.9)
+
+# Нет прошедшей цепочки
+_NONE = np.iinfo(np.int64).min
+
+
+def _seconds(times):
+    return np.asarray(times, dtype="datetime64[ns]").astype("datetime64[s]").astype(np.int64)
+
+
+# Самое позднее начало цепочки шага k для строк шага k: накопленный максимум
+# начал строк-предшественников внутри ключа. Ключи отсортированы, и ключ i сдвинут
+# на i * span, поэтому максимум не переходит из предыдущего ключа
+def _latest_starts(key, start, is_prev):
+    if not is_prev.any():
+        return np.full(len(key), _NONE)
+    low = start[is_prev].min()
+    span = start[is_prev].max() - low + 2
+    segment = np.cumsum(np.r_[True, key[1:] != key[:-1]]) - 1
+    value = np.where(is_prev, start, low - 1) - low + 1 + segment * span
+    latest = np.maximum.accumulate(value) - segment * span
+    return np.where(latest > 0, latest - 1 + low, _NONE)
+
+
+class FunnelBuilder:
+    def __init__(self, steps, window=None, key_column="user_id", event_column="event", time_column="timestamp"):
+        self.steps = list(steps)
+        self.window = None if window is None else int(pd.Timedelta(window).total_seconds())
+        self.key_column = key_column
+        self.event_column = event_column
+        self.time_column = time_column
+        n = len(self.steps)
+        self._keys = pd.Index(np.array([], dtype=np.int64), name=key_column)
+        self._start = np.full((0, n), _NONE)
+        self._time = np.full((0, n), np.nan)
+
+    def _grow(self, keys):
+        new = pd.Index(keys, name=self.key_column).unique().difference(self._keys)
+        if len(new):
+            n = len(self.steps)
+            # Первый чанк заменяет пустой индекс: тип ключей берётся из данных
+            self._keys = self._keys.append(new) if len(self._keys) else new
+            self._start = np.vstack([self._start, np.full((len(new), n), _NONE)])
+            self._time = np.vstack([self._time, np.full((len(new), n), np.nan)])
+
+    # frame — строки лога чанка: ключ, событие, время. Чанки — по возрастанию времени
+    def add(self, frame):
+        step = pd.Categorical(frame[self.event_column], categories=self.steps).codes.astype(np.int64)
+        rows = step >= 0
+        if not rows.any():
+            return
+        keys = frame[self.key_column].to_numpy()[rows]
+        self._grow(keys)
+        key = self._keys.get_indexer(keys).astype(np.int64)
+        step = step[rows]
+        time = _seconds(frame[self.time_column].to_numpy()[rows])
+
+        # Прошедшие цепочки из прошлых чанков — строки-предшественники перед строками чанка
+        chunk_keys = np.unique(key)
+        carried_key, carried_step = np.nonzero(self._start[chunk_keys] != _NONE)
+        carried_key = chunk_keys[carried_key]
+        carried_start = self._start[carried_key, carried_step]
+        n_real = len(key)
+
+        key = np.concatenate([key, carried_key])
+        step = np.concatenate([step, carried_step])
+        time = np.concatenate([time, carried_start])
+        real = np.arange(len(key)) < n_real
+        order = np.lexsort((np.arange(len(key)), time, real, key))
+        key, step, time, real = key[order], step[order], time[order], real[order]
+
+        start = np.where(real, np.where(step == 0, time, _NONE), time)
+        passed = ~real | (step == 0)
+        for k in range(1, len(self.steps)):
+            at_step = real & (step == k)
+            latest = _latest_starts(key, start, passed & (step == k - 1))[at_step]
+            ok = latest != _NONE
+            if self.window is not None:
+                ok &= time[at_step] - np.where(ok, latest, time[at_step]) <= self.window
+            start[at_step] = np.where(ok, latest, _NONE)
+            passed[at_step] = ok
+
+        done = passed & real
+        np.maximum.at(self._start, (key[done], step[done]), start[done])
+        np.fmin.at(self._time, (key[done], step[done]), (time[done] - start[done]).astype(float))
+
+    # По строке на ключ: steps — число пройденных шагов, <шаг>_time — минимальное
+    # время от начала цепочки до шага (NaT, если шаг не пройден)
+    def result(self):
+        result = pd.DataFrame({self.key_column: self._keys.to_numpy()})
+        result["steps"] = (self._start != _NONE).sum(axis=1)
+        for k, name in enumerate(self.steps):
+            result[f"{name}_time"] = pd.to_timedelta(self._time[:, k], unit="s")
+        return result.sort_values(self.key_column, ignore_index=True)
+
+
+def ordered_funnel(events_df, steps, window=None, key_column="user_id", **kwargs):
+    builder = FunnelBuilder(steps, window, key_column, **kwargs)
+    builder.add(events_df)
+    return builder.result()
+
+
+def _segment_rows(keys, segments):
+    yield "all", "all", keys
+    for column in segments:
+        for value, rows in keys.groupby(column, observed=True, sort=True):
+            yield column, value, rows
+
+
+# Таблица воронки: сегмент × группа × шаг. keys — результат FunnelBuilder.result()
+# (можно с колонками группы и сегментов). count — ключи, прошедшие шаг,
+# conversion — от предыдущего шага, total_conversion — от первого, time_p* —
+# квантили времени от начала цепочки до шага
+def funnel_table(keys, steps, group_column=None, segments=(), quantiles=TIME_QUANTILES):
+    steps = list(steps)
+    step_number = np.arange(len(steps))
+    groups = [group_column] if group_column else []
+    rows = []
+    for segment, value, segment_keys in _segment_rows(keys, segments):
+        for group, group_keys in (segment_keys.groupby(groups, observed=True, sort=True) if groups
+                                  else [((None,), segment_keys)]):
+            reached = (group_keys["steps"].to_numpy()[:, None] > step_number).sum(axis=0)
+            previous = np.r_[len(group_keys), reached[:-1]]
+            times = group_keys[[f"{step}_time" for step in steps]]
+            part = pd.DataFrame({
+                "segment": segment,
+                "value": value,
+                "step": steps,
+                "count": reached,
+                "conversion": reached / np.maximum(previous, 1),
+                "total_conversion": reached / max(reached[0], 1),
+            })
+            for q in quantiles:
+                part[f"time_p{round(q * 100)}"] = times.quantile(q).to_numpy()
+            if groups:
+                part.insert(2, group_column, group[0])
+            rows.append(part)
+    if not rows:
+        columns = ["segment", "value"] + groups + ["step", "count", "conversion", "total_conversion"]
+        return pd.DataFrame(columns=columns + [f"time_p{round(q * 100)}" for q in quantiles])
+    return pd.concat(rows, ignore_index=True)
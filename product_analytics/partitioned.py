@@ -0,0 +1,136 @@
+# Партиционированный Parquet для таблиц логов: каталог <таблица>.parquet/
+# с hive-партициями event_date=YYYY-MM-DD[/event_type=...]/part-*.parquet.
+# Внутри файлов пишутся row group со статистикой min/max, поэтому загрузчик
+# отсекает и каталоги по партициям, и row group по фильтрам на колонки.
+# Нужен pyarrow (импортируется лениво)
+
+import operator
+import shutil
+from datetime import datetime
+from functools import reduce
+from pathlib import Path
+
+import pandas as pd
+
+from product_analytics.schema import apply_schema
+
+DATE_PARTITION = "event_date"
+ROWS_PER_GROUP = 256 * 1024
+FLUSH_ROWS = 2_000_000
+MAX_PARTITIONS = 100_000
+
+
+# Писатель чанков в партиционированный датасет. event_date считается из колонки
+# timestamp; остальные колонки partition_by должны быть в чанке.
+# Чанки копятся до flush_rows строк и пишутся одним проходом: иначе каждый шард
+# давал бы по файлу на каждую партицию. append=True — новые файлы добавляются
+# к существующему датасету. prefix — начало имён файлов (по умолчанию part или
+# append-<время>): по нему недописанный инкремент можно найти и удалить
+class PartitionedParquetWriter:
+    def __init__(self, path, partition_by=(DATE_PARTITION,), append=False, date_column="timestamp",
+                 flush_rows=FLUSH_ROWS, prefix=None):
+        self.path = path
+        self.partition_by = list(partition_by)
+        self.date_column = date_column
+        self.flush_rows = flush_rows
+        self.rows = 0
+        self.head = None
+        self._append = append
+        self._pending = []
+        self._pending_rows = 0
+        self._flushes = 0
+        self._prefix = prefix or (f"append-{datetime.now():%Y%m%d%H%M%S%f}" if append else "part")
+
+    def __enter__(self):
+        path = Path(self.path)
+        if not self._append and path.exists():
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+        return self
+
+    def write(self, chunk):
+        import pyarrow as pa
+
+        self._pending.append(pa.Table.from_pandas(chunk, preserve_index=False))
+        self._pending_rows += len(chunk)
+        if self.head is None:
+            self.head = chunk.head()
+        self.rows += len(chunk)
+        if self._pending_rows >= self.flush_rows:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        if not self._pending:
+            return
+        table = pa.concat_tables(self._pending, promote_options="permissive")
+        self._pending, self._pending_rows = [], 0
+        if DATE_PARTITION in self.partition_by and DATE_PARTITION not in table.column_names:
+            table = table.append_column(DATE_PARTITION, pc.cast(table[self.date_column], pa.date32()))
+        # Строки одной даты подряд (dictionary-колонки pyarrow сортировать не умеет);
+        # вместе с max_open_files это даёт по файлу на партицию за сброс
+        sort_keys = [
+            (column, "ascending") for column in self.partition_by
+            if not pa.types.is_dictionary(table.schema.field(column).type)
+        ]
+        if sort_keys:
+            table = table.sort_by(sort_keys)
+
+        ds.write_dataset(
+            table, self.path, format="parquet",
+            partitioning=self.partition_by, partitioning_flavor="hive",
+            basename_template=f"{self._prefix}-{self._flushes:05d}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            max_partitions=MAX_PARTITIONS,
+            max_open_files=MAX_PARTITIONS,
+            max_rows_per_group=ROWS_PER_GROUP,
+        )
+        self._flushes += 1
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._flush()
+
+
+# Колонки партиций по первому пути в каталоге: event_date=.../event_type=...
+def partition_fields(path):
+    fields = []
+    level = Path(path)
+    while True:
+        subdirs = sorted(p for p in level.iterdir() if p.is_dir() and "=" in p.name)
+        if not subdirs:
+            return fields
+        fields.append(subdirs[0].name.split("=", 1)[0])
+        level = subdirs[0]
+
+
+def _dataset(path):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    schema = pa.schema([
+        (name, pa.date32() if name == DATE_PARTITION else pa.string()) for name in partition_fields(path)
+    ])
+    return ds.dataset(path, format="parquet", partitioning=ds.partitioning(schema, flavor="hive"))
+
+
+# Чтение только нужных колонок и партиций: start / end — границы event_date
+# (включительно), isin — фильтры column=[значения] (по партициям отсекают каталоги,
+# по обычным колонкам — row group по статистике). schema — компактная схема таблицы
+def read_partitioned(path, columns=None, start=None, end=None, schema=None, **isin):
+    import pyarrow.dataset as ds
+
+    conditions = [ds.field(column).isin(list(values)) for column, values in isin.items()]
+    if start is not None:
+        conditions.append(ds.field(DATE_PARTITION) >= pd.Timestamp(start).date())
+    if end is not None:
+        conditions.append(ds.field(DATE_PARTITION) <= pd.Timestamp(end).date())
+
+    condition = reduce(operator.and_, conditions) if conditions else None
+    df = _dataset(path).to_table(columns=columns, filter=condition).to_pandas()
+    return apply_schema(df, schema) if schema else df
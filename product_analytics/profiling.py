@@ -0,0 +1,116 @@
+# Профилирование этапов генерации: время (wall и CPU, включая завершённые
+# процессы пула), пиковая память, строк в секунду; отчёт — JSON.
+# Выключенный профайлер (enabled=False) сразу возвращается из start/stop,
+# поэтому разметку этапов можно оставлять в скриптах всегда.
+# cprofile=True — каждый этап под cProfile (статистика в <отчёт без .json>.<этап>.prof),
+# tracemalloc=True — пик памяти Python-аллокаций внутри этапа
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+# Пиковый RSS процесса и дождавшихся дочерних процессов, МБ (None, если нет resource)
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+    # ru_maxrss: на Linux — КБ, на macOS — байты
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+# CPU-время процесса вместе с завершёнными дочерними (воркеры ProcessPoolExecutor)
+def _cpu_seconds():
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+
+class StageProfiler:
+    def __init__(self, enabled=False, report_path=None, cprofile=False, tracemalloc=False):
+        self.enabled = enabled
+        self.report_path = report_path
+        self.cprofile = cprofile
+        self.tracemalloc = tracemalloc
+        self.stages = []
+        self._current = None
+        self._started_at = datetime.now()
+        self._wall_start = time.perf_counter()
+
+    def start(self, name):
+        if not self.enabled:
+            return
+        if self._current is not None:
+            self.stop()
+
+        stage = {"name": name}
+        if self.tracemalloc:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        if self.cprofile:
+            import cProfile
+            stage["_profile"] = cProfile.Profile()
+            stage["_profile"].enable()
+
+        stage["_wall"] = time.perf_counter()
+        stage["_cpu"] = _cpu_seconds()
+        self._current = stage
+
+    # rows — сколько строк выдал этап (для rows_per_s)
+    def stop(self, rows=None):
+        if not self.enabled or self._current is None:
+            return
+        stage, self._current = self._current, None
+        wall = time.perf_counter() - stage.pop("_wall")
+        cpu = _cpu_seconds() - stage.pop("_cpu")
+
+        profile = stage.pop("_profile", None)
+        if profile is not None:
+            profile.disable()
+            stage["profile"] = f"{os.path.splitext(self.report_path or 'profile')[0]}.{stage['name']}.prof"
+            profile.dump_stats(stage["profile"])
+
+        stage.update(wall_s=round(wall, 4), cpu_s=round(cpu, 4), peak_rss_mb=peak_rss_mb())
+        if self.tracemalloc:
+            import tracemalloc
+            stage["python_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        if rows is not None:
+            stage["rows"] = int(rows)
+            stage["rows_per_s"] = round(rows / wall, 1) if wall > 0 else None
+        self.stages.append(stage)
+
+    @contextmanager
+    def stage(self, name):
+        self.start(name)
+        try:
+            yield
+        finally:
+            self.stop()
+
+    def report(self):
+        return {
+            "started_at": self._started_at.isoformat(timespec="seconds"),
+            "total_wall_s": round(time.perf_counter() - self._wall_start, 4),
+            "peak_rss_mb": peak_rss_mb(),
+            "stages": self.stages,
+        }
+
+    # Закрывает текущий этап и пишет отчёт в report_path; возвращает отчёт
+    def finish(self, rows=None):
+        if not self.enabled:
+            return None
+        self.stop(rows)
+        report = self.report()
+        if self.report_path:
+            with open(self.report_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        return report
@@ -0,0 +1,363 @@
+# Воспроизведение сгенерированных событий (логи Telegram, события Лавки) потоком
+# NDJSON в порядке времени — для нагрузочного теста приёма событий. Получатель:
+# TCP- или Unix-сокет (сервер: каждый подключившийся клиент получает весь поток)
+# либо stdout.
+#
+# Скорость: speed=1 — реальное время, speed=N — в N раз быстрее, rate — ровно
+# rate событий в секунду; без обоих — так быстро, как принимает получатель.
+# События уходят пачками за тик (TICK секунд расписания, не больше BATCH_ROWS
+# строк), после каждой пачки — await drain(): медленный получатель тормозит
+# воспроизведение, а не раздувает буфер. Отставание — насколько первая строка
+# пачки ушла позже своего времени по расписанию.
+#
+# JSON строится без json.dumps на строку: значения категорий и строк кодируются
+# один раз на уникальное значение, время — по таблицам дат и времени суток
+# (с точностью до секунды), строка — один %-шаблон.
+#
+#   python -m product_analytics.replay telegram_logs.csv --tcp 127.0.0.1:9000 --speed 3600
+#   python -m product_analytics.replay lavka_events_df.parquet --rate 200000 > events.ndjson
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from contextlib import suppress
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+TICK = 0.05
+BATCH_ROWS = 50_000
+BLOCK_ROWS = 1_000_000
+READ_SIZE = 1 << 20
+
+
+@lru_cache(maxsize=None)
+def _time_of_day():
+    seconds = np.arange(86400)
+    return np.array(
+        [f'T{h:02d}:{m:02d}:{s:02d}"' for h, m, s in zip(seconds // 3600, seconds // 60 % 60, seconds % 60)],
+        dtype=object,
+    )
+
+
+def _lookup(codes, literals):
+    # Код -1 (пропуск) попадает на последний элемент — null
+    return np.array(literals + ["null"], dtype=object)[codes].tolist()
+
+
+# Колонка -> (спецификатор шаблона, значения для подстановки)
+def _json_column(series):
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        return "%s", _lookup(series.cat.codes.to_numpy(), [json.dumps(c, default=str) for c in dtype.categories.tolist()])
+    if pd.api.types.is_bool_dtype(dtype):
+        return "%s", np.array(["false", "true"], dtype=object)[series.to_numpy(dtype=int)].tolist()
+    if pd.api.types.is_integer_dtype(dtype) and not series.hasnans:
+        return "%d", series.tolist()
+    if pd.api.types.is_datetime64_dtype(dtype):
+        seconds = series.to_numpy(dtype="datetime64[s]")
+        missing = np.isnat(seconds)
+        seconds = np.where(missing, 0, seconds.astype(np.int64))
+        days, day_codes = np.unique(seconds // 86400, return_inverse=True)
+        dates = np.array(['"' + str(day) for day in days.astype("datetime64[D]")], dtype=object)
+        values = dates[day_codes] + _time_of_day()[seconds % 86400]
+        values[missing] = "null"
+        return "%s", values.tolist()
+    if pd.api.types.is_float_dtype(dtype):
+        values = np.array(series.map(repr, na_action="ignore").tolist(), dtype=object)
+        values[series.isna().to_numpy()] = "null"
+        return "%s", values.tolist()
+    codes, uniques = pd.factorize(series)
+    return "%s", _lookup(codes, [json.dumps(value, default=str) for value in uniques.tolist()])
+
+
+# Кодировщик DataFrame в NDJSON (bytes); шаблон строки собирается по первой таблице
+class NdjsonEncoder:
+    def __init__(self):
+        self.columns = None
+        self._template = None
+
+    def encode(self, df):
+        columns = [_json_column(df[column]) for column in df.columns]
+        if self._template is None or list(df.columns) != self.columns:
+            self.columns = list(df.columns)
+            fields = (json.dumps(str(column)).replace("%", "%%") + ":" + spec
+                      for column, (spec, _) in zip(df.columns, columns))
+            self._template = "{" + ",".join(fields) + "}\n"
+        return "".join(map(self._template.__mod__, zip(*(values for _, values in columns)))).encode()
+
+
+# Блоки событий в порядке времени: DataFrame, файл .csv / .parquet, партиционированный
+# каталог (читается диапазонами event_date — в памяти около block_rows строк) или event store .events
+def iter_sorted_frames(source, time_column="timestamp", columns=None, block_rows=BLOCK_ROWS):
+    if isinstance(source, pd.DataFrame):
+        df = source if columns is None else source[columns]
+        df = df.iloc[np.argsort(df[time_column].to_numpy(), kind="stable")]
+        for start in range(0, len(df), block_rows):
+            yield df.iloc[start:start + block_rows]
+        return
+
+    path = Path(source)
+    if path.suffix == ".events":
+        from product_analytics.event_store import EventStore
+
+        store = EventStore(path)
+        order = np.argsort(store.column(time_column), kind="stable")
+        for start in range(0, len(order), block_rows):
+            yield store.frame(store.data[np.sort(order[start:start + block_rows])], columns).sort_values(
+                time_column, kind="stable")
+        return
+    if path.is_dir():
+        from product_analytics.partitioned import DATE_PARTITION, read_partitioned
+
+        # Дни читаются пачками примерно по block_rows строк (по среднему числу строк
+        # в уже прочитанных днях): чтение по одному дню упирается в накладные расходы
+        days = sorted(p.name.split("=", 1)[1] for p in path.iterdir() if p.name.startswith(f"{DATE_PARTITION}="))
+        start = rows = 0
+        while start < len(days):
+            span = max(1, block_rows * start // rows) if rows else 1
+            df = read_partitioned(path, columns, start=days[start], end=days[min(start + span, len(days)) - 1])
+            yield from iter_sorted_frames(df, time_column, block_rows=block_rows)
+            start += span
+            rows += len(df)
+        return
+    if path.suffix == ".parquet":
+        df = pd.read_parquet(path, columns=columns)
+    else:
+        df = pd.read_csv(path, usecols=columns, parse_dates=[time_column])
+    yield from iter_sorted_frames(df, time_column, block_rows=block_rows)
+
+
+class ReplayStats:
+    def __init__(self):
+        self.events = 0
+        self.bytes = 0
+        self.batches = 0
+        self.max_lag = 0.0
+        self.total_lag = 0.0
+        self.last_lag = 0.0
+        self.started = time.perf_counter()
+        self.finished = None
+        self.error = None
+
+    def add(self, rows, size, lag):
+        self.events += rows
+        self.bytes += size
+        self.batches += 1
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        self.total_lag += lag
+
+    def report(self):
+        seconds = (self.finished or time.perf_counter()) - self.started
+        report = {
+            "events": self.events,
+            "bytes": self.bytes,
+            "batches": self.batches,
+            "seconds": round(seconds, 3),
+            "events_per_sec": round(self.events / seconds) if seconds else None,
+            "mb_per_sec": round(self.bytes / 2 ** 20 / seconds, 2) if seconds else None,
+            "max_lag": round(self.max_lag, 4),
+            "mean_lag": round(self.total_lag / self.batches, 4) if self.batches else 0.0,
+            "last_lag": round(self.last_lag, 4),
+        }
+        if self.error is not None:
+            report["error"] = self.error
+        return report
+
+
+# Время расписания строк блока (секунды от начала воспроизведения)
+def _schedule(times, first_time, sent, speed, rate):
+    if rate is not None:
+        return (sent + np.arange(len(times))) / rate
+    if speed is not None:
+        return (times - first_time) / 1e9 / speed
+    return np.zeros(len(times))
+
+
+# Поток frames в writer (asyncio.StreamWriter или _FileWriter) по расписанию.
+# report_every — раз в столько секунд печатать промежуточный отчёт в stderr
+async def replay(frames, writer, speed=None, rate=None, time_column="timestamp", tick=TICK,
+                 batch_rows=BATCH_ROWS, report_every=None):
+    if speed is not None and rate is not None:
+        raise ValueError("Задаётся что-то одно: speed или rate")
+    # Без расписания отставания нет: пачка уходит, как только получатель готов
+    paced = speed is not None or rate is not None
+    loop = asyncio.get_running_loop()
+    encoder = NdjsonEncoder()
+    stats = ReplayStats()
+    origin = first_time = None
+    next_report = report_every
+
+    try:
+        for frame in frames:
+            if not len(frame):
+                continue
+            times = frame[time_column].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+            if first_time is None:
+                # Расписание отсчитывается от первого блока: чтение и сортировка источника не в счёт
+                first_time = times[0]
+                origin = loop.time()
+                stats.started = time.perf_counter()
+            schedule = _schedule(times, first_time, stats.events, speed, rate)
+
+            start = 0
+            while start < len(frame):
+                now = loop.time() - origin
+                if schedule[start] > now:
+                    await asyncio.sleep(schedule[start] - now)
+                    now = loop.time() - origin
+                stop = min(int(np.searchsorted(schedule, now + tick, side="right")), start + batch_rows)
+                stop = max(stop, start + 1)
+
+                data = encoder.encode(frame.iloc[start:stop])
+                writer.write(data)
+                await writer.drain()
+                stats.add(stop - start, len(data), max(0.0, float(now - schedule[start])) if paced else 0.0)
+                start = stop
+
+                if report_every is not None and loop.time() - origin >= next_report:
+                    print(json.dumps(stats.report()), file=sys.stderr)
+                    next_report += report_every
+    except ConnectionError as error:
+        # Получатель отключился: отчёт — по тому, что успели отправить
+        stats.error = repr(error)
+
+    stats.finished = time.perf_counter()
+    return stats
+
+
+# stdout как получатель: неблокирующий pipe-транспорт, а если stdout — обычный
+# файл — синхронная запись (она сама по себе ждёт диск)
+class _FileWriter:
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, data):
+        self.file.write(data)
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.file.flush()
+
+
+async def stdout_writer():
+    loop = asyncio.get_running_loop()
+    try:
+        transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout.buffer)
+    except (ValueError, OSError):
+        return _FileWriter(sys.stdout.buffer)
+    return asyncio.StreamWriter(transport, protocol, None, loop)
+
+
+# Закрытие stdout: у pipe-транспорта нет wait_closed, поэтому ждём, пока
+# буфер целиком уйдёт в pipe (верхняя граница буфера — 0)
+async def close_stdout(writer):
+    if not isinstance(writer, _FileWriter):
+        writer.transport.set_write_buffer_limits(0)
+        with suppress(ConnectionError):
+            await writer.drain()
+    writer.close()
+
+
+# Сервер воспроизведения: каждому из clients подключений — весь поток из source
+# (source открывается заново на каждого клиента). ready — Future, в который
+# кладётся адрес сервера после старта (удобно при port=0). Возвращает отчёты по клиентам;
+# если обработка клиента упала, его отчёт — {"error": repr(исключения)}, а сервер
+# всё равно завершается после clients подключений
+async def serve(source, host="127.0.0.1", port=0, path=None, clients=1, columns=None, time_column="timestamp",
+                ready=None, **kwargs):
+    reports = []
+    finished = 0
+    done = asyncio.Event()
+
+    async def handle(reader, writer):
+        nonlocal finished
+        try:
+            frames = iter_sorted_frames(source, time_column, columns)
+            stats = await replay(frames, writer, time_column=time_column, **kwargs)
+            reports.append(stats.report())
+        except Exception as error:
+            reports.append({"error": repr(error)})
+        finally:
+            writer.close()
+            finished += 1
+            if finished >= clients:
+                done.set()
+
+    if path is not None:
+        server = await asyncio.start_unix_server(handle, path=path)
+    else:
+        server = await asyncio.start_server(handle, host, port)
+    async with server:
+        if ready is not None:
+            ready.set_result(server.sockets[0].getsockname())
+        await done.wait()
+    return reports
+
+
+# Получатель-заглушка для тестов: читает поток до конца, считает строки и байты
+async def consume(host="127.0.0.1", port=None, path=None, read_size=READ_SIZE):
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    started = time.perf_counter()
+    events = size = 0
+    first = None
+    while chunk := await reader.read(read_size):
+        if first is None:
+            first = json.loads(chunk[:chunk.index(b"\n")])
+        events += chunk.count(b"\n")
+        size += len(chunk)
+    writer.close()
+    seconds = time.perf_counter() - started
+    return {"events": events, "bytes": size, "seconds": round(seconds, 3),
+            "events_per_sec": round(events / seconds) if seconds else None, "first": first}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Воспроизведение событий потоком NDJSON")
+    parser.add_argument("source", help="таблица событий: .csv, .parquet, партиционированный каталог или .events")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--tcp", metavar="HOST:PORT", help="TCP-сервер (по умолчанию — stdout)")
+    target.add_argument("--unix", metavar="PATH", help="сервер на Unix-сокете")
+    pace = parser.add_mutually_exclusive_group()
+    pace.add_argument("--speed", type=float, help="множитель скорости (1 — реальное время)")
+    pace.add_argument("--rate", type=float, help="событий в секунду")
+    parser.add_argument("--clients", type=int, default=1, help="сколько подключений обслужить")
+    parser.add_argument("--time-column", default="timestamp")
+    parser.add_argument("--columns", nargs="+", help="колонки потока (по умолчанию все)")
+    parser.add_argument("--tick", type=float, default=TICK)
+    parser.add_argument("--report-every", type=float, help="промежуточный отчёт раз в N секунд")
+    return parser.parse_args(argv)
+
+
+async def _run(args):
+    kwargs = dict(speed=args.speed, rate=args.rate, tick=args.tick, report_every=args.report_every)
+    if args.tcp or args.unix:
+        host, _, port = (args.tcp or "").rpartition(":")
+        ready = asyncio.get_running_loop().create_future()
+        ready.add_done_callback(lambda address: print(f"Слушаю {address.result()}", file=sys.stderr))
+        return await serve(args.source, host or "127.0.0.1", int(port or 0), path=args.unix, clients=args.clients,
+                           columns=args.columns, time_column=args.time_column, ready=ready, **kwargs)
+    writer = await stdout_writer()
+    frames = iter_sorted_frames(args.source, args.time_column, args.columns)
+    stats = await replay(frames, writer, time_column=args.time_column, **kwargs)
+    await close_stdout(writer)
+    return [stats.report()]
+
+
+def main(argv=None):
+    for report in asyncio.run(_run(parse_args(argv))):
+        print(json.dumps(report), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
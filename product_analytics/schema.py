@@ -0,0 +1,46 @@
+# Компактная колоночная схема: int64 session_id, category для перечислимых полей,
+# datetime64[s] для времени. Категории задаются заранее и одинаковы во всех
+# чанках, поэтому чанки склеиваются без перекодирования, а в Parquet получается
+# один и тот же словарь
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# session_id = user_id << SESSION_BITS | номер сессии пользователя
+SESSION_BITS = 20
+
+
+def category(values):
+    return pd.CategoricalDtype(list(values))
+
+
+def session_ids(user_ids, session_numbers):
+    return (np.asarray(user_ids, dtype=np.int64) << SESSION_BITS) | np.asarray(session_numbers, dtype=np.int64)
+
+
+# Приведение колонок к схеме {колонка: dtype}; колонки вне схемы не трогаем
+def apply_schema(df, schema):
+    columns = {column: dtype for column, dtype in schema.items() if column in df.columns}
+    return df.astype(columns)
+
+
+# Чтение таблицы (.csv, .parquet или партиционированный каталог .parquet) сразу
+# в компактной схеме. Parquet хранит время минимум в миллисекундах, поэтому схему
+# применяем и к нему. Для каталога kwargs — фильтры read_partitioned
+def read_table(path, schema, **kwargs):
+    if Path(path).is_dir():
+        from product_analytics.partitioned import read_partitioned
+        return read_partitioned(path, schema=schema, **kwargs)
+    if str(path).endswith(".parquet"):
+        df = pd.read_parquet(path, **kwargs)
+    else:
+        dates = [column for column, dtype in schema.items() if str(dtype).startswith("datetime64")]
+        df = pd.read_csv(path, parse_dates=dates, **kwargs)
+    return apply_schema(df, schema)
+
+
+# Размер таблицы в памяти, МБ (deep — с учётом строк в object-колонках)
+def memory_mb(df):
+    return df.memory_usage(deep=True).sum() / 2 ** 20
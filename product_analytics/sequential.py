@@ -0,0 +1,142 @@
+# Последовательный A/B тест (mSPRT) по потоку событий без пересчёта логов.
+# Монитор хранит значение метрик каждого участника и достаточные статистики плеч:
+# сумму и сумму квадратов по метрикам. Событие меняет значение метрики своего
+# пользователя, и статистики сдвигаются на разницу нового и старого значения —
+# O(1) на событие. Размер плеча на момент просмотра — число участников с
+# временем входа не позже него (бинпоиск по отсортированным временам входа).
+# look() в любой момент даёт статистику mSPRT со смесью N(0, tau^2) по эффекту
+# и always-valid p-value (минимум 1 / Lambda по всем просмотрам): тест можно
+# остановить на первом просмотре с p <= alpha без поправки на подглядывание
+
+import numpy as np
+import pandas as pd
+
+ARMS = ("control", "test")
+# Метрика "sum" — счётчик (события суммируются), "max" — флаг (было ли событие)
+METRIC_KINDS = ("sum", "max")
+
+
+def _as_ns(times):
+    return pd.to_datetime(pd.Series(np.asarray(times))).to_numpy("datetime64[ns]").view(np.int64)
+
+
+# Статистика mSPRT для разницы средних: delta ~ N(theta, s2), theta ~ N(0, tau2)
+def msprt_lambda(delta, s2, tau2):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_lambda = 0.5 * np.log(s2 / (s2 + tau2)) + tau2 * delta ** 2 / (2 * s2 * (s2 + tau2))
+    return np.exp(np.where(s2 > 0, log_lambda, 0.0))
+
+
+# metrics — {имя: "sum" | "max"}. effect_size — sd смеси tau в стандартных
+# отклонениях метрики (ожидаемый масштаб эффекта); или tau — абсолютные значения.
+# Смесь не должна зависеть от данных по ходу теста, иначе p-value перестаёт быть
+# always-valid, поэтому tau2 фиксируется один раз: из tau или, без него, по
+# effect_size на первом просмотре, где в каждом плече не меньше min_samples
+# участников и у метрики есть разброс; до этого Lambda метрики = 1. У накопительных
+# метрик разброс в начале теста меньше итогового — лучше задать tau заранее
+# (например, по данным до касания, как lavka_ab.replay_campaign)
+class SequentialMonitor:
+    def __init__(self, metrics, alpha=0.05, effect_size=0.1, tau=None, min_samples=100):
+        self.metrics = list(metrics)
+        kinds = [metrics[name] for name in self.metrics]
+        if set(kinds) - set(METRIC_KINDS):
+            raise ValueError(f"Тип метрики — один из {METRIC_KINDS}")
+        self._is_max = np.array([kind == "max" for kind in kinds])
+        self.alpha = alpha
+        self.effect_size = effect_size
+        self.tau = None if tau is None else np.broadcast_to(np.asarray(tau, dtype=float), (len(self.metrics),))
+        self.tau2 = np.full(len(self.metrics), np.nan) if tau is None else self.tau ** 2
+        self.min_samples = min_samples
+
+        k = len(self.metrics)
+        self.sums = np.zeros((len(ARMS), k))
+        self.sumsq = np.zeros((len(ARMS), k))
+        self.p_values = np.ones(k)
+        self.looks = []
+        self._arm = np.full(0, -1, dtype=np.int8)
+        self._start = np.zeros(0, dtype=np.int64)
+        self._values = np.zeros((0, k))
+        self._starts_by_arm = [np.zeros(0, dtype=np.int64) for _ in ARMS]
+
+    def _grow(self, max_user):
+        size = len(self._arm)
+        if max_user < size:
+            return
+        grow = max(max_user + 1, 2 * size) - size
+        self._arm = np.concatenate([self._arm, np.full(grow, -1, dtype=np.int8)])
+        self._start = np.concatenate([self._start, np.zeros(grow, dtype=np.int64)])
+        self._values = np.vstack([self._values, np.zeros((grow, len(self.metrics)))])
+
+    # Участники с плечом ("control" / "test") и временем входа (касание кампании);
+    # до времени входа события пользователя не учитываются
+    def enroll(self, user_ids, arms, start_times):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        arm_codes = pd.Categorical(np.asarray(arms), categories=ARMS).codes.astype(np.int8)
+        if (arm_codes < 0).any():
+            raise ValueError(f"Плечо — одно из {ARMS}")
+        self._grow(user_ids.max())
+        if (self._arm[user_ids] >= 0).any():
+            raise ValueError("Пользователь уже участвует в тесте")
+        self._arm[user_ids] = arm_codes
+        self._start[user_ids] = _as_ns(start_times)
+        for code in range(len(ARMS)):
+            starts = self._start[user_ids[arm_codes == code]]
+            self._starts_by_arm[code] = np.sort(np.concatenate([self._starts_by_arm[code], starts]))
+
+    # События: user_ids, timestamps и increments (события × метрики: на сколько
+    # растёт счётчик, для флагов — 1 если событие его ставит)
+    def update(self, user_ids, timestamps, increments):
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        increments = np.asarray(increments, dtype=float).reshape(len(user_ids), len(self.metrics))
+        known = user_ids < len(self._arm)
+        user_ids, increments, times = user_ids[known], increments[known], _as_ns(timestamps)[known]
+        counted = (self._arm[user_ids] >= 0) & (times > self._start[user_ids])
+        user_ids, increments = user_ids[counted], increments[counted]
+        if not len(user_ids):
+            return
+
+        users = np.unique(user_ids)
+        old = self._values[users]
+        np.add.at(self._values, user_ids, np.where(self._is_max, 0.0, increments))
+        np.maximum.at(self._values, user_ids, np.where(self._is_max, increments, 0.0))
+        new = self._values[users]
+
+        arms = self._arm[users]
+        np.add.at(self.sums, arms, new - old)
+        np.add.at(self.sumsq, arms, new ** 2 - old ** 2)
+
+    # Просмотр на момент time (по умолчанию — все вошедшие участники)
+    def look(self, time=None):
+        bound = np.iinfo(np.int64).max if time is None else _as_ns([time])[0]
+        n = np.array([np.searchsorted(starts, bound, side="right") for starts in self._starts_by_arm], dtype=float)
+        n_col = n[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            means = self.sums / n_col
+            variances = (self.sumsq - n_col * means ** 2) / (n_col - 1)
+        control, test = ARMS.index("control"), ARMS.index("test")
+        delta = means[test] - means[control]
+        s2 = variances[test] / n[test] + variances[control] / n[control]
+        valid = (n.min() >= 2) & np.isfinite(s2) & (s2 > 0)
+        unset = np.isnan(self.tau2) & valid & (n.min() >= self.min_samples)
+        self.tau2[unset] = (self.effect_size ** 2) * (variances[test] + variances[control])[unset] / 2
+        valid &= ~np.isnan(self.tau2)
+        lam = np.where(valid, msprt_lambda(delta, np.where(valid, s2, 1.0), np.where(valid, self.tau2, 0.0)), 1.0)
+        self.p_values = np.minimum(self.p_values, 1 / lam)
+
+        result = pd.DataFrame({
+            "time": pd.NaT if time is None else pd.Timestamp(time),
+            "metric": self.metrics,
+            "n_test": int(n[test]),
+            "n_control": int(n[control]),
+            "mean_test": means[test],
+            "mean_control": means[control],
+            "uplift": delta,
+            "msprt_lambda": lam,
+            "p_value": self.p_values,
+            "reject": self.p_values <= self.alpha,
+        })
+        self.looks.append(result)
+        return result
+
+    def history(self):
+        return pd.concat(self.looks, ignore_index=True) if self.looks else pd.DataFrame()
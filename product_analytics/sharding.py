@@ -0,0 +1,68 @@
+# Шардированная генерация: диапазоны пользователей, независимые потоки RNG, пул процессов
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# Диапазоны [start, stop) фиксированного размера.
+# Границы зависят только от shard_size, а не от числа воркеров,
+# поэтому склеенный результат одинаков при любом num_workers
+def shard_ranges(n_users, shard_size):
+    return [(start, min(start + shard_size, n_users)) for start in range(0, n_users, shard_size)]
+
+
+# Поток RNG для шарда: SeedSequence(seed, spawn_key=(stream, i)) —
+# то же самое, что SeedSequence(seed).spawn(...) по ключу, но i-й поток
+# не зависит от общего числа шардов.
+# epoch — номер инкремента при дозаписи новых дат: у каждого инкремента свои
+# потоки (stream, i, epoch), epoch=0 — исходная полная генерация
+def shard_seeds(seed, stream, n_shards, epoch=0):
+    key = (epoch,) if epoch else ()
+    return [np.random.SeedSequence(seed, spawn_key=(stream, i) + key) for i in range(n_shards)]
+
+
+def stream_seed(seed, stream):
+    return np.random.SeedSequence(seed, spawn_key=(stream,))
+
+
+# Целочисленный seed для random.Random из SeedSequence
+def python_seed(seed_seq):
+    return int.from_bytes(seed_seq.generate_state(4).tobytes(), "little")
+
+
+# Воркеры запускаем через fork (где он есть): процесс не импортирует заново
+# numpy, pandas и модули генераторов, и пул стартует быстрее. Функции шардов
+# лежат на уровне модулей, поэтому spawn тоже работает, только медленнее
+def _pool_context():
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+# Ленивый запуск func по задачам: результаты отдаются в порядке задач,
+# одновременно в работе и в памяти не больше max_in_flight шардов
+# (по умолчанию 2 * num_workers), поэтому пиковая память зависит от размера
+# шарда, а не от размера всего датасета
+def iter_sharded(func, tasks, num_workers=1, max_in_flight=None):
+    if num_workers <= 1:
+        for task in tasks:
+            yield func(task)
+        return
+
+    max_in_flight = max_in_flight or 2 * num_workers
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=_pool_context()) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(func, task))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+# Запуск func по задачам; результаты в порядке задач
+def run_sharded(func, tasks, num_workers=1):
+    return list(iter_sharded(func, tasks, num_workers))
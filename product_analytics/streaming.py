@@ -0,0 +1,103 @@
+# Потоковая запись таблиц по чанкам: файл дописывается по мере генерации,
+# весь датасет в памяти не собирается
+
+from product_analytics.event_store import EventStoreWriter
+from product_analytics.partitioned import PartitionedParquetWriter
+
+
+# CSV, дописываемый чанками; заголовок пишется один раз.
+# Результат побайтно совпадает с df.to_csv(path, index=False) для склейки чанков.
+# head — первые строки для превью без повторного чтения файла.
+# append=True — дозапись в конец существующего файла без заголовка
+class CsvChunkWriter:
+    def __init__(self, path, append=False):
+        self.path = path
+        self.rows = 0
+        self.head = None
+        self._file = None
+        self._append = append
+        self._header_written = append
+
+    def __enter__(self):
+        self._file = open(self.path, "a" if self._append else "w", newline="", encoding="utf-8")
+        return self
+
+    def write(self, chunk):
+        chunk.to_csv(self._file, index=False, header=not self._header_written)
+        if self.head is None:
+            self.head = chunk.head()
+        self._header_written = True
+        self.rows += len(chunk)
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+
+
+# Parquet, дописываемый чанками (row group на чанк); нужен pyarrow.
+# Категории сохраняются как dictionary-колонки, время — как timestamp[s]
+class ParquetChunkWriter:
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self.head = None
+        self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def write(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+            self.head = chunk.head()
+        self._writer.write_table(table)
+        self.rows += len(chunk)
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._writer is not None:
+            self._writer.close()
+
+
+# Писатель по расширению файла: .parquet, .events или .csv.
+# partition_by — колонки партиций (например, ["event_date", "event_type"]): вместо файла
+# .parquet пишется каталог-датасет (product_analytics/partitioned.py).
+# .events — каталог event store (product_analytics/event_store.py).
+# Дозапись (append=True) есть у CSV и датасета: одиночный файл Parquet не дописывается.
+# prefix — начало имён файлов датасета (PartitionedParquetWriter)
+def chunk_writer(path, append=False, partition_by=None, prefix=None):
+    if str(path).endswith(".events"):
+        if append or partition_by:
+            raise ValueError(f"Event store пишется только целиком, без партиций: {path}")
+        return EventStoreWriter(path)
+    if str(path).endswith(".parquet"):
+        if partition_by:
+            return PartitionedParquetWriter(path, partition_by, append, prefix=prefix)
+        if append:
+            raise ValueError(f"Дозапись в Parquet не поддерживается: {path}")
+        return ParquetChunkWriter(path)
+    if partition_by:
+        raise ValueError(f"Партиции есть только у Parquet: {path}")
+    return CsvChunkWriter(path, append)
+
+
+# Таблица целиком в файл (формат по расширению)
+def write_table(df, path):
+    with chunk_writer(path) as writer:
+        writer.write(df)
+
+
+# Раскладывает поток кортежей чанков по писателям: chunks -> (df_1, df_2, ...)
+def write_chunks(chunks, writers):
+    for parts in chunks:
+        for writer, part in zip(writers, parts):
+            writer.write(part)
+
+
+# Поток чанков без изменений; по дороге чанк (или его часть select) пишется в writer
+def tee_chunks(chunks, writer, select=None):
+    for chunk in chunks:
+        writer.write(select(chunk) if select else chunk)
+        yield chunk